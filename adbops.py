@@ -0,0 +1,230 @@
+from datetime import date
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import dbops as dbops
+import hashing as hashing
+import querybudget as querybudget
+import schemas as schemas
+import security as security
+
+# async counterparts of dbops. every operation runs the sync implementation
+# through AsyncSession.run_sync, so the queries are issued on the async driver
+# and the event loop is free while postgres is working. password hashing goes
+# through hashing.py between the queries, never inside run_sync, and after
+# the read before it has committed, so no connection sits idle in transaction
+# for the length of a hash.
+
+
+async def _run(db: AsyncSession, operation, *args):
+    with querybudget.operation(operation.__name__):
+        return await db.run_sync(operation, *args)
+
+
+def _session_last(operation):
+    # for the dbops functions that take the session as their last argument
+    def call(session, *args):
+        return operation(*args, session)
+
+    call.__name__ = operation.__name__
+    return call
+
+
+async def login(db: AsyncSession, username: str, password: str):
+    user = await _run(db, dbops.get_login_user, username)
+    await db.commit()
+    stored = user.user_password if user is not None else None
+    if not await hashing.verify_password(password, stored):
+        raise PermissionError(f"Incorrect username or password")
+    hashed_password = None
+    if security.needs_rehash(stored):
+        # legacy sha256 or outdated scrypt parameters, upgrade while we have the
+        # plaintext
+        hashed_password = await hashing.hash_password(password)
+    return await _run(db, dbops.record_login, user, hashed_password)
+
+
+async def register(
+    db: AsyncSession, user: schemas.UserRegister, email: schemas.EmailAddToDB
+):
+    hashed_password = await hashing.hash_password(user.user_password)
+    return await _run(db, dbops.register, user, hashed_password, email)
+
+
+async def queue_email(db: AsyncSession, email: schemas.EmailAddToDB):
+    return await _run(db, dbops.queue_email, email)
+
+
+async def confirm_email(db: AsyncSession, user_email: str, email: schemas.EmailAddToDB):
+    return await _run(db, dbops.confirm_email, user_email, email)
+
+
+async def disable_user(db: AsyncSession, user_email: str, email: schemas.EmailAddToDB):
+    return await _run(db, dbops.disable_user, user_email, email)
+
+
+async def change_password(
+    db: AsyncSession, user_uuid: UUID, old_password: str, new_password: str
+):
+    stored = await _run(db, dbops.get_password_hash, user_uuid)
+    await db.commit()
+    if not await hashing.verify_password(old_password, stored):
+        raise PermissionError("Incorrect password")
+    hashed_password = await hashing.hash_password(new_password)
+    return await _run(db, dbops.change_password, user_uuid, hashed_password)
+
+
+async def recover_password(db: AsyncSession, user_email: str, new_password: str):
+    hashed_password = await hashing.hash_password(new_password)
+    return await _run(db, dbops.recover_password, user_email, hashed_password)
+
+
+async def toggle_push(db: AsyncSession, user_uuid: UUID, toggle: bool):
+    return await _run(db, dbops.toggle_push, user_uuid, toggle)
+
+
+async def get_logs(db: AsyncSession):
+    return await _run(db, dbops.get_logs)
+
+
+async def stream_logs(
+    db: AsyncSession,
+    chunk_size: int,
+    user_uuid: UUID | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    details: list[str] | None = None,
+):
+    # not a run_sync wrapper: the rows come through a server-side cursor,
+    # chunk_size at a time, for as long as the caller keeps iterating
+    query = dbops.log_export_query(user_uuid, date_from, date_to, details)
+    with querybudget.operation("stream_logs"):
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+    async for rows in result.mappings().partitions():
+        yield [dict(row) for row in rows]
+
+
+async def get_user(db: AsyncSession, user_uuid: UUID):
+    return await _run(db, dbops.get_user, user_uuid)
+
+
+async def create_task(db: AsyncSession, task: schemas.TaskAddToDB):
+    return await _run(db, dbops.create_task, task)
+
+
+async def update_task(db: AsyncSession, task: schemas.TaskUpdateToDB):
+    return await _run(db, dbops.update_task, task)
+
+
+async def complete_task(db: AsyncSession, task_uuid: UUID, user_uuid: UUID):
+    return await _run(db, dbops.complete_task, task_uuid, user_uuid)
+
+
+async def apply_task_batch(db: AsyncSession, user_uuid: UUID, batch: schemas.TaskBatch):
+    return await _run(db, dbops.apply_task_batch, user_uuid, batch)
+
+
+async def complete_session(db: AsyncSession, user_uuid: UUID):
+    return await _run(db, dbops.complete_session, user_uuid)
+
+
+async def delete_task(db: AsyncSession, task_uuid: UUID, user_uuid: UUID):
+    return await _run(db, dbops.delete_task, task_uuid, user_uuid)
+
+
+async def delete_forum(db: AsyncSession, forum_uuid: UUID):
+    return await _run(db, dbops.delete_forum, forum_uuid)
+
+
+async def delete_comment(db: AsyncSession, comment_uuid: UUID):
+    return await _run(db, dbops.delete_comment, comment_uuid)
+
+
+async def get_tasks(
+    db: AsyncSession,
+    user_uuid: UUID,
+    limit: int | None = None,
+    cursor: str | None = None,
+    sort: str = "deadline",
+    is_done: bool | None = None,
+    categories: list[str] | None = None,
+    priorities: list[str] | None = None,
+    deadline_from: date | None = None,
+    deadline_to: date | None = None,
+):
+    return await _run(
+        db,
+        dbops.get_tasks,
+        user_uuid,
+        limit,
+        cursor,
+        sort,
+        is_done,
+        categories,
+        priorities,
+        deadline_from,
+        deadline_to,
+    )
+
+
+async def get_users(
+    db: AsyncSession,
+    limit: int,
+    cursor: str | None = None,
+    is_confirmed: bool | None = None,
+    is_premium: bool | None = None,
+):
+    return await _run(db, dbops.get_users, limit, cursor, is_confirmed, is_premium)
+
+
+async def create_forum(
+    db: AsyncSession, forum: schemas.ForumAddToDB, forum_owner: dict
+):
+    return await _run(db, dbops.create_forum, forum, forum_owner)
+
+
+async def create_comment(
+    db: AsyncSession, comment: schemas.ForumCommentAddToDB, forum_member: dict
+):
+    return await _run(db, dbops.create_comment, comment, forum_member)
+
+
+async def get_forums(db: AsyncSession, limit: int, cursor: str | None = None):
+    return await _run(db, dbops.get_forums, limit, cursor)
+
+
+async def search(db: AsyncSession, terms: str, limit: int, cursor: str | None = None):
+    return await _run(db, dbops.search, terms, limit, cursor)
+
+
+async def get_user_forums(db: AsyncSession, user_id: str):
+    return await _run(db, dbops.get_user_forums, user_id)
+
+
+async def get_user_comments(db: AsyncSession, user_id: str):
+    return await _run(db, dbops.get_user_comments, user_id)
+
+
+async def get_forum(forum_uuid: UUID, db: AsyncSession):
+    return await _run(db, _session_last(dbops.get_forum), forum_uuid)
+
+
+async def get_task(task_uuid: UUID, db: AsyncSession):
+    return await _run(db, _session_last(dbops.get_task), task_uuid)
+
+
+async def gacha_life(db: AsyncSession, user_uuid: UUID, pull: int):
+    return await _run(db, dbops.gacha_life, user_uuid, pull)
+
+
+async def get_sprites(db: AsyncSession, user_uuid: UUID):
+    return await _run(db, dbops.get_sprites, user_uuid)
+
+
+async def change_avatar(db: AsyncSession, user_uuid: UUID, avatar: str):
+    return await _run(db, dbops.change_avatar, user_uuid, avatar)
+
+
+async def get_version(db: AsyncSession, key: str):
+    return await _run(db, dbops.get_version, key)
@@ -0,0 +1,75 @@
+"""Compare request concurrency of the sync and async database paths.
+
+Runs ``--requests`` coroutines on one event loop, the way a uvicorn worker
+serves the ``async def`` routes in ``main.py``, and times the batch when each
+coroutine calls ``dbops`` on ``SessionLocal`` versus ``adbops`` on
+``AsyncSessionLocal``. ``--delay`` adds a ``pg_sleep`` to every request to
+stand in for a slow query.
+
+    python benchmarks/async_db.py --requests 200 --delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+import adbops as adbops
+import dbops as dbops
+from dbconf import AsyncSessionLocal, SessionLocal, async_engine, engine
+
+
+async def sync_request(delay: float):
+    db = SessionLocal()
+    try:
+        if delay:
+            db.execute(text("SELECT pg_sleep(:delay)"), {"delay": delay})
+        dbops.get_forums(db, 20)
+    finally:
+        db.close()
+
+
+async def async_request(delay: float):
+    async with AsyncSessionLocal() as db:
+        if delay:
+            await db.execute(text("SELECT pg_sleep(:delay)"), {"delay": delay})
+        await adbops.get_forums(db, 20)
+
+
+async def run(request, requests: int, delay: float):
+    started = time.perf_counter()
+    await asyncio.gather(*(request(delay) for _ in range(requests)))
+    return time.perf_counter() - started
+
+
+async def bench(requests: int, delay: float):
+    # warm both pools so connection setup is not part of the timing
+    await run(sync_request, 1, 0)
+    await run(async_request, 1, 0)
+    results = {}
+    for name, request in (("sync", sync_request), ("async", async_request)):
+        elapsed = await run(request, requests, delay)
+        results[name] = elapsed
+        print(
+            f"{name:>5}: {requests} requests in {elapsed:.3f}s "
+            f"({requests / elapsed:.1f} req/s)"
+        )
+    print(f"speedup: {results['sync'] / results['async']:.1f}x")
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(bench(args.requests, args.delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Deterministic synthetic data for the benchmarks.
+
+Every row follows from (seed, table, row number). Ids are hashed from those.
+The other values come from a Random seeded per CHUNK rows. A table grown
+from 1k to 10k rows in two steps therefore holds the same rows as one
+generated at 10k directly, and the same seed gives the same database
+anywhere.
+
+At scale n, tasks, sprite_instances, forums and forum_comments get n rows
+each and users get n // 100 (at least 10). User 0 and forum 0 are the
+probe. At every scale they own PROBE_ROWS tasks, sprites and comments, so
+reads of them measure the cost of the table size alone. Scales are
+multiples of CHUNK.
+
+    python benchmarks/datagen.py --scale 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, time as clock, timedelta
+from uuid import NAMESPACE_URL, UUID, uuid5
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, update
+
+import dbops as dbops
+import models as models
+from dbconf import SessionLocal
+
+CHUNK = 1000
+PROBE_ROWS = 50
+SPRITES = 50
+CATEGORIES = ("Study", "Work", "Health", "Errands")
+PRIORITIES = ("High", "Normal", "Low")
+WORDS = (
+    "exam review notes chapter essay lab project reading quiz lecture "
+    "group deadline draft outline revision problem set calculus history"
+).split()
+# fixed, so dates do not depend on the day the data was generated
+EPOCH = date(2026, 1, 1)
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def row_uuid(table: str, seed: int, index: int) -> UUID:
+    # stamped as version 4, the schemas only accept those
+    name = f"studyplan:{table}:{seed}:{index}"
+    return UUID(bytes=uuid5(NAMESPACE_URL, name).bytes, version=4)
+
+
+def users_at(scale: int) -> int:
+    return max(10, scale // 100)
+
+
+def probe(seed: int) -> dict:
+    return {
+        "user_uuid": row_uuid("users", seed, 0),
+        "user_name": "Probe User0",
+        "forum_uuid": row_uuid("forums", seed, 0),
+    }
+
+
+def _user(rng, seed: int, index: int) -> dict:
+    return {
+        "user_uuid": row_uuid("users", seed, index),
+        "user_fname": "Probe" if index == 0 else "Bench",
+        "user_lname": f"User{index}",
+        "user_email": f"bench-{seed}-{index}@example.com",
+        "user_password": "-",
+        "is_confirmed": True,
+        "user_points": 10**9,
+        "user_avatar": "avatar",
+        "created_at": EPOCH + timedelta(days=rng.randrange(365)),
+    }
+
+
+def _task(rng, seed: int, index: int, user: int) -> dict:
+    return {
+        "task_uuid": row_uuid("tasks", seed, index),
+        "task_details": sentence(rng, 8),
+        "task_priority": rng.choice(PRIORITIES),
+        "task_category": rng.choice(CATEGORIES),
+        "task_deadline": EPOCH + timedelta(days=rng.randrange(365)),
+        "task_time": clock(rng.randint(7, 22), rng.choice((0, 15, 30, 45))),
+        "is_done": rng.random() < 0.3,
+        "user_uuid": row_uuid("users", seed, user),
+    }
+
+
+def _sprite_instance(rng, seed: int, index: int, user: int) -> dict:
+    return {
+        "sprite_instance_uuid": row_uuid("sprite_instances", seed, index),
+        "acquisition_date": EPOCH + timedelta(days=rng.randrange(365)),
+        "sprite_uuid": row_uuid("sprites", seed, rng.randrange(SPRITES)),
+        "user_uuid": row_uuid("users", seed, user),
+    }
+
+
+def _forum(rng, seed: int, index: int) -> dict:
+    return {
+        "forum_uuid": row_uuid("forums", seed, index),
+        "forum_title": sentence(rng, 4),
+        "forum_category": rng.choice(CATEGORIES),
+        "forum_details": sentence(rng, 30),
+        "forum_status": "open",
+        "created_at": EPOCH + timedelta(days=rng.randrange(365)),
+    }
+
+
+def _owner(seed: int, index: int, user: int) -> dict:
+    return {
+        "forum_member_uuid": row_uuid("forum_members", seed, index),
+        "user_name": f"Bench User{user}",
+        "is_owner": True,
+        "created_at": EPOCH,
+        "forum_uuid": row_uuid("forums", seed, index),
+        "user_uuid": row_uuid("users", seed, user),
+    }
+
+
+def _comment(rng, seed: int, index: int, forum: int, user: int) -> dict:
+    return {
+        "forum_comment_uuid": row_uuid("forum_comments", seed, index),
+        "forum_comment": sentence(rng, 12),
+        "created_at": EPOCH + timedelta(days=rng.randrange(365)),
+        "forum_uuid": row_uuid("forums", seed, forum),
+        "user_uuid": row_uuid("users", seed, user),
+    }
+
+
+def _row(table: str, rng, seed: int, index: int, users: int, forums: int) -> dict:
+    if table == "users":
+        return _user(rng, seed, index)
+    if table == "forums":
+        forum = _forum(rng, seed, index)
+        if index == 0:
+            forum["forum_title"] = "probe forum"
+        return forum
+    if table == "forum_members":
+        return _owner(seed, index, rng.randrange(1, users))
+    # the probe's rows are numbered from -PROBE_ROWS to -1
+    user = 0 if index < 0 else rng.randrange(1, users)
+    if table == "tasks":
+        return _task(rng, seed, index, user)
+    if table == "sprite_instances":
+        return _sprite_instance(rng, seed, index, user)
+    forum = 0 if index < 0 else rng.randrange(1, forums)
+    return _comment(rng, seed, index, forum, user)
+
+
+def chunks(table: str, seed: int, start: int, stop: int):
+    # yields rows start to stop of table, at most CHUNK at a time. each chunk
+    # of CHUNK row numbers has its own Random, so any range of rows comes out
+    # the same however the table was grown.
+    for first in range(start - start % CHUNK, stop, CHUNK):
+        rng = random.Random(f"{seed}:{table}:{first}")
+        # rows only point at users and forums that exist once this chunk does
+        users = users_at(first + CHUNK)
+        forums = first + CHUNK
+        rows = []
+        for index in range(first, min(first + CHUNK, stop)):
+            # drawn even when skipped, to keep the rest of the chunk the same
+            row = _row(table, rng, seed, index, users, forums)
+            if index >= start:
+                rows.append(row)
+        yield rows
+
+
+def grow(db, seed: int, scale: int, current: int = 0) -> dict:
+    # adds the rows between scale current and scale, commits, and rebuilds
+    # the forum counters
+    if scale % CHUNK or current % CHUNK or scale <= current:
+        raise ValueError(f"Scales must be growing multiples of {CHUNK}")
+    plan = [
+        (models.User, "users", users_at(current) if current else 0, users_at(scale))
+    ]
+    for model, table in (
+        (models.Task, "tasks"),
+        (models.SpriteInstance, "sprite_instances"),
+        (models.Forum, "forums"),
+        (models.ForumMember, "forum_members"),
+        (models.ForumComment, "forum_comments"),
+    ):
+        if current == 0 and model not in (models.Forum, models.ForumMember):
+            plan.append((model, table, -PROBE_ROWS, 0))
+        plan.append((model, table, current, scale))
+    if current == 0:
+        db.execute(
+            insert(models.Sprite),
+            [
+                {
+                    "sprite_uuid": row_uuid("sprites", seed, index),
+                    "sprite_source": f"bench-{seed}-{index}",
+                    "sprite_summon_chance": (0.5, 1, 2, 5)[index % 4],
+                }
+                for index in range(SPRITES)
+            ],
+        )
+    counts = {}
+    for model, table, start, stop in plan:
+        for rows in chunks(table, seed, start, stop):
+            db.execute(insert(model), rows)
+        counts[table] = counts.get(table, 0) + stop - start
+    if db.get_bind().dialect.name == "postgresql":
+        index_search(db)
+    db.commit()
+    dbops.recount_forums(db)
+    return counts
+
+
+def index_search(db):
+    # the same vectors dbops writes, for rows inserted around it
+    db.execute(
+        update(models.Forum)
+        .where(models.Forum.search_vector.is_(None))
+        .values(
+            search_vector=dbops._search_vector(
+                (models.Forum.forum_title, "A"),
+                (models.Forum.forum_category, "B"),
+                (models.Forum.forum_details, "C"),
+            )
+        )
+    )
+    db.execute(
+        update(models.ForumComment)
+        .where(models.ForumComment.search_vector.is_(None))
+        .values(
+            search_vector=dbops._search_vector((models.ForumComment.forum_comment, "C"))
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        counts = grow(db, args.seed, args.scale)
+    finally:
+        db.close()
+    print(
+        ", ".join(f"{count} {table}" for table, count in counts.items())
+        + f" in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
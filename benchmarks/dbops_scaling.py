@@ -0,0 +1,225 @@
+"""How the hot dbops functions scale with the size of their tables.
+
+Grows a scratch database through --scales with datagen. At each scale it
+times every case in CASES --repeat times, each call in a fresh session, and
+keeps the median. The reads run on datagen's probe user and forum, whose own
+rows never change. The writes go to other users and forums, so they do not
+grow the probe.
+
+A power law t = a * n^k is fitted to each case across the scales. k near 0
+means the table size does not matter (an index lookup). k near 1 means the
+cost grows with the table (a scan). --save writes the results as JSON with
+the commit they ran on. --compare prints the ratio to an earlier results
+file and exits 1 when a case got slower than --tolerance allows at any
+scale. Use a scratch database at `alembic upgrade head`. It must be empty,
+since datagen's rows are inserted with fixed ids.
+
+    python benchmarks/dbops_scaling.py --scales 1000,10000,100000,1000000
+    python benchmarks/dbops_scaling.py --save after.json --compare before.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen as datagen
+import dbops as dbops
+import schemas as schemas
+from dbconf import SessionLocal
+
+# slowdowns under this are noise, whatever --tolerance says
+MIN_SLOWDOWN = 0.0005
+
+
+def _comment(db, probe: dict, rng: random.Random, scale: int):
+    forum = rng.randrange(1, scale)
+    user = rng.randrange(1, datagen.users_at(scale))
+    user_uuid = datagen.row_uuid("users", probe["seed"], user)
+    dbops.create_comment(
+        db,
+        schemas.ForumCommentAddToDB(
+            forum_comment="scaling benchmark",
+            forum_uuid=datagen.row_uuid("forums", probe["seed"], forum),
+            user_uuid=user_uuid,
+        ),
+        {"is_owner": False, "user_name": f"Bench User{user}", "user_uuid": user_uuid},
+    )
+
+
+def _pull(db, probe: dict, rng: random.Random, scale: int):
+    user = rng.randrange(1, datagen.users_at(scale))
+    dbops.gacha_life(db, datagen.row_uuid("users", probe["seed"], user), 10)
+
+
+# name, call(db, probe, rng, scale), postgres only
+CASES = [
+    ("get_forums", lambda db, probe, rng, scale: dbops.get_forums(db, 20), False),
+    (
+        "get_forum",
+        lambda db, probe, rng, scale: dbops.get_forum(str(probe["forum_uuid"]), db),
+        False,
+    ),
+    (
+        "get_tasks",
+        lambda db, probe, rng, scale: dbops.get_tasks(db, probe["user_uuid"], 20),
+        False,
+    ),
+    (
+        "get_tasks open by priority",
+        lambda db, probe, rng, scale: dbops.get_tasks(
+            db, probe["user_uuid"], 20, sort="priority", is_done=False
+        ),
+        False,
+    ),
+    (
+        "get_sprites",
+        lambda db, probe, rng, scale: dbops.get_sprites(db, str(probe["user_uuid"])),
+        False,
+    ),
+    (
+        "search",
+        lambda db, probe, rng, scale: dbops.search(db, "probe forum", 20),
+        True,
+    ),
+    ("gacha_life x10", _pull, False),
+    ("create_comment", _comment, False),
+]
+
+
+def measure(call, probe: dict, scale: int, repeat: int) -> float:
+    rng = random.Random(f"{probe['seed']}:{scale}")
+    samples = []
+    # the first call warms the catalog, the statement cache and the pool
+    for attempt in range(repeat + 1):
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            call(db, probe, rng, scale)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        if attempt:
+            samples.append(elapsed)
+    return statistics.median(samples)
+
+
+def fit(seconds: dict) -> float | None:
+    # least squares slope of log t over log n
+    points = [(math.log(int(scale)), math.log(t)) for scale, t in seconds.items()]
+    if len(points) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+
+
+def growth(exponent: float | None) -> str:
+    if exponent is None:
+        return "-"
+    if exponent < 0.1:
+        return "flat"
+    if exponent < 0.5:
+        return "sublinear"
+    if exponent < 1.2:
+        return "linear"
+    return "superlinear"
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, previous: dict, tolerance: float) -> int:
+    slower = 0
+    print(f"\ncompared with {previous.get('commit') or 'previous run'}")
+    for name, case in results["cases"].items():
+        before = previous["cases"].get(name, {}).get("seconds", {})
+        for scale, seconds in case["seconds"].items():
+            if scale not in before:
+                continue
+            ratio = seconds / before[scale]
+            regressed = ratio > 1 + tolerance and seconds - before[scale] > MIN_SLOWDOWN
+            slower += regressed
+            print(
+                f"{name:<28} {int(scale):>9} {ratio:>6.2f}x"
+                + ("  SLOWER" if regressed else "")
+            )
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    scales = sorted(int(scale) for scale in args.scales.split(","))
+    probe = {**datagen.probe(args.seed), "seed": args.seed}
+    db = SessionLocal()
+    dialect = db.get_bind().dialect.name
+    db.close()
+    cases = [case for case in CASES if dialect == "postgresql" or not case[2]]
+    results = {
+        "commit": commit(),
+        "dialect": dialect,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "scales": scales,
+        "cases": {name: {"seconds": {}} for name, _, _ in cases},
+    }
+
+    current = 0
+    for scale in scales:
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            datagen.grow(db, args.seed, scale, current)
+        finally:
+            db.close()
+        current = scale
+        print(f"scale {scale}: seeded in {time.perf_counter() - started:.1f}s")
+        for name, call, _ in cases:
+            seconds = measure(call, probe, scale, args.repeat)
+            results["cases"][name]["seconds"][str(scale)] = seconds
+            print(f"  {name:<28} {seconds * 1000:>9.2f}ms")
+
+    print(f"\n{'case':<28} {'k':>6}  growth")
+    for name, case in results["cases"].items():
+        case["exponent"] = fit(case["seconds"])
+        case["growth"] = growth(case["exponent"])
+        exponent = "-" if case["exponent"] is None else f"{case['exponent']:.2f}"
+        print(f"{name:<28} {exponent:>6}  {case['growth']}")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            slower = compare(results, json.load(file), args.tolerance)
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Index usage check for the hot queries.
+
+Runs the real dbops functions (get_tasks, get_sprites, get_user_comments,
+create_comment, get_user_forums, get_forum, get_forums, get_users, the log
+export, reconcile_points, the mailer claim, the reminder load, the
+leaderboard refresh and, on postgres, search) against a few seeded rows,
+captures the statements they send through querybudget.capture, and
+EXPLAINs each one with its own parameters. Every check names the index its
+plan has to read, and the list reads in ORDERED must get their order from
+it instead of sorting. Everything runs in one transaction that is rolled back,
+and sequential scans are disabled in it, so the check answers "can the
+planner use the index" even on a near-empty database. Exits non-zero when
+a function fails, does not issue the expected statement, or its plan
+misses the index or sorts when it should not.
+
+    alembic upgrade head
+    python benchmarks/explain_indexes.py
+"""
+
+import argparse
+import json
+import os
+import smtplib
+import sys
+from datetime import date, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session
+
+import dbops as dbops
+import leaderboard as leaderboard
+import mailer as mailer
+import models as models
+import querybudget as querybudget
+import reminders as reminders
+import schemas as schemas
+import security as security
+from dbconf import engine
+
+
+class Unsent:
+    # claimed emails fail and are rescheduled, inside the rolled back
+    # transaction, so nothing is delivered
+    def send(self, recipient: str, subject: str, body: str):
+        raise smtplib.SMTPException("explain only")
+
+
+def seed(db: Session) -> dict:
+    user_uuid = security.generate_uuid()
+    forum_uuid = security.generate_uuid()
+    sprite_uuid = security.generate_uuid()
+    db.add(
+        models.User(
+            user_uuid=user_uuid,
+            user_fname="Explain",
+            user_lname="Indexes",
+            user_email=f"explain-{user_uuid}@example.com",
+            user_password="-",
+            is_confirmed=True,
+            push_notif=True,
+            user_avatar="-",
+        )
+    )
+    db.add(
+        models.Forum(
+            forum_uuid=forum_uuid,
+            forum_title="study plan",
+            forum_category="explain",
+            forum_details="explain",
+            forum_status="open",
+            comment_count=1,
+            member_count=1,
+        )
+    )
+    db.add(
+        models.Sprite(
+            sprite_uuid=sprite_uuid,
+            sprite_source=f"explain-{sprite_uuid}",
+            sprite_summon_chance=1.0,
+        )
+    )
+    db.flush()
+    db.add_all(
+        [
+            models.ForumMember(
+                user_name="explain",
+                is_owner=True,
+                forum_uuid=forum_uuid,
+                user_uuid=user_uuid,
+            ),
+            models.ForumComment(
+                forum_comment="study plan",
+                forum_uuid=forum_uuid,
+                user_uuid=user_uuid,
+            ),
+            models.Task(
+                task_details="explain",
+                task_priority="LOW",
+                task_category="explain",
+                task_deadline=date.today() + timedelta(days=1),
+                task_time=time(9),
+                user_uuid=user_uuid,
+            ),
+            models.SpriteInstance(sprite_uuid=sprite_uuid, user_uuid=user_uuid),
+            models.UserLog(user_log_details="explain", user_uuid=user_uuid),
+            models.PointsLedger(
+                points_delta=0,
+                points_balance=0,
+                points_reason="explain",
+                user_uuid=user_uuid,
+            ),
+        ]
+    )
+    db.flush()
+    return {"user_uuid": user_uuid, "forum_uuid": forum_uuid}
+
+
+# pages of these come straight off the index in sort order, up to the limit
+ORDERED = {"get_tasks", "get_tasks -deadline", "get_tasks open", "get_forums"}
+
+
+def refresh_leaderboard(db: Session):
+    board = leaderboard.Leaderboard()
+    board.synced = security.get_locale_datetime()
+    board.refresh(db)
+
+
+def checks(ids: dict) -> list:
+    # (name, call, a fragment of the statement to explain, expected index)
+    user_uuid, forum_uuid = ids["user_uuid"], ids["forum_uuid"]
+    member = {"is_owner": False, "user_name": "explain", "user_uuid": user_uuid}
+    comment = schemas.ForumCommentAddToDB(
+        forum_comment="explain", forum_uuid=forum_uuid, user_uuid=user_uuid
+    )
+    statements = [
+        (
+            "get_tasks",
+            lambda db: dbops.get_tasks(db, user_uuid, 50),
+            "FROM tasks",
+            "ix_tasks_user_uuid_task_deadline_task_time_task_uuid",
+        ),
+        (
+            "get_tasks -deadline",
+            lambda db: dbops.get_tasks(db, user_uuid, 50, sort="-deadline"),
+            "FROM tasks",
+            "ix_tasks_user_uuid_task_deadline_task_time_task_uuid",
+        ),
+        (
+            "get_tasks open",
+            lambda db: dbops.get_tasks(
+                db, user_uuid, 50, is_done=False, deadline_from=date.today()
+            ),
+            "FROM tasks",
+            "ix_tasks_user_uuid_is_done_task_deadline_task_time_task_uuid",
+        ),
+        (
+            "reminders load",
+            lambda db: reminders.Scheduler()._load(),
+            "FROM tasks",
+            "ix_tasks_pending_deadline",
+        ),
+        (
+            "get_sprites",
+            lambda db: dbops.get_sprites(db, str(user_uuid)),
+            "FROM sprite_instances",
+            "ix_sprite_instances_user_uuid",
+        ),
+        (
+            "get_user_comments",
+            lambda db: dbops.get_user_comments(db, str(user_uuid)),
+            "FROM forum_comments",
+            "ix_forum_comments_user_uuid",
+        ),
+        (
+            "get_forum comments",
+            lambda db: dbops.get_forum(str(forum_uuid), db),
+            "forum_comments",
+            "ix_forum_comments_forum_uuid_created_at",
+        ),
+        (
+            "create_comment membership",
+            lambda db: dbops.create_comment(db, comment, dict(member)),
+            "FROM forum_members",
+            "ix_forum_members_forum_uuid_user_uuid",
+        ),
+        (
+            "get_user_forums",
+            lambda db: dbops.get_user_forums(db, str(user_uuid)),
+            "forum_members",
+            "ix_forum_members_user_uuid_is_owner",
+        ),
+        (
+            "get_forums",
+            lambda db: dbops.get_forums(db, 20),
+            "FROM forums",
+            "ix_forums_created_at_forum_uuid",
+        ),
+        (
+            "get_users",
+            lambda db: dbops.get_users(db, 50, is_confirmed=True, is_premium=False),
+            "FROM users",
+            "ix_users_is_confirmed_is_premium_created_at",
+        ),
+        (
+            "user logs export",
+            lambda db: db.execute(
+                dbops.log_export_query(user_uuid, date_from=date.today())
+            ).all(),
+            "FROM user_logs",
+            "ix_user_logs_user_uuid_created_at",
+        ),
+        (
+            "reconcile_points",
+            dbops.reconcile_points,
+            "points_ledger",
+            "ix_points_ledger_user_uuid_created_at",
+        ),
+        (
+            "leaderboard refresh",
+            refresh_leaderboard,
+            "points_ledger",
+            "ix_points_ledger_created_at",
+        ),
+        (
+            "mailer claim",
+            lambda db: mailer.drain(db, Unsent()),
+            "FROM email_outbox",
+            "ix_email_outbox_pending_next_attempt_at",
+        ),
+    ]
+    if engine.dialect.name == "postgresql":
+        statements += [
+            (
+                "search forums",
+                lambda db: dbops.search(db, "study plan", 20),
+                "FROM forums",
+                "ix_forums_search_vector",
+            ),
+            (
+                "search comments",
+                lambda db: dbops.search(db, "study plan", 20),
+                "FROM forum_comments",
+                "ix_forum_comments_search_vector",
+            ),
+        ]
+    return statements
+
+
+def _values(plan, key: str) -> set:
+    # every value of key anywhere in a postgres JSON plan
+    values = set()
+    if isinstance(plan, dict):
+        if key in plan:
+            values.add(plan[key])
+        for value in plan.values():
+            values |= _values(value, key)
+    elif isinstance(plan, list):
+        for value in plan:
+            values |= _values(value, key)
+    return values
+
+
+def explain(connection, statement: str, parameters) -> tuple[set, bool, str]:
+    # the index names in the plan, whether it sorts, and the plan itself
+    if isinstance(parameters, list):
+        # an executemany, one set of parameters is enough for the plan
+        parameters = parameters[0]
+    if engine.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        ).scalar()
+        plan = rows if isinstance(rows, list) else json.loads(rows)
+        sorts = bool(_values(plan, "Node Type") & {"Sort", "Incremental Sort"})
+        return _values(plan, "Index Name"), sorts, json.dumps(plan, indent=2)
+    rows = connection.exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", parameters
+    ).all()
+    details = [str(row[-1]) for row in rows]
+    names = {word for detail in details for word in detail.split()}
+    sorts = any("TEMP B-TREE FOR" in detail for detail in details)
+    return names, sorts, "\n".join(details)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    failures = 0
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            if engine.dialect.name == "postgresql":
+                connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            # commits inside dbops end nowhere, the outer transaction is
+            # rolled back at the end
+            db = Session(
+                bind=connection,
+                autoflush=False,
+                join_transaction_mode="rollback_only",
+            )
+            for name, call, fragment, index in checks(seed(db)):
+                with querybudget.capture() as statements:
+                    try:
+                        call(db)
+                    except Exception as e:
+                        print(f"{'ERROR':<8} {name:<28} {e!r}")
+                        failures += 1
+                        break
+                issued = [
+                    (statement, parameters)
+                    for statement, parameters in statements
+                    if fragment in statement
+                ]
+                if not issued:
+                    print(f"{'MISSING':<8} {name:<28} no statement with {fragment!r}")
+                    failures += 1
+                    continue
+                used, sorts, plan = explain(connection, *issued[0])
+                outcome = "ok"
+                if index not in used:
+                    outcome = "MISSING"
+                elif sorts and name in ORDERED:
+                    outcome = "SORTS"
+                ok = outcome == "ok"
+                failures += not ok
+                print(f"{outcome:<8} {name:<28} {index}")
+                if args.verbose or not ok:
+                    print(issued[0][0])
+                    print(plan)
+        finally:
+            transaction.rollback()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Idle live subscribers per worker and the cost of fanning an event out to them.
+
+In-process (the default) it subscribes --subscribers idle consumers to one
+forum topic of a private livehub.Hub, each waiting in its own task like a
+websocket connection does. It reports the memory they hold and how long one
+event takes to reach all of them. It also checks that a consumer that never
+reads gets a resync and does not slow down the others.
+
+With --url it opens that many real websockets to /api/v1/forums/live of a
+running server (raise ulimit -n first), posts a forum with --token and times
+the forum_created event to every connection.
+
+    python benchmarks/live_subscribers.py --subscribers 10000
+    python benchmarks/live_subscribers.py --url ws://localhost:8000 --token ...
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import livehub as livehub
+
+TOPIC = "forum:00000000-0000-4000-8000-000000000000"
+
+
+async def in_process(subscribers: int, events: int):
+    hub = livehub.Hub(max_subscribers=subscribers + 1)
+    hub.start()
+    received = [0] * subscribers
+    everyone = asyncio.Event()
+    remaining = [subscribers]
+
+    async def consume(index: int, subscription):
+        while True:
+            await subscription.get()
+            received[index] += 1
+            if received[index] == events:
+                remaining[0] -= 1
+                if not remaining[0]:
+                    everyone.set()
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    consumers = [
+        asyncio.create_task(consume(index, hub.subscribe(TOPIC)))
+        for index in range(subscribers)
+    ]
+    await asyncio.sleep(0)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{subscribers} idle subscribers hold {held / 2**20:.1f}MiB")
+    print(f"  {held / subscribers / 1024:.2f}KiB per subscriber")
+
+    stalled = hub.subscribe(TOPIC)
+    started = time.perf_counter()
+    for sequence in range(events):
+        hub.publish(TOPIC, {"type": "comment_created", "sequence": sequence})
+    published = time.perf_counter() - started
+    await everyone.wait()
+    delivered = time.perf_counter() - started
+    for sequence in range(hub.queue_size + 1):
+        hub.publish(TOPIC, {"type": "comment_created", "sequence": sequence})
+    print(
+        f"{events} events published in {published * 1000:.1f}ms, "
+        f"delivered to every subscriber in {delivered * 1000:.1f}ms"
+    )
+    print(
+        f"after {events + hub.queue_size + 1} events the stalled subscriber "
+        f"holds {stalled.queue.qsize()} queued, "
+        f"{stalled.overflows} overflows, "
+        f"first is resync: {stalled.queue._queue[0] == livehub.RESYNC}"
+    )
+    for consumer in consumers:
+        consumer.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+
+def post_forum(url: str, token: str):
+    request = urllib.request.Request(
+        url.replace("ws", "http", 1) + "/api/v1/forum",
+        data=json.dumps(
+            {
+                "forum_title": "live benchmark",
+                "forum_category": "benchmark",
+                "forum_details": "fan-out timing",
+                "forum_status": "open",
+            }
+        ).encode("utf-8"),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+        method="POST",
+    )
+    urllib.request.urlopen(request).read()
+
+
+async def remote(url: str, token: str, subscribers: int, hold: float):
+    import websockets
+
+    endpoint = f"{url}/api/v1/forums/live?token={token}"
+    connections = []
+    for _ in range(subscribers):
+        connections.append(await websockets.connect(endpoint, max_queue=4))
+    print(f"{len(connections)} connections open, idling {hold}s")
+    await asyncio.sleep(hold)
+
+    async def first_event(connection):
+        await connection.recv()
+        return time.perf_counter()
+
+    waiting = [asyncio.create_task(first_event(c)) for c in connections]
+    started = time.perf_counter()
+    await asyncio.to_thread(post_forum, url, token)
+    arrivals = await asyncio.gather(*waiting, return_exceptions=True)
+    times = sorted(t - started for t in arrivals if isinstance(t, float))
+    failed = len(arrivals) - len(times)
+    print(
+        f"event reached {len(times)} connections, {failed} failed, "
+        f"first {times[0] * 1000:.1f}ms, p50 {times[len(times) // 2] * 1000:.1f}ms, "
+        f"last {times[-1] * 1000:.1f}ms"
+    )
+    await asyncio.gather(*(c.close() for c in connections), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--url", help="ws://host:port of a running server")
+    parser.add_argument("--token", help="access token for --url")
+    parser.add_argument("--hold", type=float, default=5)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(remote(args.url, args.token, args.subscribers, args.hold))
+    else:
+        asyncio.run(in_process(args.subscribers, args.events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+"""End-to-end load test of main:app with per-route latency and a baseline check.
+
+Seeds the database behind SQLALCHEMY_DATABASE_URL with --users users, their
+tasks, sprites and points, and forums with members and comments. The seed is
+deterministic for a given --seed, and every user logs in as
+load-<n>@example.com with the password "password". Then --concurrency
+simulated users run journeys for --duration seconds: log in, list open
+tasks, complete one, add one, open the sprites, pull once, list the forums,
+open one and comment on it. Requests go to --url or, without it, to the app
+in-process with its lifespan running. The client and the app then share one
+event loop, so use --url for numbers that stand for a deployment.
+
+It prints p50/p95/p99 latency, throughput and errors per route. --save
+writes that report as JSON. --baseline compares the run with a saved report
+and exits 1 when a route's p95 grew past --tolerance, a route's error rate
+grew, or total throughput fell past --tolerance. Writes rows, so use a
+scratch database at `alembic upgrade head`. Needs httpx.
+
+    python benchmarks/load_test.py --users 1000 --duration 60 --save base.json
+    python benchmarks/load_test.py --no-seed --users 1000 --baseline base.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextlib import AsyncExitStack
+from datetime import date, time as clock, timedelta
+from uuid import UUID
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import insert
+
+import datagen as datagen
+import models as models
+import security as security
+from dbconf import SessionLocal
+
+PASSWORD = "password"
+CHUNK = 1000
+# p95 differences below this are noise, whatever --tolerance says
+MIN_SLOWDOWN = 0.005
+
+
+def email(index: int) -> str:
+    return f"load-{index}@example.com"
+
+
+def _uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def _insert(db, model, rows: list):
+    for start in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[start : start + CHUNK])
+
+
+def seed(args) -> dict:
+    rng = random.Random(args.seed)
+    today = date.today()
+    # one hash for every user, hashing each would take longer than the run
+    password = security.hash_password(PASSWORD)
+    users = [
+        {
+            "user_uuid": _uuid(rng),
+            "user_fname": "Load",
+            "user_lname": f"User{index}",
+            "user_email": email(index),
+            "user_password": password,
+            "is_confirmed": True,
+            "user_points": 10**9,
+            "user_avatar": "avatar",
+        }
+        for index in range(args.users)
+    ]
+    sprites = [
+        {
+            "sprite_uuid": _uuid(rng),
+            "sprite_source": f"load-{args.seed}-{index}",
+            "sprite_summon_chance": rng.choice((0.5, 1, 2, 5)),
+        }
+        for index in range(50)
+    ]
+    tasks = [
+        {
+            "task_uuid": _uuid(rng),
+            "task_details": datagen.sentence(rng, 8),
+            "task_priority": rng.choice(datagen.PRIORITIES),
+            "task_category": rng.choice(datagen.CATEGORIES),
+            "task_deadline": today + timedelta(days=rng.randint(-30, 60)),
+            "task_time": clock(rng.randint(7, 22), rng.choice((0, 15, 30, 45))),
+            "is_done": rng.random() < 0.3,
+            "user_uuid": user["user_uuid"],
+        }
+        for user in users
+        for _ in range(args.tasks)
+    ]
+    instances = [
+        {
+            "sprite_instance_uuid": _uuid(rng),
+            "acquisition_date": today,
+            "sprite_uuid": rng.choice(sprites)["sprite_uuid"],
+            "user_uuid": user["user_uuid"],
+        }
+        for user in users
+        for _ in range(args.sprites)
+    ]
+    ledger = [
+        {
+            "points_ledger_uuid": _uuid(rng),
+            "points_delta": user["user_points"],
+            "points_balance": user["user_points"],
+            "points_reason": "LOAD TEST",
+            "user_uuid": user["user_uuid"],
+        }
+        for user in users
+    ]
+    forums, members, comments = [], [], []
+    for index in range(args.forums):
+        forum_uuid = _uuid(rng)
+        joined = rng.sample(users, min(len(users), rng.randint(1, 10)))
+        forum_comments = [
+            {
+                "forum_comment_uuid": _uuid(rng),
+                "forum_comment": datagen.sentence(rng, 12),
+                "created_at": today - timedelta(days=rng.randint(0, 30)),
+                "forum_uuid": forum_uuid,
+                "user_uuid": rng.choice(joined)["user_uuid"],
+            }
+            for _ in range(args.comments)
+        ]
+        forums.append(
+            {
+                "forum_uuid": forum_uuid,
+                "forum_title": datagen.sentence(rng, 4),
+                "forum_category": rng.choice(datagen.CATEGORIES),
+                "forum_details": datagen.sentence(rng, 30),
+                "forum_status": "open",
+                "created_at": today - timedelta(days=rng.randint(0, 365)),
+                "comment_count": len(forum_comments),
+                "member_count": len(joined),
+            }
+        )
+        members += [
+            {
+                "forum_member_uuid": _uuid(rng),
+                "user_name": f"{user['user_fname']} {user['user_lname']}",
+                "is_owner": position == 0,
+                "created_at": today,
+                "forum_uuid": forum_uuid,
+                "user_uuid": user["user_uuid"],
+            }
+            for position, user in enumerate(joined)
+        ]
+        comments += forum_comments
+
+    db = SessionLocal()
+    try:
+        for model, rows in (
+            (models.User, users),
+            (models.Sprite, sprites),
+            (models.Task, tasks),
+            (models.SpriteInstance, instances),
+            (models.PointsLedger, ledger),
+            (models.Forum, forums),
+            (models.ForumMember, members),
+            (models.ForumComment, comments),
+        ):
+            _insert(db, model, rows)
+        if db.get_bind().dialect.name == "postgresql":
+            datagen.index_search(db)
+        db.commit()
+    finally:
+        db.close()
+    return {
+        "users": len(users),
+        "tasks": len(tasks),
+        "sprite_instances": len(instances),
+        "forums": len(forums),
+        "forum_members": len(members),
+        "forum_comments": len(comments),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def request(
+        self, client: httpx.AsyncClient, method: str, route: str, **kwargs
+    ) -> httpx.Response | None:
+        # route is the template, it names the row in the report
+        path = route.format(**kwargs.pop("path", {}))
+        key = f"{method} {route}"
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies.setdefault(key, []).append(time.perf_counter() - started)
+        if response is None or response.status_code >= 400:
+            self.errors[key] = self.errors.get(key, 0) + 1
+            return None
+        return response
+
+
+async def journey(client: httpx.AsyncClient, recorder: Recorder, rng, users: int):
+    login = await recorder.request(
+        client,
+        "POST",
+        "/api/v1/login",
+        data={"username": email(rng.randrange(users)), "password": PASSWORD},
+    )
+    if login is None:
+        return
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    tasks = await recorder.request(
+        client,
+        "GET",
+        "/api/v1/tasks",
+        params={"is_done": "false", "limit": 20},
+        headers=headers,
+    )
+    if tasks is not None and tasks.json()["data"]:
+        task = rng.choice(tasks.json()["data"])
+        await recorder.request(
+            client,
+            "PATCH",
+            "/api/v1/task/{task_uuid}",
+            path={"task_uuid": task["task_uuid"]},
+            headers=headers,
+        )
+    deadline = date.today() + timedelta(days=rng.randint(1, 30))
+    await recorder.request(
+        client,
+        "POST",
+        "/api/v1/task",
+        json={
+            "task_details": datagen.sentence(rng, 8),
+            "task_priority": rng.choice(datagen.PRIORITIES),
+            "task_category": rng.choice(datagen.CATEGORIES),
+            "task_deadline": deadline.isoformat(),
+            "task_time": "18:00:00",
+        },
+        headers=headers,
+    )
+
+    await recorder.request(client, "GET", "/api/v1/sprites", headers=headers)
+    await recorder.request(client, "POST", "/api/v1/sprites/single", headers=headers)
+
+    forums = await recorder.request(client, "GET", "/api/v1/forums", headers=headers)
+    if forums is None or not forums.json()["data"]:
+        return
+    forum_uuid = rng.choice(forums.json()["data"])["forum_uuid"]
+    await recorder.request(
+        client,
+        "GET",
+        "/api/v1/forum/{forum_uuid}",
+        path={"forum_uuid": forum_uuid},
+        headers=headers,
+    )
+    await recorder.request(
+        client,
+        "POST",
+        "/api/v1/comment",
+        json={"forum_comment": datagen.sentence(rng, 12), "forum_uuid": forum_uuid},
+        headers=headers,
+    )
+
+
+async def simulated_user(client, recorder: Recorder, rng, users: int, until: float):
+    while time.perf_counter() < until:
+        await journey(client, recorder, rng, users)
+
+
+async def run(args) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    async with AsyncExitStack() as stack:
+        if args.url:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=args.concurrency)
+            )
+            base_url = args.url
+        else:
+            from main import app
+
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            transport = httpx.ASGITransport(app=app)
+            base_url = "http://load-test"
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60)
+        )
+        started = time.perf_counter()
+        until = started + args.duration
+        await asyncio.gather(
+            *(
+                simulated_user(
+                    client,
+                    recorder,
+                    random.Random(f"{args.seed}-{index}"),
+                    args.users,
+                    until,
+                )
+                for index in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    # nearest rank
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    routes = {}
+    for key, latencies in sorted(recorder.latencies.items()):
+        ordered = sorted(latencies)
+        routes[key] = {
+            "requests": len(ordered),
+            "errors": recorder.errors.get(key, 0),
+            "rps": len(ordered) / elapsed,
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1],
+        }
+    requests = sum(route["requests"] for route in routes.values())
+    return {
+        "seconds": elapsed,
+        "requests": requests,
+        "errors": sum(route["errors"] for route in routes.values()),
+        "rps": requests / elapsed,
+        "routes": routes,
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"{'route':<34} {'reqs':>7} {'err':>5} {'rps':>8} "
+        f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    )
+    for key, route in report["routes"].items():
+        print(
+            f"{key:<34} {route['requests']:>7} {route['errors']:>5} "
+            f"{route['rps']:>8.1f} "
+            + " ".join(
+                f"{route[name] * 1000:>6.1f}ms" for name in ("p50", "p95", "p99", "max")
+            )
+        )
+    print(
+        f"{report['requests']} requests, {report['errors']} errors in "
+        f"{report['seconds']:.1f}s, {report['rps']:.1f} requests/s"
+    )
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for key, base in baseline["routes"].items():
+        route = report["routes"].get(key)
+        if route is None:
+            found.append(f"{key}: not requested")
+            continue
+        slowdown = route["p95"] - base["p95"]
+        if route["p95"] > base["p95"] * (1 + tolerance) and slowdown > MIN_SLOWDOWN:
+            found.append(
+                f"{key}: p95 {route['p95'] * 1000:.1f}ms, "
+                f"baseline {base['p95'] * 1000:.1f}ms"
+            )
+        error_rate = route["errors"] / route["requests"]
+        base_error_rate = base["errors"] / base["requests"]
+        if error_rate > base_error_rate + 0.01:
+            found.append(
+                f"{key}: {error_rate:.1%} errors, baseline {base_error_rate:.1%}"
+            )
+    if report["rps"] < baseline["rps"] * (1 - tolerance):
+        found.append(
+            f"throughput {report['rps']:.1f} requests/s, "
+            f"baseline {baseline['rps']:.1f}"
+        )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base url of a running server")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=50, help="per user")
+    parser.add_argument("--sprites", type=int, default=10, help="per user")
+    parser.add_argument("--forums", type=int, default=100)
+    parser.add_argument("--comments", type=int, default=20, help="per forum")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-seed", action="store_true", help="reuse seeded users")
+    parser.add_argument("--seed-only", action="store_true")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        started = time.perf_counter()
+        counts = seed(args)
+        print(
+            "seeded "
+            + ", ".join(f"{count} {name}" for name, count in counts.items())
+            + f" in {time.perf_counter() - started:.1f}s"
+        )
+    if args.seed_only:
+        return
+
+    recorder, elapsed = asyncio.run(run(args))
+    report = summarize(recorder, elapsed)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(
+                {
+                    **report,
+                    "config": {
+                        "url": args.url,
+                        "users": args.users,
+                        "concurrency": args.concurrency,
+                        "duration": args.duration,
+                    },
+                },
+                file,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(report, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Outbox delivery check against a local SMTP stand-in.
+
+Starts a minimal plain-text SMTP server on a free local port, points
+mailer.py at it with SMTP_STARTTLS=false, queues one email it accepts and
+one it refuses with a temporary 451, and drains the outbox once. Exits
+non-zero unless the first row is "sent" and the stand-in received it, and
+the second is still "pending" with one attempt, the error and a later
+next_attempt_at. Writes rows, so use a scratch database at
+`alembic upgrade head`.
+
+    python benchmarks/mailer_smtp.py
+"""
+
+import argparse
+import os
+import socketserver
+import sys
+import threading
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dbops as dbops
+import mailer as mailer
+import models as models
+import schemas as schemas
+from dbconf import SessionLocal
+
+# the stand-in answers 451 to RCPT TO for this mailbox
+REFUSED = "refused"
+
+
+class StandIn(socketserver.StreamRequestHandler):
+    # just enough of RFC 5321 for smtplib: no extensions, no auth
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 stand-in ready")
+        recipients = []
+        while line := self.rfile.readline():
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                self.reply("250 stand-in")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                if REFUSED in command:
+                    self.reply("451 try again later")
+                else:
+                    recipients.append(command.split(":", 1)[1].strip(" <>"))
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 end with .")
+                message = []
+                while (data := self.rfile.readline()) not in (b".\r\n", b""):
+                    message.append(data.decode())
+                self.server.received.append((recipients, "".join(message)))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    standin = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StandIn)
+    standin.daemon_threads = True
+    standin.received = []
+    threading.Thread(target=standin.serve_forever, daemon=True).start()
+    os.environ.update(
+        SMTP_SERVER="127.0.0.1",
+        SMTP_PORT=str(standin.server_address[1]),
+        SMTP_STARTTLS="false",
+        SENDER_EMAIL="studyplan@example.com",
+        SENDER_PASSWORD="",
+    )
+
+    run = uuid4().hex
+    accepted = f"accepted-{run}@example.com"
+    refused = f"{REFUSED}-{run}@example.com"
+    db = SessionLocal()
+    try:
+        for recipient in (accepted, refused):
+            dbops.queue_email(
+                db,
+                schemas.EmailAddToDB(
+                    email_recipient=recipient,
+                    email_subject=f"stand-in {run}",
+                    email_body="outbox check",
+                ),
+            )
+        smtp = mailer.Mailer()
+        try:
+            mailer.drain(db, smtp)
+        finally:
+            smtp.close()
+        rows = {
+            email.email_recipient: email
+            for email in db.query(models.EmailOutbox).filter(
+                models.EmailOutbox.email_recipient.in_([accepted, refused])
+            )
+        }
+        sent, retry = rows[accepted], rows[refused]
+        problems = []
+        if sent.email_status != "sent" or sent.sent_at is None:
+            problems.append(f"accepted email is {sent.email_status}")
+        if not any(
+            accepted in recipients and f"stand-in {run}" in message
+            for recipients, message in standin.received
+        ):
+            problems.append("the stand-in did not receive the accepted email")
+        if retry.email_status != "pending" or retry.email_attempts != 1:
+            problems.append(
+                f"refused email is {retry.email_status} "
+                f"after {retry.email_attempts} attempts"
+            )
+        if not retry.email_error or "451" not in retry.email_error:
+            problems.append(f"refused email recorded {retry.email_error!r}")
+        if retry.next_attempt_at <= retry.created_at:
+            problems.append("refused email was not rescheduled")
+        print(
+            f"{accepted}: {sent.email_status}\n"
+            f"{refused}: {retry.email_status}, attempts {retry.email_attempts}, "
+            f"next attempt {retry.next_attempt_at}"
+        )
+        db.query(models.EmailOutbox).filter(
+            models.EmailOutbox.email_recipient.in_([accepted, refused])
+        ).delete()
+        db.commit()
+    finally:
+        db.close()
+        standin.shutdown()
+
+    for problem in problems:
+        print(problem)
+    print("failed" if problems else "ok")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
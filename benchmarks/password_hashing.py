@@ -0,0 +1,72 @@
+"""Login throughput of the password hashing service.
+
+Runs ``--logins`` verifications through ``hashing.verify_password`` with
+``--concurrency`` coroutines in flight and reports logins/sec and
+logins/sec/core, next to the same numbers for the legacy unsalted sha256
+check. No database is involved, so this measures the hashing ceiling of a
+single worker process. Tune SCRYPT_N / HASH_WORKERS through the environment.
+
+    python benchmarks/password_hashing.py --logins 500 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import consts as consts
+import hashing as hashing
+import security as security
+
+
+async def run_logins(logins: int, concurrency: int, stored: str) -> float:
+    remaining = iter(range(logins))
+
+    async def client():
+        for _ in remaining:
+            assert await hashing.verify_password("correct horse", stored)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+def run_legacy(logins: int) -> float:
+    stored = hashlib.sha256(b"correct horse").hexdigest()
+    started = time.perf_counter()
+    for _ in range(logins):
+        candidate = hashlib.sha256(b"correct horse").hexdigest()
+        assert hmac.compare_digest(candidate, stored)
+    return time.perf_counter() - started
+
+
+def report(name: str, logins: int, elapsed: float, cores: int):
+    rate = logins / elapsed
+    print(f"{name:<8} {rate:>12.1f} logins/s {rate / cores:>12.1f} logins/s/core")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    cores = consts.HASH_WORKERS
+    stored = security.hash_password("correct horse")
+    print(
+        f"scrypt N={consts.SCRYPT_N} r={consts.SCRYPT_R} p={consts.SCRYPT_P}, "
+        f"{cores} hashing workers, {os.cpu_count()} cpus"
+    )
+    elapsed = asyncio.run(run_logins(args.logins, args.concurrency, stored))
+    report("scrypt", args.logins, elapsed, cores)
+    report("sha256", args.logins, run_legacy(args.logins), 1)
+    hashing.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Concurrency stress check for the points ledger.
+
+Hammers one throwaway user from ``--threads`` threads, mixing
+``dbops.complete_session`` credits with ``dbops.gacha_life``-sized debits,
+then checks that no update was lost: the final ``user_points`` must equal
+the credits minus the debits that succeeded, the ledger must hold one entry
+per successful operation and sum to the same value, and the balance must
+never have gone negative. Exits non-zero on any mismatch or when a worker
+hits an error. Needs a sprite catalog and DB_POOL_SIZE >= --threads. Run it
+against Postgres, whose row locks are what it exercises.
+
+    python benchmarks/points_stress.py --threads 16 --iterations 200
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func
+
+import consts as consts
+import dbops as dbops
+import models as models
+from dbconf import SessionLocal
+
+
+def worker(user_uuid, iterations: int, counts: dict, lock: threading.Lock):
+    credits = debits = refused = 0
+    db = SessionLocal()
+    try:
+        for i in range(iterations):
+            if i % 3 == 2:
+                try:
+                    dbops.gacha_life(db, user_uuid, 1)
+                    debits += 1
+                except PermissionError:
+                    db.rollback()
+                    refused += 1
+            else:
+                dbops.complete_session(db, user_uuid)
+                credits += 1
+    except Exception as e:
+        # the operations counted so far still committed
+        with lock:
+            counts["errors"].append(repr(e))
+    finally:
+        db.close()
+        with lock:
+            counts["credits"] += credits
+            counts["debits"] += debits
+            counts["refused"] += refused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    db_user = models.User(
+        user_email=f"stress-{time.time_ns()}@studyplan.invalid",
+        user_password="",
+        user_fname="Points",
+        user_lname="Stress",
+        user_avatar="",
+        is_confirmed=True,
+    )
+    db.add(db_user)
+    db.commit()
+    user_uuid = db_user.user_uuid
+
+    counts = {"credits": 0, "debits": 0, "refused": 0, "errors": []}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(user_uuid, args.iterations, counts, lock))
+        for _ in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected = (
+        counts["credits"] * consts.SESSION_POINTS
+        - counts["debits"] * consts.GACHA_PULL_COST
+    )
+    user_points = (
+        db.query(models.User.user_points)
+        .filter(models.User.user_uuid == user_uuid)
+        .scalar()
+    )
+    ledger_entries, ledger_total, lowest_balance = (
+        db.query(
+            func.count(models.PointsLedger.points_ledger_uuid),
+            func.coalesce(func.sum(models.PointsLedger.points_delta), 0),
+            func.coalesce(func.min(models.PointsLedger.points_balance), 0),
+        )
+        .filter(models.PointsLedger.user_uuid == user_uuid)
+        .one()
+    )
+    operations = counts["credits"] + counts["debits"] + counts["refused"]
+    print(
+        f"{operations} operations in {elapsed:.2f}s ({operations / elapsed:.0f}/s): "
+        f"{counts['credits']} credits, {counts['debits']} debits, "
+        f"{counts['refused']} refused"
+    )
+    print(
+        f"expected {expected}, user_points {user_points}, ledger {ledger_total} "
+        f"in {ledger_entries} entries"
+    )
+
+    db.query(models.SpriteInstance).filter(
+        models.SpriteInstance.user_uuid == user_uuid
+    ).delete()
+    db.query(models.PointsLedger).filter(
+        models.PointsLedger.user_uuid == user_uuid
+    ).delete()
+    db.query(models.User).filter(models.User.user_uuid == user_uuid).delete()
+    db.commit()
+    db.close()
+
+    problems = [f"worker failed: {error}" for error in counts["errors"]]
+    if user_points != expected or ledger_total != expected:
+        problems.append("lost update detected")
+    if ledger_entries != counts["credits"] + counts["debits"]:
+        problems.append("ledger entries do not match the operations")
+    if lowest_balance < 0:
+        problems.append("balance went negative")
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
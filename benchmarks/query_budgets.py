@@ -0,0 +1,266 @@
+"""Query budget check for every route in main.py.
+
+Seeds a user, sprites, forums, comments and tasks, then calls each route
+once through the ASGI app, websocket routes included. Fails when a route
+does not succeed, runs more statements than its budget or repeats one
+statement shape more than it is allowed to (the usual sign of a query in a
+loop). The seed makes every list at least three items long so loops show
+up. Writes rows, so point SQLALCHEMY_DATABASE_URL at a scratch database
+that is at `alembic upgrade head`. Needs httpx.
+
+    python benchmarks/query_budgets.py [--verbose]
+"""
+
+import argparse
+import os
+import sys
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import models as models
+import querybudget as querybudget
+import security as security
+from dbconf import SessionLocal, engine
+from main import app
+
+SEED_ITEMS = 3
+
+# method, path, request options, statement budget, allowed repeats per shape.
+# paths are formatted with the ids collected while seeding. WEBSOCKET routes
+# are connected to and closed again.
+ROUTES = [
+    ("POST", "/api/v1/login", {"data": "login"}, 2, 1),
+    ("POST", "/api/v1/register", {"json": "register"}, 2, 1),
+    ("POST", "/api/v1/forgot", {"json": {"user_email": "{email}"}}, 1, 1),
+    ("GET", "/api/v1/user", {}, 1, 1),
+    ("GET", "/api/v1/users", {}, 1, 1),
+    ("GET", "/api/v1/pool", {}, 0, 1),
+    ("PATCH", "/api/v1/password", {"json": "password"}, 2, 1),
+    ("PATCH", "/api/v1/recover", {"json": "recover"}, 2, 1),
+    ("PATCH", "/api/v1/push", {"json": {"push_notif": True}}, 2, 1),
+    ("GET", "/api/v1/points", {}, 0, 1),
+    ("GET", "/api/v1/points/me", {}, 0, 1),
+    ("GET", "/api/v1/sprites", {}, 2, 1),
+    ("POST", "/api/v1/sprites/single", {}, 4, 1),
+    ("POST", "/api/v1/sprites/ten", {}, 4, 1),
+    ("POST", "/api/v1/sprites/pull", {"json": {"pulls": 5}}, 4, 1),
+    ("PATCH", "/api/v1/avatar", {"json": {"user_avatar": "avatar"}}, 4, 1),
+    ("POST", "/api/v1/task", {"json": "task"}, 2, 1),
+    ("PATCH", "/api/v1/task", {"json": "task_update"}, 2, 1),
+    ("PATCH", "/api/v1/task/{task_uuid}", {}, 4, 1),
+    ("POST", "/api/v1/tasks/batch", {"json": "task_batch"}, 8, 1),
+    ("PATCH", "/api/v1/session", {}, 2, 1),
+    ("GET", "/api/v1/tasks", {}, 2, 1),
+    ("GET", "/api/v1/task/{task_uuid}", {}, 1, 1),
+    ("POST", "/api/v1/forum", {"json": "forum"}, 3, 1),
+    (
+        "POST",
+        "/api/v1/comment",
+        {"json": {"forum_comment": "hi", "forum_uuid": "{forum_uuid}"}},
+        5,
+        1,
+    ),
+    ("GET", "/api/v1/forums", {}, 2, 1),
+    ("GET", "/api/v1/search", {"params": {"q": "title"}}, 1, 1),
+    ("GET", "/api/v1/{user_uuid}/forums", {}, 1, 1),
+    ("GET", "/api/v1/logs", {}, 1, 1),
+    ("GET", "/api/v1/logs/buffer", {}, 0, 1),
+    ("GET", "/api/v1/logs/export", {"params": {"user_uuid": "{user_uuid}"}}, 1, 1),
+    ("GET", "/api/v1/{user_uuid}/comments", {}, 1, 1),
+    ("GET", "/api/v1/forum/{forum_uuid}", {}, 4, 1),
+    ("WEBSOCKET", "/api/v1/forums/live", {}, 0, 1),
+    ("WEBSOCKET", "/api/v1/forum/{forum_uuid}/live", {}, 0, 1),
+    ("GET", "/api/v1/live", {}, 0, 1),
+    ("GET", "/api/v1/reminders", {}, 0, 1),
+    ("GET", "/metrics", {}, 0, 1),
+    ("DELETE", "/api/v1/comment/{comment_uuid}", {}, 4, 1),
+    ("DELETE", "/api/v1/task/{task_uuid}", {}, 2, 1),
+    ("DELETE", "/api/v1/forums/{forum_uuid}", {}, 4, 1),
+    ("POST", "/api/v1/confirm/{email}", {}, 2, 1),
+    ("POST", "/api/v1/disable/{email}", {}, 2, 1),
+]
+
+# routes that cannot succeed here, with the status they answer instead.
+# register never sets users.user_avatar, which is NOT NULL, so sign-up fails
+# on every database until it picks a default avatar. its budget still holds.
+EXPECTED_FAILURES = {"/api/v1/register": 400}
+
+# full-text search only exists on postgres
+POSTGRES_ONLY = {"/api/v1/search"}
+
+
+class BudgetedApp:
+    # outermost ASGI layer, keeps the statements of the last request
+    def __init__(self, app):
+        self.app = app
+        self.last = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        method = scope.get("method", "WEBSOCKET")
+        # kept before the call, a closed test websocket cancels the app
+        with querybudget.track(f"{method} {scope['path']}") as stats:
+            self.last = stats
+            await self.app(scope, receive, send)
+
+
+def bodies(ids: dict) -> dict:
+    task = {
+        "task_details": "details",
+        "task_priority": "High",
+        "task_category": "category",
+        "task_deadline": "2030-01-01",
+        "task_time": "10:00:00",
+    }
+    return {
+        "login": {"username": ids["email"], "password": "password"},
+        "register": {
+            "user_email": f"{uuid4().hex}@example.com",
+            "user_password": "password",
+            "user_fname": "Query",
+            "user_lname": "Budget",
+        },
+        "password": {"old_password": "password", "new_password": "password"},
+        "recover": {"user_email": ids["email"], "new_password": "password"},
+        "task": task,
+        "task_update": {**task, "task_uuid": ids["task_uuid"]},
+        "task_batch": {
+            "create": [task] * SEED_ITEMS,
+            "complete": [ids["task_uuid"]],
+            "delete": [str(uuid4())],
+        },
+        "forum": {
+            "forum_title": "title",
+            "forum_category": "category",
+            "forum_details": "details",
+            "forum_status": "open",
+        },
+    }
+
+
+def _format(value, ids: dict):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        return {key: _format(item, ids) for key, item in value.items()}
+    return value
+
+
+def seed(client: TestClient) -> tuple[dict, dict]:
+    email = f"{uuid4().hex}@example.com"
+    db = SessionLocal()
+    try:
+        user = models.User(
+            user_email=email,
+            user_password=security.hash_password("password"),
+            user_fname="Query",
+            user_lname="Budget",
+            user_avatar="avatar",
+            user_points=10000,
+            is_confirmed=True,
+        )
+        db.add(user)
+        if db.query(models.Sprite).count() < SEED_ITEMS:
+            for i in range(SEED_ITEMS):
+                db.add(
+                    models.Sprite(
+                        sprite_source=f"budget-{uuid4().hex}", sprite_summon_chance=1
+                    )
+                )
+        db.commit()
+        ids = {"email": email, "user_uuid": str(user.user_uuid)}
+    finally:
+        db.close()
+
+    token = client.post(
+        "/api/v1/login", data={"username": email, "password": "password"}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    payloads = bodies({**ids, "task_uuid": None})
+    for _ in range(SEED_ITEMS):
+        client.post("/api/v1/forum", json=payloads["forum"], headers=headers)
+        client.post("/api/v1/task", json=payloads["task"], headers=headers)
+        client.post("/api/v1/sprites/single", headers=headers)
+    forums = client.get(f"/api/v1/{ids['user_uuid']}/forums", headers=headers)
+    ids["forum_uuid"] = forums.json()["data"][0]["forum_uuid"]
+    for _ in range(SEED_ITEMS):
+        client.post(
+            "/api/v1/comment",
+            json={"forum_comment": "hi", "forum_uuid": ids["forum_uuid"]},
+            headers=headers,
+        )
+    comments = client.get(f"/api/v1/{ids['user_uuid']}/comments", headers=headers)
+    ids["comment_uuid"] = comments.json()["data"][0]["forum_comment_uuid"]
+    tasks = client.get("/api/v1/tasks", headers=headers)
+    ids["task_uuid"] = tasks.json()["data"][0]["task_uuid"]
+    return ids, headers
+
+
+def call(client: TestClient, method: str, path: str, headers: dict, **options):
+    # the status code, 101 for an accepted websocket
+    if method != "WEBSOCKET":
+        return client.request(method, path, headers=headers, **options).status_code
+    try:
+        with client.websocket_connect(path, headers=headers):
+            return 101
+    except WebSocketDisconnect as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verbose", action="store_true", help="print every shape")
+    args = parser.parse_args()
+
+    budgeted = BudgetedApp(app)
+    failures = 0
+    with TestClient(budgeted) as client:
+        ids, headers = seed(client)
+        payloads = bodies(ids)
+        for method, path, options, max_queries, max_repeats in ROUTES:
+            if path in POSTGRES_ONLY and engine.dialect.name != "postgresql":
+                print(f"skip {method:<9} {path} needs postgres")
+                continue
+            options = {
+                key: (
+                    payloads[value]
+                    if isinstance(value, str) and value in payloads
+                    else _format(value, ids)
+                )
+                for key, value in options.items()
+            }
+            budgeted.last = None
+            status_code = call(client, method, path.format(**ids), headers, **options)
+            stats = budgeted.last
+            expected = EXPECTED_FAILURES.get(path)
+            try:
+                if expected is not None and status_code != expected:
+                    raise AssertionError(f"answered {status_code}, not {expected}")
+                succeeded = 200 <= status_code < 300 or status_code == 101
+                if expected is None and not succeeded:
+                    raise AssertionError(f"answered {status_code}")
+                stats.check(max_queries, max_repeats)
+                outcome = "ok"
+            except querybudget.QueryBudgetExceeded as e:
+                failures += 1
+                outcome = f"OVER {e}"
+            except AssertionError as e:
+                failures += 1
+                outcome = f"FAILED {e}"
+            print(
+                f"{status_code} {stats.count:>3}/{max_queries:<3} "
+                f"{stats.seconds * 1000:>7.1f}ms {method:<9} {path} {outcome}"
+            )
+            if args.verbose:
+                for shape, count in stats.shapes.items():
+                    print(f"      x{count} {shape}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Serialization throughput of /forums and /tasks, before and after the fast path.
+
+"before" loads ORM objects the way the routes used to and encodes them the way
+FastAPI did for a response without a model: jsonable_encoder, then json.dumps.
+"after" is the current path: dbops projects rows onto the schemas class and
+serialization.dumps encodes the dicts natively. Each is timed on its own
+(encode only) and together with the query (query + encode). Seeds --rows
+tasks and forums for a throwaway user, so use a scratch database.
+
+    python benchmarks/serialization.py --rows 1000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, time as clock
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert
+
+import dbops as dbops
+import models as models
+import serialization as serialization
+from dbconf import SessionLocal
+
+
+def seed(db, rows: int):
+    user = models.User(
+        user_email=f"{uuid4().hex}@example.com",
+        user_password="-",
+        user_fname="Serialization",
+        user_lname="Benchmark",
+        user_avatar="avatar",
+    )
+    db.add(user)
+    db.flush()
+    db.execute(
+        insert(models.Task),
+        [
+            {
+                "task_uuid": uuid4(),
+                "task_details": f"task {i} " + "x" * 60,
+                "task_priority": "Normal",
+                "task_category": "Study",
+                "task_deadline": date.today(),
+                "task_time": clock(9),
+                "is_done": False,
+                "user_uuid": user.user_uuid,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.execute(
+        insert(models.Forum),
+        [
+            {
+                "forum_uuid": uuid4(),
+                "forum_title": f"forum {i}",
+                "forum_category": "Study",
+                "forum_details": "x" * 200,
+                "forum_status": "open",
+                "created_at": date.today(),
+                "comment_count": 0,
+                "member_count": 1,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.commit()
+    return str(user.user_uuid)
+
+
+def legacy_tasks(db, user_uuid: str):
+    return db.query(models.Task).filter(models.Task.user_uuid == user_uuid).all()
+
+
+def legacy_forums(db, limit: int):
+    return (
+        db.query(models.Forum)
+        .order_by(models.Forum.created_at.desc(), models.Forum.forum_uuid.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def legacy_encode(content) -> bytes:
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def timed(operation, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        operation()
+    return (time.perf_counter() - started) / repeat
+
+
+def report(name: str, rows: int, seconds: float):
+    print(f"{name:<34} {seconds * 1000:>9.2f}ms {rows / seconds:>12.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user_uuid = seed(db, args.rows)
+        cases = {
+            "tasks": (
+                lambda: legacy_tasks(db, user_uuid),
+                lambda: dbops.get_tasks(db, user_uuid)[0],
+            ),
+            "forums": (
+                lambda: legacy_forums(db, args.rows),
+                lambda: dbops.get_forums(db, args.rows)[0],
+            ),
+        }
+        for name, (before, after) in cases.items():
+            objects, rows = before(), after()
+            db.expunge_all()
+            report(
+                f"{name} before encode",
+                len(rows),
+                timed(lambda: legacy_encode({"data": objects}), args.repeat),
+            )
+            report(
+                f"{name} after encode",
+                len(rows),
+                timed(lambda: serialization.dumps({"data": rows}), args.repeat),
+            )
+
+            def before_request():
+                legacy_encode({"data": before()})
+                db.expunge_all()
+
+            report(
+                f"{name} before query + encode",
+                len(rows),
+                timed(before_request, args.repeat),
+            )
+            report(
+                f"{name} after query + encode",
+                len(rows),
+                timed(lambda: serialization.dumps({"data": after()}), args.repeat),
+            )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
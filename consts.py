@@ -1,12 +1,48 @@
 # modules used
-# from dotenv import load_dotenv
+from dotenv import load_dotenv
 import os
 
-# loads the environment variables
-# load_dotenv()
+# loads the environment variables, before any module reads them. variables
+# already set in the environment win over .env
+load_dotenv()
 
 # environment variables
 SECRET_KEY: str = os.environ.get('SECRET_KEY')
 ALGORITHM: str = "HS256"
 REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 ACCESS_TOKEN_EXPIRE_HOURS: int = 1
+LEADERBOARD_REFRESH_SECONDS: int = int(
+    os.environ.get('LEADERBOARD_REFRESH_SECONDS', 60)
+)
+GACHA_PULL_COST: int = 20
+GACHA_MAX_PULLS: int = int(os.environ.get('GACHA_MAX_PULLS', 100))
+GACHA_CATALOG_TTL: int = int(os.environ.get('GACHA_CATALOG_TTL', 60))
+SESSION_POINTS: int = 5
+TASK_PRIORITY_POINTS: dict = {"High": 5, "Normal": 3, "Low": 1}
+LOG_BUFFER_SIZE: int = int(os.environ.get('LOG_BUFFER_SIZE', 10000))
+LOG_BATCH_SIZE: int = int(os.environ.get('LOG_BATCH_SIZE', 500))
+LOG_FLUSH_INTERVAL: float = float(os.environ.get('LOG_FLUSH_INTERVAL', 1))
+TOKEN_CACHE_SIZE: int = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL: int = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+SCRYPT_N: int = int(os.environ.get('SCRYPT_N', 2**14))
+SCRYPT_R: int = int(os.environ.get('SCRYPT_R', 8))
+SCRYPT_P: int = int(os.environ.get('SCRYPT_P', 1))
+HASH_WORKERS: int = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 1))
+HASH_QUEUE_TIMEOUT: float = float(os.environ.get('HASH_QUEUE_TIMEOUT', 5))
+QUERY_WARN_COUNT: int = int(os.environ.get('QUERY_WARN_COUNT', 25))
+LOG_EXPORT_CHUNK: int = int(os.environ.get('LOG_EXPORT_CHUNK', 1000))
+SEARCH_CONFIG: str = "english"
+SEARCH_HEADLINE: str = "MaxFragments=2, MaxWords=24, MinWords=8"
+TASK_BATCH_MAX: int = int(os.environ.get('TASK_BATCH_MAX', 100))
+LIVE_QUEUE_SIZE: int = int(os.environ.get('LIVE_QUEUE_SIZE', 64))
+LIVE_MAX_SUBSCRIBERS: int = int(os.environ.get('LIVE_MAX_SUBSCRIBERS', 20000))
+REMINDER_LEAD: int = int(os.environ.get('REMINDER_LEAD', 1800))
+REMINDER_HORIZON: int = int(os.environ.get('REMINDER_HORIZON', 3600))
+REMINDER_GRACE: int = int(os.environ.get('REMINDER_GRACE', 3600))
+REMINDER_CAPACITY: int = int(os.environ.get('REMINDER_CAPACITY', 100000))
+REMINDER_BATCH_SIZE: int = int(os.environ.get('REMINDER_BATCH_SIZE', 500))
+REMINDER_SCAN_INTERVAL: float = float(os.environ.get('REMINDER_SCAN_INTERVAL', 60))
+SERVER_WORKERS: int = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))
+SERVER_BACKLOG: int = int(os.environ.get('SERVER_BACKLOG', 2048))
+SERVER_KEEP_ALIVE: int = int(os.environ.get('SERVER_KEEP_ALIVE', 65))
+SERVER_GRACEFUL_TIMEOUT: int = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -6,10 +7,50 @@ from os import getenv
 
 load_dotenv()
 
-SQLALCHEMY_DATABASE_URL = getenv('SQLALCHEMY_DATABASE_URL')
+import dbpool as dbpool
+import metrics as metrics
+import querybudget as querybudget
+
+
+def get_async_database_url(url: str):
+    url = make_url(url)
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg")
+    return url
+
+
+SQLALCHEMY_DATABASE_URL = make_url(getenv('SQLALCHEMY_DATABASE_URL'))
+SQLALCHEMY_ASYNC_DATABASE_URL = make_url(
+    getenv('SQLALCHEMY_ASYNC_DATABASE_URL')
+    or get_async_database_url(SQLALCHEMY_DATABASE_URL)
+)
+
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
+    SQLALCHEMY_DATABASE_URL,
+    **dbpool.engine_options(SQLALCHEMY_DATABASE_URL, dbpool.TimedQueuePool)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    **dbpool.engine_options(SQLALCHEMY_ASYNC_DATABASE_URL, dbpool.TimedAsyncQueuePool)
+)
+querybudget.install(engine)
+querybudget.install(async_engine.sync_engine)
+metrics.install(engine, "sync")
+metrics.install(async_engine.sync_engine, "async")
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
+
+
+def pool_status() -> dict:
+    return {
+        "sync": dbpool.pool_status(engine.pool, "sync"),
+        "async": dbpool.pool_status(async_engine.pool, "async"),
+    }
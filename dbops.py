@@ -1,32 +1,98 @@
-from datetime import date
+import html
+from datetime import date, time
+from operator import itemgetter
 from uuid import UUID
 
-from sqlalchemy.orm import Session, joinedload, load_only
-
+from sqlalchemy import (
+    Date,
+    Float,
+    String,
+    Uuid,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    tuple_,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+import consts as consts
+import etag as etag
+import gacha as gacha
+import leaderboard as leaderboard
+import livehub as livehub
+import metrics as metrics
 import models as models
+import pagination as pagination
+import reminders as reminders
 import schemas as schemas
 import security as security
 
 
-def login(db: Session, username: str, password: str):
-    password = security.hash_password(password)
-    user = (
-        db.query(models.User)
-        .filter(models.User.user_email == username)
-        .filter(models.User.user_password == password)
-    )
-    if user.first() is None:
-        raise PermissionError(f"Incorrect username or password")
-    check_confirm = user.first()
-    if check_confirm.is_confirmed:
-        user.update({"last_login": date.today()})
-        return check_confirm
-    else:
+def get_login_user(db: Session, username: str):
+    return db.query(models.User).filter(models.User.user_email == username).first()
+
+
+def record_login(db: Session, user: models.User, hashed_password: str | None = None):
+    if not user.is_confirmed:
         raise PermissionError(f"Email is not confirmed")
+    user.last_login = date.today()
+    if hashed_password is not None:
+        user.user_password = hashed_password
+    db.commit()
+    return user
+
+
+def _columns(model, schema) -> list:
+    # exactly the columns a response schema exposes
+    return [getattr(model, name) for name in schema.model_fields]
+
+
+def _rows(db: Session, statement) -> list[dict]:
+    return [dict(row) for row in db.execute(statement).mappings()]
 
 
-def register(db: Session, user: schemas.UserRegister):
-    hashed_password = security.hash_password(user.user_password)
+def get_version(db: Session, key: str) -> int:
+    version = db.execute(
+        select(models.CacheVersion.version).where(
+            models.CacheVersion.version_key == key
+        )
+    ).scalar_one_or_none()
+    return version or 0
+
+
+def _bump_versions(db: Session, *keys: str):
+    # one upsert in the caller's transaction, so a version only moves when the
+    # write it stands for commits. sorted keys keep concurrent bumps from
+    # locking the same rows in a different order.
+    if not keys:
+        return
+    statement = postgresql.insert(models.CacheVersion).values(
+        [{"version_key": key, "version": 1} for key in sorted(set(keys))]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[models.CacheVersion.version_key],
+            set_={"version": models.CacheVersion.version + 1},
+        )
+    )
+
+
+def register(
+    db: Session,
+    user: schemas.UserRegister,
+    hashed_password: str,
+    email: schemas.EmailAddToDB,
+):
     db_user = models.User(
         user_email=user.user_email,
         user_password=hashed_password,
@@ -34,49 +100,66 @@ def register(db: Session, user: schemas.UserRegister):
         user_lname=user.user_lname,
     )
     db.add(db_user)
+    _queue_email(db, email)
     db.commit()
+    leaderboard.record(db_user.user_uuid, 0)
 
 
-def add_log(db: Session, log: schemas.UserLogs):
-    db_user = models.UserLog(
-        user_log_details=log.user_log_details, user_uuid=log.user_uuid
+def _queue_email(db: Session, email: schemas.EmailAddToDB):
+    # written in the caller's transaction, mailer.py delivers it once committed
+    db_email = models.EmailOutbox(
+        email_recipient=email.email_recipient,
+        email_subject=email.email_subject,
+        email_body=email.email_body,
     )
-    db.add(db_user)
+    db.add(db_email)
+
+
+def queue_email(db: Session, email: schemas.EmailAddToDB):
+    _queue_email(db, email)
     db.commit()
 
 
-def confirm_email(db: Session, user_email: str):
+def add_logs(db: Session, logs: list[dict]):
+    db.execute(insert(models.UserLog), logs)
+    db.commit()
+
+
+def confirm_email(db: Session, user_email: str, email: schemas.EmailAddToDB):
     db_user = db.query(models.User).filter(models.User.user_email == user_email)
     if db_user:
         db_user.update({"is_confirmed": True})
+        _queue_email(db, email)
         db.commit()
 
 
-def disable_user(db: Session, user_email: str):
+def disable_user(db: Session, user_email: str, email: schemas.EmailAddToDB):
     db_user = db.query(models.User).filter(models.User.user_email == user_email)
     if db_user:
         db_user.update({"is_confirmed": False})
+        _queue_email(db, email)
         db.commit()
 
 
-def change_password(db: Session, user_uuid: UUID, old_password: str, new_password: str):
-    old_password = security.hash_password(old_password)
-    new_password = security.hash_password(new_password)
-    db_user = (
-        db.query(models.User)
+def get_password_hash(db: Session, user_uuid: UUID) -> str | None:
+    return (
+        db.query(models.User.user_password)
         .filter(models.User.user_uuid == user_uuid)
-        .filter(models.User.user_password == old_password)
-        .first()
+        .scalar()
+    )
+
+
+def change_password(db: Session, user_uuid: UUID, hashed_password: str):
+    db.query(models.User).filter(models.User.user_uuid == user_uuid).update(
+        {"user_password": hashed_password}
     )
-    db_user.user_password = new_password
     db.commit()
 
 
-def recover_password(db: Session, user_email: str, new_password: str):
-    new_password = security.hash_password(new_password)
+def recover_password(db: Session, user_email: str, hashed_password: str):
     db_user = db.query(models.User).filter(models.User.user_email == user_email).first()
     if db_user:
-        db_user.user_password = new_password
+        db_user.user_password = hashed_password
         db.commit()
     else:
         raise PermissionError("User not found")
@@ -84,23 +167,30 @@ def recover_password(db: Session, user_email: str, new_password: str):
 
 def toggle_push(db: Session, user_uuid: UUID, toggle: bool):
     db_user = db.query(models.User).filter(models.User.user_uuid == user_uuid).first()
-    print(toggle)
     db_user.push_notif = toggle
     db.commit()
 
 
-def get_points(db: Session):
-    db_user = db.query(models.User.user_uuid, models.User.user_points).all()
-    results = [
-        {"user_uuid": user_uuid, "user_points": user_points}
-        for user_uuid, user_points in db_user
-    ]
-    return results
+def get_logs(db: Session):
+    return _rows(db, select(*_columns(models.UserLog, schemas.UserLogEntry)))
 
 
-def get_logs(db: Session):
-    db_user = db.query(models.UserLog).all()
-    return db_user
+def log_export_query(
+    user_uuid: UUID | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    details: list[str] | None = None,
+):
+    query = select(*_columns(models.UserLog, schemas.UserLogEntry))
+    if user_uuid is not None:
+        query = query.where(models.UserLog.user_uuid == user_uuid)
+    if date_from is not None:
+        query = query.where(models.UserLog.created_at >= date_from)
+    if date_to is not None:
+        query = query.where(models.UserLog.created_at <= date_to)
+    if details:
+        query = query.where(models.UserLog.user_log_details.in_(details))
+    return query.order_by(models.UserLog.created_at, models.UserLog.user_log_uuid)
 
 
 def get_user(db: Session, user_uuid: UUID):
@@ -108,12 +198,12 @@ def get_user(db: Session, user_uuid: UUID):
         db.query(models.User).filter(models.User.user_uuid == user_uuid).first()
     )
     if db_user:
-        print(db_user)
         return db_user
 
 
 def create_task(db: Session, task: schemas.TaskAddToDB):
     db_task = models.Task(
+        task_uuid=security.generate_uuid(),
         task_details=task.task_details,
         task_category=task.task_category,
         task_priority=task.task_priority,
@@ -122,58 +212,290 @@ def create_task(db: Session, task: schemas.TaskAddToDB):
         user_uuid=task.user_uuid,
     )
     db.add(db_task)
+    _bump_versions(db, etag.tasks_key(task.user_uuid))
     db.commit()
+    reminders.schedule(db_task.task_uuid, task.task_deadline, task.task_time)
 
 
 def update_task(db: Session, task: schemas.TaskUpdateToDB):
-    db_task = (
-        db.query(models.Task)
-        .filter(models.Task.task_uuid == task.task_uuid)
-        .filter(models.Task.user_uuid == task.user_uuid)
-    )
-    if db_task:
-        db_task.update(
+    task_time = db.execute(
+        update(models.Task)
+        .where(models.Task.task_uuid == task.task_uuid)
+        .where(models.Task.user_uuid == task.user_uuid)
+        .values(
+            task_details=task.task_details,
+            task_priority=task.task_priority,
+            task_category=task.task_category,
+            task_deadline=task.task_deadline,
+        )
+        .returning(models.Task.task_time)
+    ).scalar_one_or_none()
+    _bump_versions(db, etag.tasks_key(task.user_uuid))
+    db.commit()
+    if task_time is not None:
+        reminders.schedule(task.task_uuid, task.task_deadline, task_time)
+
+
+def complete_task(db: Session, task_uuid: UUID, user_uuid: UUID):
+    # only the request that flips is_done earns the points
+    task_priority = db.execute(
+        update(models.Task)
+        .where(models.Task.task_uuid == task_uuid)
+        .where(models.Task.user_uuid == user_uuid)
+        .where(models.Task.is_done == False)
+        .values(is_done=True)
+        .returning(models.Task.task_priority)
+    ).scalar_one_or_none()
+    if task_priority is None:
+        return
+    points = consts.TASK_PRIORITY_POINTS.get(task_priority, 0)
+    balance = None
+    if points:
+        balance = _credit_points(db, user_uuid, points, "TASK COMPLETED")
+    _bump_versions(db, etag.tasks_key(user_uuid))
+    db.commit()
+    reminders.cancel(task_uuid)
+    if balance:
+        leaderboard.record(user_uuid, *balance)
+
+
+# types for the columns of a VALUES list. asyncpg casts every parameter to
+# its type, psycopg2 only some of them, and untyped VALUES columns are
+# inferred by postgres. these make both drivers render the same casts.
+class _CastString(String):
+    render_bind_cast = True
+
+
+class _CastDate(Date):
+    render_bind_cast = True
+
+
+def apply_task_batch(db: Session, user_uuid: UUID, batch: schemas.TaskBatch):
+    # one statement per action and one commit for the whole batch. an item
+    # that names a missing task is reported, the rest of the batch still
+    # applies.
+    actions = (batch.create, batch.update, batch.complete, batch.delete)
+    if sum(map(len, actions)) > consts.TASK_BATCH_MAX:
+        raise ValueError(f"At most {consts.TASK_BATCH_MAX} tasks per batch")
+    for name, task_uuids in (
+        ("update", [task.task_uuid for task in batch.update]),
+        ("complete", batch.complete),
+        ("delete", batch.delete),
+    ):
+        if len(set(task_uuids)) != len(task_uuids):
+            raise ValueError(f"Duplicate task in {name}")
+
+    results = []
+    created = []
+    updated = {}
+    completed = {}
+    deleted = set()
+    if batch.create:
+        created = [
             {
+                "task_uuid": security.generate_uuid(),
                 "task_details": task.task_details,
                 "task_priority": task.task_priority,
                 "task_category": task.task_category,
                 "task_deadline": task.task_deadline,
+                "task_time": task.task_time,
+                "user_uuid": user_uuid,
             }
+            for task in batch.create
+        ]
+        db.execute(insert(models.Task), created)
+        results += [
+            {"action": "create", "task_uuid": row["task_uuid"], "status": "created"}
+            for row in created
+        ]
+
+    if batch.update:
+        changes = values(
+            column("task_uuid", Uuid),
+            column("task_details", _CastString),
+            column("task_priority", _CastString),
+            column("task_category", _CastString),
+            column("task_deadline", _CastDate),
+            name="changes",
+        ).data(
+            [
+                (
+                    task.task_uuid,
+                    task.task_details,
+                    task.task_priority,
+                    task.task_category,
+                    task.task_deadline,
+                )
+                for task in batch.update
+            ]
         )
-        db.commit()
+        updated = dict(
+            db.execute(
+                update(models.Task)
+                .where(models.Task.task_uuid == changes.c.task_uuid)
+                .where(models.Task.user_uuid == user_uuid)
+                .values(
+                    task_details=changes.c.task_details,
+                    task_priority=changes.c.task_priority,
+                    task_category=changes.c.task_category,
+                    task_deadline=changes.c.task_deadline,
+                )
+                .returning(models.Task.task_uuid, models.Task.task_time)
+            ).all()
+        )
+        results += [
+            {
+                "action": "update",
+                "task_uuid": task.task_uuid,
+                "status": "updated" if task.task_uuid in updated else "not_found",
+            }
+            for task in batch.update
+        ]
+
+    points = 0
+    if batch.complete:
+        # same rule as complete_task, only the rows this statement flips earn
+        completed = dict(
+            db.execute(
+                update(models.Task)
+                .where(models.Task.task_uuid.in_(batch.complete))
+                .where(models.Task.user_uuid == user_uuid)
+                .where(models.Task.is_done == False)
+                .values(is_done=True)
+                .returning(models.Task.task_uuid, models.Task.task_priority)
+            ).all()
+        )
+        points = sum(
+            consts.TASK_PRIORITY_POINTS.get(priority, 0)
+            for priority in completed.values()
+        )
+        pending = [uuid for uuid in batch.complete if uuid not in completed]
+        done = set()
+        if pending:
+            done = set(
+                db.scalars(
+                    select(models.Task.task_uuid)
+                    .where(models.Task.task_uuid.in_(pending))
+                    .where(models.Task.user_uuid == user_uuid)
+                )
+            )
+        results += [
+            {
+                "action": "complete",
+                "task_uuid": task_uuid,
+                "status": (
+                    "completed"
+                    if task_uuid in completed
+                    else "already_done" if task_uuid in done else "not_found"
+                ),
+            }
+            for task_uuid in batch.complete
+        ]
+
+    if batch.delete:
+        deleted = set(
+            db.scalars(
+                delete(models.Task)
+                .where(models.Task.task_uuid.in_(batch.delete))
+                .where(models.Task.user_uuid == user_uuid)
+                .returning(models.Task.task_uuid)
+            )
+        )
+        results += [
+            {
+                "action": "delete",
+                "task_uuid": task_uuid,
+                "status": "deleted" if task_uuid in deleted else "not_found",
+            }
+            for task_uuid in batch.delete
+        ]
 
+    balance = None
+    if points:
+        balance = _credit_points(db, user_uuid, points, "TASKS COMPLETED")
+    _bump_versions(db, etag.tasks_key(user_uuid))
+    db.commit()
+    if balance:
+        leaderboard.record(user_uuid, *balance)
+    for row in created:
+        reminders.schedule(row["task_uuid"], row["task_deadline"], row["task_time"])
+    for task in batch.update:
+        if task.task_uuid in updated:
+            reminders.schedule(
+                task.task_uuid, task.task_deadline, updated[task.task_uuid]
+            )
+    for task_uuid in [*completed, *deleted]:
+        reminders.cancel(task_uuid)
+    return {"results": results, "points": points}
 
-def complete_task(db: Session, task_uuid: UUID, user_uuid: UUID):
-    db_task = (
-        db.query(models.Task)
-        .filter(models.Task.task_uuid == task_uuid)
-        .filter(models.Task.user_uuid == user_uuid)
-        .first()
-    )
-    if db_task:
-        db_task.is_done = True
-        task_priority = db_task.task_priority
-        print(task_priority)
-        db.commit()
-        db_user = (
-            db.query(models.User).filter(models.User.user_uuid == user_uuid).first()
+
+def complete_session(db: Session, user_uuid: UUID):
+    balance = _credit_points(db, user_uuid, consts.SESSION_POINTS, "SESSION COMPLETED")
+    db.commit()
+    leaderboard.record(user_uuid, *balance)
+
+
+def _credit_points(db: Session, user_uuid: UUID, points: int, reason: str):
+    # single UPDATE ... RETURNING, the row lock it takes serializes concurrent
+    # changes to the same user. weekly_points only counts the current week.
+    week = leaderboard.current_week()
+    balance = db.execute(
+        update(models.User)
+        .where(models.User.user_uuid == user_uuid)
+        .values(
+            user_points=models.User.user_points + points,
+            weekly_points=case(
+                (
+                    models.User.weekly_points_week == week,
+                    models.User.weekly_points + points,
+                ),
+                else_=points,
+            ),
+            weekly_points_week=week,
         )
-        if db_user:
-            match (task_priority):
-                case "High":
-                    db_user.user_points += 5
-                case "Normal":
-                    db_user.user_points += 3
-                case "Low":
-                    db_user.user_points += 1
-            db.commit()
+        .returning(models.User.user_points, models.User.weekly_points)
+    ).one_or_none()
+    if balance is None:
+        raise PermissionError("User not found")
+    _add_ledger_entry(db, user_uuid, points, balance.user_points, reason)
+    return balance
+
+
+def _debit_points(db: Session, user_uuid: UUID, points: int, reason: str) -> int:
+    balance = db.execute(
+        update(models.User)
+        .where(models.User.user_uuid == user_uuid)
+        .where(models.User.user_points >= points)
+        .values(user_points=models.User.user_points - points)
+        .returning(models.User.user_points)
+    ).scalar_one_or_none()
+    if balance is None:
+        raise PermissionError("Not enough points")
+    _add_ledger_entry(db, user_uuid, -points, balance, reason)
+    return balance
+
+
+def _add_ledger_entry(
+    db: Session, user_uuid: UUID, points: int, balance: int, reason: str
+):
+    db_entry = models.PointsLedger(
+        points_delta=points,
+        points_balance=balance,
+        points_reason=reason,
+        user_uuid=user_uuid,
+    )
+    db.add(db_entry)
 
 
-def complete_session(db: Session, user_uuid: UUID):
-    db_user = db.query(models.User).filter(models.User.user_uuid == user_uuid).first()
-    if db_user:
-        db_user.user_points += 5
-        db.commit()
+def reconcile_points(db: Session):
+    # user_points is a cached projection of the ledger, rebuild it from there
+    total = (
+        select(func.coalesce(func.sum(models.PointsLedger.points_delta), 0))
+        .where(models.PointsLedger.user_uuid == models.User.user_uuid)
+        .scalar_subquery()
+    )
+    db.execute(update(models.User).values(user_points=total))
+    db.commit()
 
 
 def delete_task(db: Session, task_uuid: UUID, user_uuid: UUID):
@@ -184,49 +506,157 @@ def delete_task(db: Session, task_uuid: UUID, user_uuid: UUID):
     )
     if db_task:
         db_task.delete()
+        _bump_versions(db, etag.tasks_key(user_uuid))
         db.commit()
+        reminders.cancel(task_uuid)
 
 
 def delete_forum(db: Session, forum_uuid: UUID):
     db_task = db.query(models.Forum).filter(models.Forum.forum_uuid == forum_uuid)
     if db_task:
+        # comments and members reference the forum, so they go first
+        db.query(models.ForumComment).filter(
+            models.ForumComment.forum_uuid == forum_uuid
+        ).delete()
+        db.query(models.ForumMember).filter(
+            models.ForumMember.forum_uuid == forum_uuid
+        ).delete()
         db_task.delete()
+        _bump_versions(db, etag.FORUMS_KEY, etag.forum_key(forum_uuid))
         db.commit()
+        event = {"type": "forum_deleted", "forum_uuid": forum_uuid}
+        livehub.publish(etag.FORUMS_KEY, event)
+        livehub.publish(etag.forum_key(forum_uuid), event)
 
 
 def delete_comment(db: Session, comment_uuid: UUID):
     db_task = db.query(models.ForumComment).filter(
         models.ForumComment.forum_comment_uuid == comment_uuid
     )
-    if db_task:
+    db_comment = db_task.with_entities(models.ForumComment.forum_uuid).first()
+    if db_comment:
         db_task.delete()
+        db.query(models.Forum).filter(
+            models.Forum.forum_uuid == db_comment.forum_uuid
+        ).update({models.Forum.comment_count: models.Forum.comment_count - 1})
+        _bump_versions(db, etag.FORUMS_KEY, etag.forum_key(db_comment.forum_uuid))
         db.commit()
+        livehub.publish(
+            etag.forum_key(db_comment.forum_uuid),
+            {
+                "type": "comment_deleted",
+                "forum_uuid": db_comment.forum_uuid,
+                "forum_comment_uuid": comment_uuid,
+            },
+        )
+        livehub.publish(
+            etag.FORUMS_KEY,
+            {
+                "type": "forum_counts",
+                "forum_uuid": db_comment.forum_uuid,
+                "comments": -1,
+                "members": 0,
+            },
+        )
 
 
-def get_tasks(db: Session, user_uuid: UUID):
-    tasks = (
-        db.query(models.Task)
-        .filter(models.Task.user_uuid == UUID(user_uuid))
-        .options(joinedload(models.Task.user))
-        .all()
+# lower ranks first, so "priority" lists the tasks worth most points first
+_TASK_PRIORITY_RANK = case(
+    {priority: -points for priority, points in consts.TASK_PRIORITY_POINTS.items()},
+    value=models.Task.task_priority,
+    else_=0,
+)
+
+_TASK_DEADLINE = (
+    (models.Task.task_deadline, date.fromisoformat, itemgetter("task_deadline")),
+    (models.Task.task_time, time.fromisoformat, itemgetter("task_time")),
+    (models.Task.task_uuid, UUID, itemgetter("task_uuid")),
+)
+
+TASK_SORTS = {
+    "deadline": (_TASK_DEADLINE, False),
+    "-deadline": (_TASK_DEADLINE, True),
+    "priority": (
+        (
+            (
+                _TASK_PRIORITY_RANK,
+                int,
+                lambda row: -consts.TASK_PRIORITY_POINTS.get(row["task_priority"], 0),
+            ),
+            *_TASK_DEADLINE,
+        ),
+        False,
+    ),
+}
+
+
+def get_tasks(
+    db: Session,
+    user_uuid: UUID,
+    limit: int | None = None,
+    cursor: str | None = None,
+    sort: str = "deadline",
+    is_done: bool | None = None,
+    categories: list[str] | None = None,
+    priorities: list[str] | None = None,
+    deadline_from: date | None = None,
+    deadline_to: date | None = None,
+):
+    query = select(*_columns(models.Task, schemas.Tasks)).where(
+        models.Task.user_uuid == UUID(str(user_uuid))
+    )
+    if is_done is not None:
+        query = query.where(models.Task.is_done == is_done)
+    if categories:
+        query = query.where(models.Task.task_category.in_(categories))
+    if priorities:
+        query = query.where(models.Task.task_priority.in_(priorities))
+    if deadline_from is not None:
+        query = query.where(models.Task.task_deadline >= deadline_from)
+    if deadline_to is not None:
+        query = query.where(models.Task.task_deadline <= deadline_to)
+    keys, descending = TASK_SORTS[sort]
+    return _sorted_page(db, query, keys, descending, limit, cursor)
+
+
+def get_users(
+    db: Session,
+    limit: int,
+    cursor: str | None = None,
+    is_confirmed: bool | None = None,
+    is_premium: bool | None = None,
+):
+    query = select(*_columns(models.User, schemas.UserProfile))
+    if is_confirmed is not None:
+        query = query.where(models.User.is_confirmed == is_confirmed)
+    if is_premium is not None:
+        query = query.where(models.User.is_premium == is_premium)
+    return _keyset_page(
+        db, query, models.User.created_at, models.User.user_uuid, limit, cursor
     )
-    return tasks
-
-
-def get_users(db: Session):
-    users = db.query(models.User).all()
-    return users
 
 
 def create_forum(db: Session, forum: schemas.ForumAddToDB, forum_owner: dict):
+    header = {
+        "forum_uuid": security.generate_uuid(),
+        "forum_title": forum.forum_title,
+        "forum_category": forum.forum_category,
+        "forum_details": forum.forum_details,
+        "forum_status": forum.forum_status,
+        "created_at": security.get_locale_datetime().date(),
+        "comment_count": 0,
+        "member_count": 1,
+    }
     db_forum = models.Forum(
-        forum_title=forum.forum_title,
-        forum_category=forum.forum_category,
-        forum_details=forum.forum_details,
-        forum_status=forum.forum_status,
+        **header,
+        search_vector=_search_vector(
+            (forum.forum_title, "A"),
+            (forum.forum_category, "B"),
+            (forum.forum_details, "C"),
+        ),
     )
     db.add(db_forum)
-    db.commit()
+    db.flush()
     forum_owner["forum_uuid"] = db_forum.forum_uuid
     db_forum_member = schemas.ForumMemberAddToDB(**forum_owner)
     db_forum_member = models.ForumMember(
@@ -236,28 +666,35 @@ def create_forum(db: Session, forum: schemas.ForumAddToDB, forum_owner: dict):
         user_uuid=db_forum_member.user_uuid,
     )
     db.add(db_forum_member)
+    _bump_versions(db, etag.FORUMS_KEY, etag.forum_key(db_forum.forum_uuid))
     db.commit()
+    livehub.publish(etag.FORUMS_KEY, {"type": "forum_created", "forum": header})
 
 
 def create_comment(
     db: Session, comment: schemas.ForumCommentAddToDB, forum_member: dict
 ):
+    forum_comment_uuid = security.generate_uuid()
     db_comment = models.ForumComment(
+        forum_comment_uuid=forum_comment_uuid,
         forum_comment=comment.forum_comment,
         forum_uuid=comment.forum_uuid,
         user_uuid=comment.user_uuid,
+        search_vector=_search_vector((comment.forum_comment, "C")),
     )
     db.add(db_comment)
-    db.commit()
-    forum_member["forum_uuid"] = db_comment.forum_uuid
+    db.query(models.Forum).filter(models.Forum.forum_uuid == comment.forum_uuid).update(
+        {models.Forum.comment_count: models.Forum.comment_count + 1}
+    )
+    forum_member["forum_uuid"] = comment.forum_uuid
     db_forum_member = schemas.ForumMemberAddToDB(**forum_member)
-    members = len(
+    is_member = db.query(
         db.query(models.ForumMember)
         .filter(models.ForumMember.forum_uuid == db_forum_member.forum_uuid)
         .filter(models.ForumMember.user_uuid == db_forum_member.user_uuid)
-        .all()
-    )
-    if members == 0:
+        .exists()
+    ).scalar()
+    if not is_member:
         db_forum_member = models.ForumMember(
             is_owner=db_forum_member.is_owner,
             user_name=db_forum_member.user_name,
@@ -265,110 +702,369 @@ def create_comment(
             user_uuid=db_forum_member.user_uuid,
         )
         db.add(db_forum_member)
-        db.commit()
+        db.query(models.Forum).filter(
+            models.Forum.forum_uuid == db_forum_member.forum_uuid
+        ).update({models.Forum.member_count: models.Forum.member_count + 1})
+    _bump_versions(db, etag.FORUMS_KEY, etag.forum_key(comment.forum_uuid))
+    db.commit()
+    livehub.publish(
+        etag.forum_key(comment.forum_uuid),
+        {
+            "type": "comment_created",
+            "comment": {
+                "forum_comment_uuid": forum_comment_uuid,
+                "forum_comment": comment.forum_comment,
+                "forum_uuid": comment.forum_uuid,
+                "user_uuid": comment.user_uuid,
+                "user_name": forum_member["user_name"],
+            },
+            "joined": not is_member,
+        },
+    )
+    livehub.publish(
+        etag.FORUMS_KEY,
+        {
+            "type": "forum_counts",
+            "forum_uuid": comment.forum_uuid,
+            "comments": 1,
+            "members": 0 if is_member else 1,
+        },
+    )
 
 
-def get_forums(db: Session):
-    forums = (
-        db.query(models.Forum)
-        .options(
-            joinedload(models.Forum.forum_comments)
-            .joinedload(models.ForumComment.user)
-            .load_only(models.User.user_avatar),
-            joinedload(models.Forum.forum_members)
-            .joinedload(models.ForumMember.user)
-            .load_only(models.User.user_avatar),
+def _sorted_page(
+    db: Session,
+    query,
+    keys,
+    descending: bool,
+    limit: int | None = None,
+    cursor: str | None = None,
+):
+    # keyset pagination over the (expression, parse, value) keys, the last of
+    # which has to be unique. parse reads a cursor value back, value takes it
+    # from a row. without a limit every row comes back in one page.
+    expressions = [expression for expression, _, _ in keys]
+    if cursor:
+        last = [
+            parse(value)
+            for (_, parse, _), value in zip(
+                keys, pagination.decode_cursor(cursor, len(keys))
+            )
+        ]
+        if descending:
+            query = query.where(tuple_(*expressions) < tuple_(*last))
+        else:
+            query = query.where(tuple_(*expressions) > tuple_(*last))
+    query = query.order_by(
+        *(
+            expression.desc() if descending else expression.asc()
+            for expression in expressions
         )
-        .all()
     )
-    return forums
+    if limit is None:
+        return _rows(db, query), None
+    rows = _rows(db, query.limit(limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_cursor(
+            *(value(rows[-1]) for _, _, value in keys)
+        )
+    return rows, next_cursor
 
 
-def get_user_forums(db: Session, user_id: str):
-    user_forums = []
-    forums = (
-        db.query(models.ForumMember.forum_uuid)
-        .filter(
-            models.ForumMember.user_uuid == user_id, models.ForumMember.is_owner == True
+def _keyset_page(
+    db: Session, query, created_at, uuid, limit: int, cursor: str | None = None
+):
+    # newest first on (created_at, uuid), the uuid breaks ties within a day
+    keys = (
+        (created_at, date.fromisoformat, itemgetter(created_at.key)),
+        (uuid, UUID, itemgetter(uuid.key)),
+    )
+    return _sorted_page(db, query, keys, True, limit, cursor)
+
+
+def get_forums(db: Session, limit: int, cursor: str | None = None):
+    return _keyset_page(
+        db,
+        select(*_columns(models.Forum, schemas.ForumHeaders)),
+        models.Forum.created_at,
+        models.Forum.forum_uuid,
+        limit,
+        cursor,
+    )
+
+
+# private-use characters around the matches, so ts_headline output can be
+# escaped before the <mark> tags go in
+_MATCH_START, _MATCH_STOP = "\ue000", "\ue001"
+
+
+def _search_config():
+    return cast(consts.SEARCH_CONFIG, postgresql.REGCONFIG)
+
+
+def _search_vector(*weighted: tuple[str, str]):
+    vectors = [
+        # the weight is a "char" argument, bound as a parameter it would be
+        # a varchar that setweight does not accept
+        func.setweight(
+            func.to_tsvector(_search_config(), text), literal_column(f"'{weight}'")
+        )
+        for text, weight in weighted
+    ]
+    vector = vectors[0]
+    for other in vectors[1:]:
+        vector = vector.op("||")(other)
+    return vector
+
+
+def _headline(text, query, options: str):
+    return func.ts_headline(
+        _search_config(),
+        text,
+        query,
+        f'StartSel="{_MATCH_START}", StopSel="{_MATCH_STOP}", {options}',
+    )
+
+
+def _highlight(text: str) -> str:
+    return (
+        html.escape(text)
+        .replace(_MATCH_START, "<mark>")
+        .replace(_MATCH_STOP, "</mark>")
+    )
+
+
+def search(db: Session, terms: str, limit: int, cursor: str | None = None):
+    # forums and comments ranked together, best first. the GIN indexes find
+    # the matches, only the page that is returned pays for ts_headline.
+    tsquery = func.websearch_to_tsquery(_search_config(), terms)
+    forum_hits = select(
+        literal("forum").label("kind"),
+        models.Forum.forum_uuid.label("hit_uuid"),
+        models.Forum.forum_uuid.label("forum_uuid"),
+        cast(func.ts_rank_cd(models.Forum.search_vector, tsquery), Float).label("rank"),
+    ).where(models.Forum.search_vector.bool_op("@@")(tsquery))
+    comment_hits = select(
+        literal("comment").label("kind"),
+        models.ForumComment.forum_comment_uuid.label("hit_uuid"),
+        models.ForumComment.forum_uuid.label("forum_uuid"),
+        cast(func.ts_rank_cd(models.ForumComment.search_vector, tsquery), Float).label(
+            "rank"
+        ),
+    ).where(models.ForumComment.search_vector.bool_op("@@")(tsquery))
+    hits = union_all(forum_hits, comment_hits).subquery()
+
+    page = select(hits)
+    if cursor:
+        last_rank, last_uuid = pagination.decode_cursor(cursor, 2)
+        page = page.where(
+            tuple_(hits.c.rank, hits.c.hit_uuid)
+            < tuple_(float(last_rank), UUID(last_uuid))
+        )
+    page = (
+        page.order_by(hits.c.rank.desc(), hits.c.hit_uuid.desc())
+        .limit(limit + 1)
+        .subquery()
+    )
+
+    text = case(
+        (page.c.kind == "forum", models.Forum.forum_details),
+        else_=models.ForumComment.forum_comment,
+    )
+    rows = _rows(
+        db,
+        select(
+            page.c.kind,
+            page.c.forum_uuid,
+            case((page.c.kind == "comment", page.c.hit_uuid), else_=None).label(
+                "forum_comment_uuid"
+            ),
+            _headline(models.Forum.forum_title, tsquery, "HighlightAll=true").label(
+                "forum_title"
+            ),
+            _headline(text, tsquery, consts.SEARCH_HEADLINE).label("snippet"),
+            page.c.rank,
         )
-        .all()
+        .select_from(page)
+        .join(models.Forum, models.Forum.forum_uuid == page.c.forum_uuid)
+        .outerjoin(
+            models.ForumComment,
+            models.ForumComment.forum_comment_uuid == page.c.hit_uuid,
+        )
+        .order_by(page.c.rank.desc(), page.c.hit_uuid.desc()),
     )
-    print(forums)
-    for forum in forums:
-        user_forum = (
-            db.query(models.Forum).filter(models.Forum.forum_uuid == forum[0]).first()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = pagination.encode_cursor(
+            last["rank"], last["forum_comment_uuid"] or last["forum_uuid"]
         )
-        user_forums.append(user_forum)
-    return user_forums
+    for row in rows:
+        row["forum_title"] = _highlight(row["forum_title"])
+        row["snippet"] = _highlight(row["snippet"])
+    return rows, next_cursor
+
+
+def recount_forums(db: Session):
+    # rebuilds the denormalized counters from the comment and member tables
+    comments = (
+        db.query(func.count(models.ForumComment.forum_comment_uuid))
+        .filter(models.ForumComment.forum_uuid == models.Forum.forum_uuid)
+        .scalar_subquery()
+    )
+    members = (
+        db.query(func.count(models.ForumMember.forum_member_uuid))
+        .filter(models.ForumMember.forum_uuid == models.Forum.forum_uuid)
+        .scalar_subquery()
+    )
+    db.query(models.Forum).update(
+        {models.Forum.comment_count: comments, models.Forum.member_count: members},
+        synchronize_session=False,
+    )
+    _bump_versions(db, etag.FORUMS_KEY)
+    db.commit()
+
+
+def get_user_forums(db: Session, user_id: str):
+    return _rows(
+        db,
+        select(*_columns(models.Forum, schemas.ForumHeaders))
+        .join(models.ForumMember)
+        .where(models.ForumMember.user_uuid == user_id)
+        .where(models.ForumMember.is_owner == True),
+    )
 
 
 def get_user_comments(db: Session, user_id: str):
-    forums = (
-        db.query(models.ForumComment)
-        .filter(models.ForumComment.user_uuid == user_id)
-        .all()
+    return _rows(
+        db,
+        select(*_columns(models.ForumComment, schemas.ForumComments)).where(
+            models.ForumComment.user_uuid == user_id
+        ),
     )
-    return forums
+
+
+def _with_avatar(rows: list[dict]) -> list[dict]:
+    for row in rows:
+        row["user"] = {
+            "user_uuid": row["user_uuid"],
+            "user_avatar": row.pop("user_avatar"),
+        }
+    return rows
 
 
 def get_forum(forum_uuid: UUID, db: Session):
-    forum = (
-        db.query(models.Forum)
-        .filter(models.Forum.forum_uuid == UUID(forum_uuid))
-        .options(
-            joinedload(models.Forum.forum_comments)
-            .joinedload(models.ForumComment.user)
-            .load_only(models.User.user_avatar),
-            joinedload(models.Forum.forum_members)
-            .joinedload(models.ForumMember.user)
-            .load_only(models.User.user_avatar),
+    # one read per collection, joining both into the forum row would return
+    # every comment once per member
+    forum_uuid = UUID(forum_uuid)
+    forums = _rows(
+        db,
+        select(*_columns(models.Forum, schemas.ForumHeaders)).where(
+            models.Forum.forum_uuid == forum_uuid
+        ),
+    )
+    if not forums:
+        return forums
+    forums[0]["forum_members"] = _with_avatar(
+        _rows(
+            db,
+            select(
+                *_columns(models.ForumMember, schemas.ForumMembers),
+                models.User.user_avatar,
+            )
+            .join(models.User)
+            .where(models.ForumMember.forum_uuid == forum_uuid),
         )
-        .all()
     )
-    return forum
+    forums[0]["forum_comments"] = _with_avatar(
+        _rows(
+            db,
+            select(
+                *_columns(models.ForumComment, schemas.ForumComments),
+                models.User.user_avatar,
+            )
+            .join(models.User)
+            .where(models.ForumComment.forum_uuid == forum_uuid)
+            .order_by(
+                models.ForumComment.created_at, models.ForumComment.forum_comment_uuid
+            ),
+        )
+    )
+    return forums
 
 
 def get_task(task_uuid: UUID, db: Session):
-    task = db.query(models.Task).filter(models.Task.task_uuid == UUID(task_uuid)).all()
-    return task
+    return _rows(
+        db,
+        select(*_columns(models.Task, schemas.Tasks)).where(
+            models.Task.task_uuid == UUID(task_uuid)
+        ),
+    )
 
 
 def gacha_life(db: Session, user_uuid: UUID, pull: int):
-    from random import choices
-
-    sources = []
-    probabilities = []
-    sprites = db.query(models.Sprite).all()
-    for sprite in sprites:
-        sources.append({str(sprite.sprite_uuid): sprite.sprite_source})
-        probabilities.append(sprite.sprite_summon_chance)
-    choice: dict = choices(sources, probabilities, k=pull)
-    print(choice)
-    for element in choice:
-        print(list(element.keys())[0])
-        db_sprite_instance = models.SpriteInstance(
-            user_uuid=user_uuid, sprite_uuid=list(element.keys())[0]
-        )
-        db.add(db_sprite_instance)
-        db.commit()
-    db_user = db.query(models.User).filter(models.User.user_uuid == user_uuid).first()
-    db_user.user_points -= pull * 20
+    if pull < 1 or pull > consts.GACHA_MAX_PULLS:
+        raise ValueError(f"Pulls must be between 1 and {consts.GACHA_MAX_PULLS}")
+    pulled = gacha.catalog.draw(db, pull)
+    instances = [
+        {
+            "sprite_instance_uuid": security.generate_uuid(),
+            "sprite_uuid": sprite_uuid,
+            "user_uuid": user_uuid,
+        }
+        for sprite_uuid, _ in pulled
+    ]
+    user_points = _debit_points(
+        db, user_uuid, pull * consts.GACHA_PULL_COST, "GACHA PULL"
+    )
+    db.execute(insert(models.SpriteInstance), instances)
+    _bump_versions(db, etag.sprites_key(user_uuid))
     db.commit()
+    leaderboard.record(user_uuid, user_points)
+    metrics.gacha_pulls.inc(pull)
+    return [
+        {
+            "sprite_instance_uuid": instance["sprite_instance_uuid"],
+            "sprite_uuid": sprite_uuid,
+            "sprite_source": sprite_source,
+        }
+        for instance, (sprite_uuid, sprite_source) in zip(instances, pulled)
+    ]
 
 
 def get_sprites(db: Session, user_uuid: UUID):
-    sprites = (
-        db.query(models.SpriteInstance)
-        .filter(models.SpriteInstance.user_uuid == UUID(user_uuid))
-        .options(joinedload(models.SpriteInstance.sprite))
-        .all()
+    sprites = _rows(
+        db,
+        select(
+            *_columns(models.SpriteInstance, schemas.SpriteInstances),
+            models.Sprite.sprite_source,
+            models.Sprite.sprite_summon_chance,
+        )
+        .join(models.Sprite)
+        .where(models.SpriteInstance.user_uuid == UUID(user_uuid)),
     )
+    for sprite in sprites:
+        sprite["sprite"] = {
+            "sprite_uuid": sprite["sprite_uuid"],
+            "sprite_source": sprite.pop("sprite_source"),
+            "sprite_summon_chance": sprite.pop("sprite_summon_chance"),
+        }
     return sprites
 
 
 def change_avatar(db: Session, user_uuid: UUID, avatar: str):
     db_user = db.query(models.User).filter(models.User.user_uuid == user_uuid).first()
     db_user.user_avatar = avatar
+    # forum pages show the avatar of every member
+    forum_uuids = db.scalars(
+        select(models.ForumMember.forum_uuid)
+        .where(models.ForumMember.user_uuid == user_uuid)
+        .distinct()
+    ).all()
+    _bump_versions(db, *map(etag.forum_key, forum_uuids))
     db.commit()
 
 
@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from os import getenv
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+import metrics as metrics
+
+logger = logging.getLogger("dbpool")
+
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = getenv("DB_POOL_PRE_PING", "true").lower() != "false"
+DB_POOL_WARN_WAIT = float(getenv("DB_POOL_WARN_WAIT", 0.1))
+# milliseconds, 0 leaves the server default in place
+DB_STATEMENT_TIMEOUT = int(getenv("DB_STATEMENT_TIMEOUT", 0))
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class WaitHistogram:
+    def __init__(self, buckets: tuple = WAIT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.timeouts = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.total += seconds
+
+    def timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counts = list(self.counts)
+            total = self.total
+            timeouts = self.timeouts
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "count": cumulative,
+            "sum": total,
+            "timeouts": timeouts,
+            "buckets": buckets,
+        }
+
+
+checkout_wait = {"sync": WaitHistogram(), "async": WaitHistogram()}
+
+
+class _TimedCheckout:
+    stats_key: str
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            checkout_wait[self.stats_key].timeout()
+            metrics.pool_checkout_timeouts.labels(self.stats_key).inc()
+            logger.warning(
+                "%s pool exhausted: %s checked out, overflow %s",
+                self.stats_key,
+                self.checkedout(),
+                self.overflow(),
+            )
+            raise
+        waited = time.perf_counter() - started
+        checkout_wait[self.stats_key].observe(waited)
+        metrics.pool_checkout_wait.labels(self.stats_key).observe(waited)
+        if waited > DB_POOL_WARN_WAIT:
+            logger.warning(
+                "%s pool checkout waited %.3fs: %s checked out, overflow %s",
+                self.stats_key,
+                waited,
+                self.checkedout(),
+                self.overflow(),
+            )
+        return connection
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    stats_key = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    stats_key = "async"
+
+
+def engine_options(url, poolclass) -> dict:
+    options = {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if DB_STATEMENT_TIMEOUT and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT)}
+            }
+        else:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+            }
+    return options
+
+
+def pool_status(pool, stats_key: str) -> dict:
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkout_wait": checkout_wait[stats_key].snapshot(),
+    }
@@ -0,0 +1,52 @@
+import hashlib
+from uuid import UUID
+
+from fastapi import Request, Response, status
+
+# conditional GET for the polled reads. every cached resource has a version
+# row in cache_versions that dbops bumps in the same transaction as the write
+# that changes it, so a matching If-None-Match is answered from that one row
+# without running the read or serializing anything.
+
+FORUMS_KEY = "forums"
+CACHE_CONTROL = "private, no-cache"
+
+
+def tasks_key(user_uuid) -> str:
+    return f"tasks:{UUID(str(user_uuid))}"
+
+
+def sprites_key(user_uuid) -> str:
+    return f"sprites:{UUID(str(user_uuid))}"
+
+
+def forum_key(forum_uuid) -> str:
+    return f"forum:{UUID(str(forum_uuid))}"
+
+
+def make(key: str, version: int, *variant) -> str:
+    # variant covers whatever else picks the representation, like the page
+    raw = repr((key, version, variant)).encode("utf-8")
+    return '"{}"'.format(hashlib.sha256(raw).hexdigest()[:32])
+
+
+def matches(request: Request, tag: str | None) -> bool:
+    header = request.headers.get("if-none-match")
+    if tag is None or not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return any(
+        candidate.strip().removeprefix("W/") == tag for candidate in header.split(",")
+    )
+
+
+def headers(tag: str | None) -> dict:
+    if tag is None:
+        return {}
+    return {"ETag": tag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers(tag))
@@ -0,0 +1,87 @@
+import threading
+import time
+from random import random
+
+from sqlalchemy.orm import Session
+
+import consts as consts
+import models as models
+
+
+class AliasSampler:
+    # Vose's alias method: O(n) to build, O(1) per draw
+    def __init__(self, weights: list[float]):
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError("No sprites available to summon")
+        scaled = [weight * n / total for weight in weights]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] = scaled[more] + scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # leftovers are 1.0 up to float rounding
+        self.size = n
+
+    def sample(self, k: int) -> list[int]:
+        picks = []
+        for _ in range(k):
+            i = int(random() * self.size)
+            picks.append(i if random() < self.probability[i] else self.alias[i])
+        return picks
+
+
+class SpriteCatalog:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        self.sprites: list[tuple] = []
+        self.sampler: AliasSampler | None = None
+        self.checked_at = 0.0
+
+    def refresh(self, db: Session):
+        rows = (
+            db.query(
+                models.Sprite.sprite_uuid,
+                models.Sprite.sprite_source,
+                models.Sprite.sprite_summon_chance,
+            )
+            .order_by(models.Sprite.sprite_uuid)
+            .all()
+        )
+        # every cached column, so a changed sprite_source is picked up too
+        fingerprint = tuple(
+            (str(uuid), source, chance) for uuid, source, chance in rows
+        )
+        with self.lock:
+            if fingerprint != self.fingerprint:
+                self.sampler = AliasSampler([chance for _, _, chance in rows])
+                self.sprites = [(uuid, source) for uuid, source, _ in rows]
+                self.fingerprint = fingerprint
+            self.checked_at = time.monotonic()
+
+    def draw(self, db: Session, pulls: int) -> list[tuple]:
+        # the catalog is re-read at most once per GACHA_CATALOG_TTL and the
+        # sampler is only rebuilt when a sprite actually changed
+        if (
+            self.sampler is None
+            or time.monotonic() - self.checked_at > consts.GACHA_CATALOG_TTL
+        ):
+            self.refresh(db)
+        with self.lock:
+            sprites = self.sprites
+            picks = self.sampler.sample(pulls)
+        return [sprites[i] for i in picks]
+
+
+catalog = SpriteCatalog()
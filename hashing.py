@@ -0,0 +1,71 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import consts as consts
+import security as security
+
+# scrypt is memory-hard on purpose, so it never runs on the event loop.
+# hashlib releases the GIL while it works, which lets a thread pool use every
+# core. at most HASH_WORKERS hashes run at once; callers that cannot get a
+# slot within HASH_QUEUE_TIMEOUT fail instead of piling up behind the pool.
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = consts.HASH_WORKERS,
+        queue_timeout: float = consts.HASH_QUEUE_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="hashing"
+        )
+        self.slots: asyncio.Semaphore | None = None
+
+    async def _submit(self, operation, *args):
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.workers)
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except TimeoutError:
+            raise HasherBusy("Server is busy, please try again")
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, operation, *args)
+        finally:
+            self.slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(security.hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(security.verify_password, password, hashed_password)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+_hasher = PasswordHasher()
+
+# verified when the email is unknown so a miss costs as much as a hit
+_MISSING_USER_HASH = security.hash_password("")
+
+
+async def hash_password(password: str) -> str:
+    return await _hasher.hash(password)
+
+
+async def verify_password(password: str, hashed_password: str | None) -> bool:
+    if hashed_password is None:
+        await _hasher.verify(password, _MISSING_USER_HASH)
+        return False
+    return await _hasher.verify(password, hashed_password)
+
+
+def shutdown():
+    _hasher.shutdown()
@@ -0,0 +1,289 @@
+import threading
+from datetime import date, datetime, timedelta
+from math import log2
+from random import random
+from uuid import UUID
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+import consts as consts
+import models as models
+import security as security
+
+WINDOWS = ("all", "weekly")
+
+
+def current_week() -> date:
+    today = security.get_locale_datetime().date()
+    return today - timedelta(days=today.weekday())
+
+
+class _End:
+    # sorts after every (points, user) key so the tail sentinel is never passed
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return False
+
+
+class _Node:
+    __slots__ = ("value", "next", "width")
+
+    def __init__(self, value, next: list, width: list):
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+_TAIL = _Node(_End(), [], [])
+
+
+class IndexableSkipList:
+    # sorted container with O(log n) insert, remove, positional lookup and
+    # rank, each link stores how many base-level nodes it skips over
+    def __init__(self, expected_size: int = 1 << 20):
+        self.size = 0
+        self.maxlevels = int(1 + log2(expected_size))
+        self.head = _Node(None, [_TAIL] * self.maxlevels, [1] * self.maxlevels)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _level(self) -> int:
+        level = 1
+        while level < self.maxlevels and random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, value):
+        chain = [None] * self.maxlevels
+        steps_at_level = [0] * self.maxlevels
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        height = self._level()
+        new_node = _Node(value, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            new_node.width[level] = prev_node.width[level] - steps
+            prev_node.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.maxlevels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain = [None] * self.maxlevels
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is _TAIL or target.value != value:
+            raise KeyError(value)
+        for level in range(len(target.next)):
+            prev_node = chain[level]
+            prev_node.width[level] += target.width[level] - 1
+            prev_node.next[level] = target.next[level]
+        for level in range(len(target.next), self.maxlevels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def bisect_left(self, value) -> int:
+        # number of items strictly less than value
+        node = self.head
+        position = 0
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value < value:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def slice(self, start: int, stop: int) -> list:
+        start = max(start, 0)
+        stop = min(stop, self.size)
+        if start >= stop:
+            return []
+        node = self.head
+        remaining = start + 1
+        for level in reversed(range(self.maxlevels)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        values = []
+        for _ in range(stop - start):
+            values.append(node.value)
+            node = node.next[0]
+        return values
+
+
+class Board:
+    def __init__(self):
+        self.points: dict[str, int] = {}
+        self.ranking = IndexableSkipList()
+
+    def set(self, user_uuid: str, points: int):
+        old = self.points.get(user_uuid)
+        if old == points:
+            return
+        if old is not None:
+            self.ranking.remove((-old, user_uuid))
+        self.ranking.insert((-points, user_uuid))
+        self.points[user_uuid] = points
+
+    def top(self, limit: int) -> list[dict]:
+        return self._entries(0, limit)
+
+    def rank(self, user_uuid: str) -> int | None:
+        # competition ranking, users on the same points share a rank
+        points = self.points.get(user_uuid)
+        if points is None:
+            return None
+        return self.ranking.bisect_left((-points, "")) + 1
+
+    def around(self, user_uuid: str, radius: int) -> list[dict]:
+        points = self.points.get(user_uuid)
+        if points is None:
+            return []
+        position = self.ranking.bisect_left((-points, user_uuid))
+        return self._entries(position - radius, position + radius + 1)
+
+    def _entries(self, start: int, stop: int) -> list[dict]:
+        entries = []
+        for negated, user_uuid in self.ranking.slice(start, stop):
+            entries.append(
+                {
+                    "rank": self.ranking.bisect_left((negated, "")) + 1,
+                    "user_uuid": user_uuid,
+                    "user_points": -negated,
+                }
+            )
+        return entries
+
+
+_STANDINGS = (
+    models.User.user_uuid,
+    models.User.user_points,
+    models.User.weekly_points,
+    models.User.weekly_points_week,
+)
+
+
+class Leaderboard:
+    # load builds both boards from every user, once at startup. after that,
+    # record applies this worker's own writes and refresh picks up the users
+    # whose points other workers changed, found through the ledger entries
+    # every points write adds. balances rewritten outside dbops, such as by
+    # reconcile_points, show up after a restart.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.boards = {"all": Board(), "weekly": Board()}
+        self.week = current_week()
+        self.synced: datetime | None = None
+
+    def _board(self, window: str) -> Board:
+        if window not in self.boards:
+            raise ValueError(f"Unknown leaderboard window: {window}")
+        week = current_week()
+        if week != self.week:
+            self.boards["weekly"] = Board()
+            self.week = week
+        return self.boards[window]
+
+    def load(self, db: Session):
+        synced = security.get_locale_datetime()
+        week = current_week()
+        boards = {"all": Board(), "weekly": Board()}
+        for user_uuid, user_points, weekly_points, weekly_points_week in db.execute(
+            select(*_STANDINGS)
+        ):
+            boards["all"].set(str(user_uuid), user_points)
+            if weekly_points_week == week:
+                boards["weekly"].set(str(user_uuid), weekly_points)
+        with self.lock:
+            self.boards = boards
+            self.week = week
+            self.synced = synced
+
+    def refresh(self, db: Session):
+        if self.synced is None:
+            return self.load(db)
+        # ledger rows are stamped before their transaction commits, so rows
+        # from the last interval are read again in case they committed late
+        since = self.synced - timedelta(seconds=consts.LEADERBOARD_REFRESH_SECONDS)
+        synced = security.get_locale_datetime()
+        changed = union(
+            select(models.PointsLedger.user_uuid).where(
+                models.PointsLedger.created_at >= since
+            ),
+            # new users have no ledger entry until they earn points.
+            # users.created_at is the server's local date, see models.User
+            select(models.User.user_uuid).where(
+                models.User.created_at >= since.astimezone().date()
+            ),
+        )
+        users = db.execute(
+            select(*_STANDINGS).where(models.User.user_uuid.in_(changed))
+        ).all()
+        with self.lock:
+            week = current_week()
+            for user_uuid, user_points, weekly_points, weekly_points_week in users:
+                self._board("all").set(str(user_uuid), user_points)
+                if weekly_points_week == week:
+                    self._board("weekly").set(str(user_uuid), weekly_points)
+            self.synced = synced
+
+    def record(
+        self, user_uuid: UUID | str, user_points: int, weekly_points: int | None = None
+    ):
+        with self.lock:
+            self._board("all").set(str(user_uuid), user_points)
+            if weekly_points is not None:
+                self._board("weekly").set(str(user_uuid), weekly_points)
+
+    def top(self, window: str, limit: int) -> list[dict]:
+        with self.lock:
+            return self._board(window).top(limit)
+
+    def standing(self, window: str, user_uuid: UUID | str, radius: int) -> dict:
+        with self.lock:
+            board = self._board(window)
+            user_uuid = str(user_uuid)
+            return {
+                "rank": board.rank(user_uuid),
+                "user_points": board.points.get(user_uuid, 0),
+                "neighbours": board.around(user_uuid, radius),
+                "total": len(board.ranking),
+            }
+
+
+_leaderboard = Leaderboard()
+
+
+def load(db: Session):
+    _leaderboard.load(db)
+
+
+def refresh(db: Session):
+    _leaderboard.refresh(db)
+
+
+def record(user_uuid: UUID | str, user_points: int, weekly_points: int | None = None):
+    _leaderboard.record(user_uuid, user_points, weekly_points)
+
+
+def top(window: str, limit: int) -> list[dict]:
+    return _leaderboard.top(window, limit)
+
+
+def standing(window: str, user_uuid: UUID | str, radius: int) -> dict:
+    return _leaderboard.standing(window, user_uuid, radius)
@@ -0,0 +1,140 @@
+import asyncio
+from collections import defaultdict
+
+import consts as consts
+import metrics as metrics
+import serialization as serialization
+
+# every subscriber sees this instead of the events it could not keep up with
+RESYNC = serialization.dumps({"type": "resync"}).decode("utf-8")
+
+
+class HubFull(Exception):
+    pass
+
+
+class Subscription:
+    # a bounded queue of encoded events. a subscriber that falls more than
+    # max_size events behind loses its backlog and gets a single resync, so
+    # one slow client costs the publisher nothing and the rest are unaffected.
+    __slots__ = ("topics", "queue", "overflows")
+
+    def __init__(self, topics: tuple, max_size: int):
+        self.topics = topics
+        self.queue = asyncio.Queue(max_size)
+        self.overflows = 0
+
+    def offer(self, payload: str):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.overflows += 1
+            metrics.live_overflows.inc()
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+
+class Hub:
+    # in-process fan-out from dbops to the live connections of this worker.
+    # dbops publishes after its commit, from the event loop (run_sync) or from
+    # any other thread; delivery always happens on the loop.
+    def __init__(
+        self,
+        queue_size: int = consts.LIVE_QUEUE_SIZE,
+        max_subscribers: int = consts.LIVE_MAX_SUBSCRIBERS,
+    ):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.topics: dict[str, set] = defaultdict(set)
+        self.subscribers = 0
+        self.published = 0
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+
+    def stop(self):
+        self.loop = None
+
+    def subscribe(self, *topics: str) -> Subscription:
+        if self.subscribers >= self.max_subscribers:
+            raise HubFull("Too many live connections")
+        subscription = Subscription(topics, self.queue_size)
+        for topic in topics:
+            self.topics[topic].add(subscription)
+        self.subscribers += 1
+        metrics.live_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.topics[topic]
+        self.subscribers -= 1
+        metrics.live_subscribers.dec()
+
+    def publish(self, topic: str, event: dict):
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(topic, event)
+        else:
+            loop.call_soon_threadsafe(self._deliver, topic, event)
+
+    def _deliver(self, topic: str, event: dict):
+        subscribers = self.topics.get(topic)
+        self.published += 1
+        metrics.live_events.inc()
+        if not subscribers:
+            return
+        # encoded once, whatever the number of subscribers
+        payload = serialization.dumps({**event, "topic": topic}).decode("utf-8")
+        for subscription in tuple(subscribers):
+            subscription.offer(payload)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "topics": len(self.topics),
+            "published": self.published,
+        }
+
+
+_hub = Hub()
+
+
+def start():
+    _hub.start()
+
+
+def stop():
+    _hub.stop()
+
+
+def subscribe(*topics: str) -> Subscription:
+    return _hub.subscribe(*topics)
+
+
+def unsubscribe(subscription: Subscription):
+    _hub.unsubscribe(subscription)
+
+
+def publish(topic: str, event: dict):
+    _hub.publish(topic, event)
+
+
+def stats() -> dict:
+    return _hub.stats()
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from datetime import date
+
+import consts as consts
+import dbops as dbops
+import schemas as schemas
+import security as security
+from dbconf import SessionLocal
+
+logger = logging.getLogger("logbuffer")
+
+
+class LogBuffer:
+    # collects UserLog rows in memory and writes them with one multi-row
+    # insert per batch from a background thread, so requests never wait on it
+    def __init__(
+        self,
+        max_size: int = consts.LOG_BUFFER_SIZE,
+        batch_size: int = consts.LOG_BATCH_SIZE,
+        flush_interval: float = consts.LOG_FLUSH_INTERVAL,
+        max_retries: int = 3,
+    ):
+        self.entries = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.stopping = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.delayed = 0
+        self.failed_flushes = 0
+
+    def submit(self, log: schemas.UserLogs) -> bool:
+        entry = {
+            "user_log_uuid": security.generate_uuid(),
+            "user_log_details": log.user_log_details,
+            "user_uuid": log.user_uuid,
+            "created_at": date.today(),
+        }
+        try:
+            self.entries.put_nowait((time.monotonic(), entry))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            logger.warning("log buffer full, dropped entry for %s", log.user_uuid)
+            return False
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, name="logbuffer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 10):
+        # the writer drains whatever is queued before it exits
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "queued": self.entries.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "delayed": self.delayed,
+                "failed_flushes": self.failed_flushes,
+            }
+
+    def _collect(self) -> list:
+        try:
+            batch = [self.entries.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self.stopping.is_set():
+                remaining = 0
+            try:
+                if remaining <= 0:
+                    batch.append(self.entries.get_nowait())
+                else:
+                    batch.append(self.entries.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self.stopping.is_set() or not self.entries.empty():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch: list):
+        for attempt in range(self.max_retries + 1):
+            db = SessionLocal()
+            try:
+                dbops.add_logs(db, [entry for _, entry in batch])
+                break
+            except Exception:
+                db.rollback()
+                with self.lock:
+                    self.failed_flushes += 1
+                logger.exception("log flush failed, attempt %s", attempt + 1)
+                if attempt < self.max_retries:
+                    time.sleep(min(2**attempt, 10))
+            finally:
+                db.close()
+        else:
+            with self.lock:
+                self.dropped += len(batch)
+            return
+        # entries held up past their normal flush window by a slow or failed flush
+        written_at = time.monotonic()
+        delayed = sum(
+            1
+            for queued_at, _ in batch
+            if written_at - queued_at > self.flush_interval * 2
+        )
+        with self.lock:
+            self.written += len(batch)
+            self.delayed += delayed
+
+
+_buffer = LogBuffer()
+
+
+def submit(log: schemas.UserLogs) -> bool:
+    return _buffer.submit(log)
+
+
+def start():
+    _buffer.start()
+
+
+def stop():
+    _buffer.stop()
+
+
+def stats() -> dict:
+    return _buffer.stats()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# drains models.EmailOutbox over a single long-lived SMTP session.
+# run it next to the api: python mailer.py (or python mailer.py --once)
+import argparse
+import logging
+import os
+import random
+import signal
+import smtplib
+import ssl
+import time
+from datetime import timedelta
+from email.message import EmailMessage
+
+from sqlalchemy.orm import Session
+
+import metrics as metrics
+import models as models
+import security as security
+from dbconf import SessionLocal
+
+logger = logging.getLogger("mailer")
+
+BATCH_SIZE = int(os.getenv("MAILER_BATCH_SIZE", 50))
+POLL_INTERVAL = float(os.getenv("MAILER_POLL_INTERVAL", 2))
+MAX_ATTEMPTS = int(os.getenv("MAILER_MAX_ATTEMPTS", 8))
+BACKOFF_BASE = float(os.getenv("MAILER_BACKOFF_BASE", 30))
+BACKOFF_MAX = float(os.getenv("MAILER_BACKOFF_MAX", 3600))
+IDLE_TIMEOUT = float(os.getenv("MAILER_IDLE_TIMEOUT", 60))
+
+
+class Mailer:
+    def __init__(self):
+        self.smtp_server = os.getenv("SMTP_SERVER")
+        self.port = int(os.getenv("SMTP_PORT", 587))
+        self.sender_email = os.getenv("SENDER_EMAIL")
+        self.password = os.getenv("SENDER_PASSWORD")
+        # SMTP_STARTTLS=false lets the worker talk to a plain local stand-in
+        # such as `python -m aiosmtpd -n -l localhost:1025`
+        self.starttls = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+        self.server: smtplib.SMTP | None = None
+        self.last_used = 0.0
+
+    def connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.port, timeout=30)
+        if self.starttls:
+            server.starttls(context=ssl.create_default_context())
+        if self.password:
+            server.login(self.sender_email, self.password)
+        self.server = server
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self.server = None
+
+    def ensure_connected(self):
+        if self.server is not None and time.monotonic() - self.last_used > IDLE_TIMEOUT:
+            # servers drop idle sessions, check before reusing it
+            try:
+                self.server.noop()
+            except (smtplib.SMTPException, OSError):
+                self.server = None
+        if self.server is None:
+            self.connect()
+
+    def send(self, recipient: str, subject: str, body: str):
+        message = EmailMessage()
+        message["From"] = self.sender_email
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        started = time.perf_counter()
+        try:
+            self.ensure_connected()
+            self.server.send_message(message)
+        except (smtplib.SMTPException, OSError) as e:
+            metrics.email_send_failures.labels(type(e).__name__).inc()
+            if isinstance(e, smtplib.SMTPServerDisconnected):
+                self.server = None
+            raise
+        finally:
+            self.last_used = time.monotonic()
+            metrics.email_send_duration.observe(time.perf_counter() - started)
+
+
+def backoff(attempts: int) -> timedelta:
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def claim(db: Session) -> models.EmailOutbox | None:
+    return (
+        db.query(models.EmailOutbox)
+        .filter(models.EmailOutbox.email_status == "pending")
+        .filter(models.EmailOutbox.next_attempt_at <= security.get_locale_datetime())
+        .order_by(models.EmailOutbox.next_attempt_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+
+
+def drain(db: Session, mailer: Mailer, batch_size: int = BATCH_SIZE) -> int:
+    # one email per transaction: its row stays locked while it is sent and
+    # its status is committed right after, so a failure resends one email at most
+    drained = 0
+    while drained < batch_size:
+        email = claim(db)
+        if email is None:
+            break
+        try:
+            mailer.send(email.email_recipient, email.email_subject, email.email_body)
+            email.email_status = "sent"
+            email.email_error = None
+            email.sent_at = security.get_locale_datetime()
+        except Exception as e:
+            email.email_attempts += 1
+            email.email_error = str(e)
+            if email.email_attempts >= MAX_ATTEMPTS:
+                email.email_status = "failed"
+                logger.error("giving up on %s: %s", email.email_uuid, e)
+            else:
+                email.next_attempt_at = security.get_locale_datetime() + backoff(
+                    email.email_attempts
+                )
+                logger.warning("retrying %s later: %s", email.email_uuid, e)
+        db.commit()
+        drained += 1
+    return drained
+
+
+def run(once: bool = False):
+    mailer = Mailer()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        while not stopping:
+            db = SessionLocal()
+            try:
+                sent = drain(db, mailer)
+            except Exception:
+                db.rollback()
+                logger.exception("outbox drain failed")
+                sent = 0
+            finally:
+                db.close()
+            if once:
+                break
+            if sent < BATCH_SIZE:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        mailer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued outbox emails")
+    parser.add_argument("--once", action="store_true", help="drain one batch and exit")
+    parser.add_argument("--metrics-port", type=int, help="serve /metrics on this port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
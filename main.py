@@ -1,32 +1,116 @@
-from datetime import timedelta
-from typing import Annotated, List
-
-from fastapi import Depends, FastAPI, Request, Response, status
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import Annotated, Literal
+from uuid import UUID
+
+from fastapi import (
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    status,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import adbops as adbops
 import consts as consts
-import dbops as dbops
+import hashing as hashing
+import leaderboard as leaderboard
+import livehub as livehub
+import logbuffer as logbuffer
+import metrics as metrics
 import models as models
+import querybudget as querybudget
+import reminders as reminders
 import schemas as schemas
 import security as security
-from dbconf import SessionLocal, engine
+import serialization as serialization
+import dbconf as dbconf
+import etag as etag
+from dbconf import AsyncSessionLocal, SessionLocal, async_engine, engine
 
-models.Base.metadata.create_all(bind=engine)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/login")
+logger = logging.getLogger("main")
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_principal(
+    access_token: Annotated[str, Depends(oauth2_scheme)], request: Request
+) -> schemas.Principal:
+    try:
+        refresh_token = request.cookies.get("REFRESH_TOKEN")
+        payload, access_token = security.verify_access_token(
+            refresh_token, access_token
+        )
+        return schemas.Principal(**payload, access_token=access_token)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def current_etag(
+    db: AsyncSession, principal: schemas.Principal, key: str, *variant
+) -> str | None:
+    # a response that hands out a refreshed token is never cached. the version
+    # is read before the data, so a write in between costs the next poll a
+    # full response instead of serving it a stale 304.
+    if principal.access_token is not None:
+        return None
+    return etag.make(key, await adbops.get_version(db, key), *variant)
 
 
-def get_db():
+def load_leaderboard(full: bool = False):
     db = SessionLocal()
     try:
-        yield db
+        if full:
+            leaderboard.load(db)
+        else:
+            leaderboard.refresh(db)
     finally:
         db.close()
 
 
-app = FastAPI()
+async def refresh_leaderboard():
+    # picks up points changed by other workers, off the event loop
+    while True:
+        await asyncio.sleep(consts.LEADERBOARD_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(load_leaderboard)
+        except Exception:
+            logger.exception("leaderboard refresh failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(load_leaderboard, True)
+    leaderboard_refresh = asyncio.create_task(refresh_leaderboard())
+    logbuffer.start()
+    livehub.start()
+    reminders.start()
+    yield
+    livehub.stop()
+    leaderboard_refresh.cancel()
+    await asyncio.to_thread(reminders.stop)
+    await asyncio.to_thread(logbuffer.stop)
+    await asyncio.to_thread(hashing.shutdown)
+    await async_engine.dispose()
+    engine.dispose()
+    metrics.process_exit()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,14 +121,44 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    started = time.perf_counter()
+    with querybudget.track(request.url.path) as queries:
+        response = await call_next(request)
+    # the route template, not the path, keeps the label set bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.http_request_duration.labels(request.method, route).observe(
+        time.perf_counter() - started
+    )
+    metrics.http_requests.labels(request.method, route, response.status_code).inc()
+    response.headers["Server-Timing"] = queries.server_timing()
+    if queries.count > consts.QUERY_WARN_COUNT:
+        logger.warning(
+            "%s %s ran %s statements in %.1fms: %s",
+            request.method,
+            request.url.path,
+            queries.count,
+            queries.seconds * 1000,
+            queries.shapes.most_common(1)[0],
+        )
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/api/v1/login")
 async def login(
     request: Annotated[OAuth2PasswordRequestForm, Depends()],
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        account = dbops.login(db, request.username, request.password)
+        account = await adbops.login(db, request.username, request.password)
         data = {
             "user_uuid": str(account.user_uuid),
             "user_email": account.user_email,
@@ -70,35 +184,47 @@ async def login(
             "user_uuid": account.user_uuid
         }
         log = schemas.UserLogs(**log)
-        dbops.add_log(db, log)
+        logbuffer.submit(log)
         return {"access_token": access_token, "access_type": "Bearer"}
+    except hashing.HasherBusy as e:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = "1"
+        return {"detail": str(e)}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         response.headers["WWW-Authenticate"] = "Bearer"
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/register")
-async def register(request: Request, response: Response, db: Session = Depends(get_db)):
+@app.post("/api/v1/register", responses=serialization.responses(schemas.Detail))
+async def register(
+    request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
     try:
         data = await request.json()
         user = schemas.UserRegister(**data)
-        dbops.register(db, user)
         SUBJECT = "Email Confirmation"
         TEXT = f"""
         Your email is awaiting confirmation by the admin.
         """
-        security.send_email(user.user_email, SUBJECT, TEXT)
+        email = schemas.EmailAddToDB(
+            email_recipient=user.user_email, email_subject=SUBJECT, email_body=TEXT
+        )
+        await adbops.register(db, user, email)
         response.status_code = status.HTTP_201_CREATED
         return {"detail": "Please check your email for confirmation link"}
+    except hashing.HasherBusy as e:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = "1"
+        return {"detail": str(e)}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/forgot")
+@app.post("/api/v1/forgot", responses=serialization.responses(schemas.Detail))
 async def forgot_password(
-    request: Request, response: Response, db: Session = Depends(get_db)
+    request: Request, response: Response, db: AsyncSession = Depends(get_db)
 ):
     try:
         data = await request.json()
@@ -108,7 +234,10 @@ async def forgot_password(
         Recover your password with the link below.
 
         https://studyplan-one.vercel.app/recover/{user_email}"""
-        security.send_email(user_email, SUBJECT, TEXT)
+        email = schemas.EmailAddToDB(
+            email_recipient=user_email, email_subject=SUBJECT, email_body=TEXT
+        )
+        await adbops.queue_email(db, email)
         response.status_code = status.HTTP_201_CREATED
         return {"detail": "Please check your email for confirmation link"}
     except Exception as e:
@@ -116,55 +245,73 @@ async def forgot_password(
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/user")
+@app.get("/api/v1/user", responses=serialization.responses(schemas.CurrentUser))
 async def get_user(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
-    request: Request,
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        user: models.User = dbops.get_user(db, payload.user_uuid)
+        user: models.User = await adbops.get_user(db, principal.user_uuid)
         response.status_code = status.HTTP_200_OK
-        return {"data": payload, "user_avatar": user.user_avatar}
+        return {
+            "data": principal.model_dump(exclude={"access_token"}),
+            "user_avatar": user.user_avatar,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/users")
+@app.get(
+    "/api/v1/users",
+    responses=serialization.responses(schemas.Page[list[schemas.UserProfile]]),
+)
 async def get_users(
     response: Response,
-    db: Session = Depends(get_db),
+    limit: Annotated[int, Query(ge=1, le=200)] = 50,
+    cursor: str | None = None,
+    is_confirmed: bool | None = None,
+    is_premium: bool | None = None,
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        users: List[models.User] = dbops.get_users(db)
-        response.status_code = status.HTTP_200_OK
-        return {"data": users}
+        users, next_cursor = await adbops.get_users(
+            db, limit, cursor, is_confirmed, is_premium
+        )
+        return serialization.FastJSONResponse(
+            {"data": users, "next_cursor": next_cursor}
+        )
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
+@app.get("/api/v1/pool")
+async def get_pool_status(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+):
+    response.status_code = status.HTTP_200_OK
+    return {"data": dbconf.pool_status(), "access_token": principal.access_token}
+
+
 @app.post("/api/v1/confirm/{user_email}")
 async def confirm_email(
     response: Response,
     user_email: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        dbops.confirm_email(db, user_email)
         SUBJECT = "Email Confirmation"
         TEXT = f"""
         Your email has been confirmed. Please proceed to login.
 
         https://studyplan-one.vercel.app/"""
-        security.send_email(user_email, SUBJECT, TEXT)
+        email = schemas.EmailAddToDB(
+            email_recipient=user_email, email_subject=SUBJECT, email_body=TEXT
+        )
+        await adbops.confirm_email(db, user_email, email)
         response.status_code = status.HTTP_202_ACCEPTED
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -175,473 +322,651 @@ async def confirm_email(
 async def disable_user(
     response: Response,
     user_email: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        dbops.disable_user(db, user_email)
         SUBJECT = "Account Disabled"
         TEXT = f"""
         Your email has been disabled by the admin."""
-        security.send_email(user_email, SUBJECT, TEXT)
+        email = schemas.EmailAddToDB(
+            email_recipient=user_email, email_subject=SUBJECT, email_body=TEXT
+        )
+        await adbops.disable_user(db, user_email, email)
         response.status_code = status.HTTP_202_ACCEPTED
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/password")
+@app.patch("/api/v1/password", responses=serialization.responses(schemas.Detail))
 async def change_password(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         data = await request.json()
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.change_password(
-            db, payload.user_uuid, data.get("old_password"), data.get("new_password")
+        await adbops.change_password(
+            db, principal.user_uuid, data.get("old_password"), data.get("new_password")
         )
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Password has been changed", "access_token": access_token}
+        return {
+            "detail": "Password has been changed",
+            "access_token": principal.access_token,
+        }
+    except hashing.HasherBusy as e:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = "1"
+        return {"detail": str(e)}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/recover")
+@app.patch("/api/v1/recover", responses=serialization.responses(schemas.Detail))
 async def recover_password(
-    request: Request, response: Response, db: Session = Depends(get_db)
+    request: Request, response: Response, db: AsyncSession = Depends(get_db)
 ):
     try:
         data = await request.json()
-        dbops.recover_password(db, data.get("user_email"), data.get("new_password"))
+        await adbops.recover_password(
+            db, data.get("user_email"), data.get("new_password")
+        )
         response.status_code = status.HTTP_200_OK
         return {"detail": "Password has been changed"}
+    except hashing.HasherBusy as e:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        response.headers["Retry-After"] = "1"
+        return {"detail": str(e)}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/push")
+@app.patch("/api/v1/push", responses=serialization.responses(schemas.Detail))
 async def toggle_push(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         data = await request.json()
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.toggle_push(db, payload.user_uuid, data.get("push_notif"))
+        await adbops.toggle_push(db, principal.user_uuid, data.get("push_notif"))
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Push notification toggled", "access_token": access_token}
+        return {
+            "detail": "Push notification toggled",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/points")
+@app.get(
+    "/api/v1/points",
+    responses=serialization.responses(schemas.Data[list[schemas.LeaderboardEntry]]),
+)
 async def get_points(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
-    request: Request,
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     response: Response,
-    db: Session = Depends(get_db),
+    window: str = "all",
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        users = dbops.get_points(db)
+        users = leaderboard.top(window, limit)
         response.status_code = status.HTTP_200_OK
-        return {"data": users, "access_token": access_token}
+        return {"data": users, "access_token": principal.access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/sprites")
+@app.get(
+    "/api/v1/points/me",
+    responses=serialization.responses(schemas.Data[schemas.Standing]),
+)
+async def get_standing(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+    window: str = "all",
+    radius: Annotated[int, Query(ge=0, le=50)] = 5,
+):
+    try:
+        standing = leaderboard.standing(window, principal.user_uuid, radius)
+        response.status_code = status.HTTP_200_OK
+        return {"data": standing, "access_token": principal.access_token}
+    except Exception as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"detail": str(e)}
+
+
+@app.get(
+    "/api/v1/sprites",
+    responses=serialization.responses(schemas.Data[list[schemas.SpriteCollection]]),
+)
 async def get_sprites(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
+        tag = await current_etag(db, principal, etag.sprites_key(principal.user_uuid))
+        if etag.matches(request, tag):
+            return etag.not_modified(tag)
+        sprites = await adbops.get_sprites(db, principal.user_uuid)
+        return serialization.FastJSONResponse(
+            {"data": sprites, "access_token": principal.access_token},
+            headers=etag.headers(tag),
         )
-        payload = schemas.TokenData(**payload)
-        sprites = dbops.get_sprites(db, payload.user_uuid)
-        response.status_code = status.HTTP_200_OK
-        return {"data": sprites, "access_token": access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/sprites/single")
+@app.post(
+    "/api/v1/sprites/single",
+    responses=serialization.responses(schemas.Data[list[schemas.SpritePull]]),
+)
 async def single_pull(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
-    request: Request,
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.gacha_life(db, payload.user_uuid, 1)
+        sprites = await adbops.gacha_life(db, principal.user_uuid, 1)
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Single pull successful", "access_token": access_token}
+        return {
+            "detail": "Single pull successful",
+            "data": sprites,
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/sprites/ten")
+@app.post(
+    "/api/v1/sprites/ten",
+    responses=serialization.responses(schemas.Data[list[schemas.SpritePull]]),
+)
 async def ten_pull(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        sprites = await adbops.gacha_life(db, principal.user_uuid, 10)
+        response.status_code = status.HTTP_200_OK
+        return {
+            "detail": "Ten pull successful",
+            "data": sprites,
+            "access_token": principal.access_token,
+        }
+    except Exception as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"detail": str(e)}
+
+
+@app.post(
+    "/api/v1/sprites/pull",
+    responses=serialization.responses(schemas.Data[list[schemas.SpritePull]]),
+)
+async def batch_pull(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
+        data = await request.json()
+        sprites = await adbops.gacha_life(
+            db, principal.user_uuid, int(data.get("pulls"))
         )
-        payload = schemas.TokenData(**payload)
-        dbops.gacha_life(db, payload.user_uuid, 10)
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Ten pull successful", "access_token": access_token}
+        return {
+            "detail": f"{len(sprites)} pulls successful",
+            "data": sprites,
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/avatar")
+@app.patch("/api/v1/avatar", responses=serialization.responses(schemas.Detail))
 async def change_avatar(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         data = await request.json()
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.change_avatar(db, payload.user_uuid, data.get("user_avatar"))
+        await adbops.change_avatar(db, principal.user_uuid, data.get("user_avatar"))
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Avatar changed", "access_token": access_token}
+        return {"detail": "Avatar changed", "access_token": principal.access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/task")
+@app.post("/api/v1/task", responses=serialization.responses(schemas.Detail))
 async def create_task(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
         data = await request.json()
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        print(payload)
-        data = {**data, "user_uuid": payload.user_uuid}
+        data = {**data, "user_uuid": principal.user_uuid}
         task = schemas.TaskAddToDB(**data)
-        dbops.create_task(db, task)
+        await adbops.create_task(db, task)
         response.status_code = status.HTTP_201_CREATED
-        return {"detail": "Task has been created", "access_token": access_token}
+        return {
+            "detail": "Task has been created",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/task")
+@app.patch("/api/v1/task", responses=serialization.responses(schemas.Detail))
 async def update_task(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
         data = await request.json()
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        data = {**data, "user_uuid": payload.user_uuid}
+        data = {**data, "user_uuid": principal.user_uuid}
         task = schemas.TaskUpdateToDB(**data)
-        dbops.update_task(db, task)
+        await adbops.update_task(db, task)
         response.status_code = status.HTTP_202_ACCEPTED
-        return {"detail": "Task has been updated", "access_token": access_token}
+        return {
+            "detail": "Task has been updated",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/task/{task_uuid}")
+@app.patch(
+    "/api/v1/task/{task_uuid}",
+    responses=serialization.responses(schemas.Detail),
+)
 async def complete_task(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
-    request: Request,
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     task_uuid: str,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.complete_task(db, task_uuid, payload.user_uuid)
+        await adbops.complete_task(db, task_uuid, principal.user_uuid)
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Task has been completed", "access_token": access_token}
+        return {
+            "detail": "Task has been completed",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.patch("/api/v1/session")
-async def complete_session(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+@app.post(
+    "/api/v1/tasks/batch",
+    responses=serialization.responses(schemas.Data[schemas.TaskBatchResult]),
+)
+async def apply_task_batch(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.complete_session(db, payload.user_uuid)
+        data = await request.json()
+        for action in ("create", "update"):
+            data[action] = [
+                {**task, "user_uuid": principal.user_uuid}
+                for task in data.get(action, [])
+            ]
+        batch = schemas.TaskBatch(**data)
+        result = await adbops.apply_task_batch(db, principal.user_uuid, batch)
         response.status_code = status.HTTP_200_OK
-        return {"detail": "Session has been completed", "access_token": access_token}
+        return {"data": result, "access_token": principal.access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.delete("/api/v1/task/{task_uuid}")
+@app.patch("/api/v1/session", responses=serialization.responses(schemas.Detail))
+async def complete_session(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        await adbops.complete_session(db, principal.user_uuid)
+        response.status_code = status.HTTP_200_OK
+        return {
+            "detail": "Session has been completed",
+            "access_token": principal.access_token,
+        }
+    except Exception as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"detail": str(e)}
+
+
+@app.delete(
+    "/api/v1/task/{task_uuid}",
+    responses=serialization.responses(schemas.Detail),
+)
 async def delete_task(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
-    request: Request,
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     task_uuid: str,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        dbops.delete_task(db, task_uuid, payload.user_uuid)
+        await adbops.delete_task(db, task_uuid, principal.user_uuid)
         response.status_code = (
             status.HTTP_204_NO_CONTENT
-            if access_token is not None
+            if principal.access_token is not None
             else status.HTTP_202_ACCEPTED
         )
-        return {"detail": "Task has been deleted", "access_token": access_token}
+        return {
+            "detail": "Task has been deleted",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/tasks")
+@app.get(
+    "/api/v1/tasks",
+    responses=serialization.responses(schemas.Page[list[schemas.Tasks]]),
+)
 async def get_tasks(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    is_done: bool | None = None,
+    category: Annotated[list[str] | None, Query()] = None,
+    priority: Annotated[list[str] | None, Query()] = None,
+    deadline_from: date | None = None,
+    deadline_to: date | None = None,
+    sort: Literal["deadline", "-deadline", "priority"] = "deadline",
+    limit: Annotated[int | None, Query(ge=1, le=200)] = None,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
 ):
+    # without a limit every matching task comes back, as before
+    filters = (is_done, category, priority, deadline_from, deadline_to)
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
+        tag = await current_etag(
+            db,
+            principal,
+            etag.tasks_key(principal.user_uuid),
+            *filters,
+            sort,
+            limit,
+            cursor,
+        )
+        if etag.matches(request, tag):
+            return etag.not_modified(tag)
+        tasks, next_cursor = await adbops.get_tasks(
+            db, principal.user_uuid, limit, cursor, sort, *filters
+        )
+        return serialization.FastJSONResponse(
+            {
+                "data": tasks,
+                "next_cursor": next_cursor,
+                "access_token": principal.access_token,
+            },
+            headers=etag.headers(tag),
         )
-        payload = schemas.TokenData(**payload)
-        tasks = dbops.get_tasks(db, payload.user_uuid)
-        response.status_code = status.HTTP_200_OK
-        return {"data": tasks, "access_token": access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/task/{task_uuid}")
+@app.get(
+    "/api/v1/task/{task_uuid}",
+    responses=serialization.responses(schemas.Data[list[schemas.Tasks]]),
+)
 async def get_task(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
-    request: Request,
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     response: Response,
     task_uuid: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
+        tasks = await adbops.get_task(task_uuid, db)
+        return serialization.FastJSONResponse(
+            {"data": tasks, "access_token": principal.access_token}
         )
-        payload = schemas.TokenData(**payload)
-        tasks = dbops.get_task(task_uuid, db)
-        response.status_code = status.HTTP_200_OK
-        return {"data": tasks, "access_token": access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/forum")
+@app.post("/api/v1/forum", responses=serialization.responses(schemas.Detail))
 async def create_forum(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
         data = await request.json()
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
         forum_owner = {
             "is_owner": True,
-            "user_uuid": payload.user_uuid,
-            "user_name": payload.user_name,
+            "user_uuid": principal.user_uuid,
+            "user_name": principal.user_name,
         }
         forum = schemas.ForumAddToDB(**data)
-        dbops.create_forum(db, forum, forum_owner)
+        await adbops.create_forum(db, forum, forum_owner)
         log = {
             "user_log_details": "FORUM POSTED",
-            "user_uuid": payload.user_uuid
+            "user_uuid": principal.user_uuid
         }
         log = schemas.UserLogs(**log)
-        dbops.add_log(db, log)
+        logbuffer.submit(log)
         response.status_code = status.HTTP_201_CREATED
-        return {"detail": "Forum has been created", "access_token": access_token}
+        return {
+            "detail": "Forum has been created",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.post("/api/v1/comment")
+@app.post("/api/v1/comment", responses=serialization.responses(schemas.Detail))
 async def create_comment(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
         data = await request.json()
-        print(access_token)
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
-        )
-        payload = schemas.TokenData(**payload)
-        data["user_uuid"] = payload.user_uuid
+        data["user_uuid"] = principal.user_uuid
         forum_member = {
             "is_owner": False,
-            "user_uuid": payload.user_uuid,
-            "user_name": payload.user_name,
+            "user_uuid": principal.user_uuid,
+            "user_name": principal.user_name,
         }
         comment = schemas.ForumCommentAddToDB(**data)
-        dbops.create_comment(db, comment, forum_member)
+        await adbops.create_comment(db, comment, forum_member)
         log = {
             "user_log_details": "COMMENT POSTED",
-            "user_uuid": payload.user_uuid
+            "user_uuid": principal.user_uuid
         }
         log = schemas.UserLogs(**log)
-        dbops.add_log(db, log)
+        logbuffer.submit(log)
         response.status_code = status.HTTP_201_CREATED
-        return {"detail": "Comment has been submitted", "access_token": access_token}
+        return {
+            "detail": "Comment has been submitted",
+            "access_token": principal.access_token,
+        }
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/forums")
+@app.get(
+    "/api/v1/forums",
+    responses=serialization.responses(schemas.Page[list[schemas.ForumHeaders]]),
+)
 async def get_forums(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
-    db: Session = Depends(get_db),
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
+        tag = await current_etag(db, principal, etag.FORUMS_KEY, limit, cursor)
+        if etag.matches(request, tag):
+            return etag.not_modified(tag)
+        forums, next_cursor = await adbops.get_forums(db, limit, cursor)
+        return serialization.FastJSONResponse(
+            {
+                "data": forums,
+                "next_cursor": next_cursor,
+                "access_token": principal.access_token,
+            },
+            headers=etag.headers(tag),
+        )
+    except Exception as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {"detail": str(e)}
+
+
+@app.get(
+    "/api/v1/search",
+    responses=serialization.responses(schemas.Page[list[schemas.SearchHit]]),
+)
+async def search(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        hits, next_cursor = await adbops.search(db, q, limit, cursor)
+        return serialization.FastJSONResponse(
+            {
+                "data": hits,
+                "next_cursor": next_cursor,
+                "access_token": principal.access_token,
+            }
         )
-        payload = schemas.TokenData(**payload)
-        forums = dbops.get_forums(db)
-        response.status_code = status.HTTP_200_OK
-        return {"data": forums, "access_token": access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/{user_id}/forums")
+@app.get(
+    "/api/v1/{user_id}/forums",
+    responses=serialization.responses(schemas.Data[list[schemas.ForumHeaders]]),
+)
 async def get_user_forums(
     response: Response,
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        forums = dbops.get_user_forums(db, user_id)
-        response.status_code = status.HTTP_200_OK
-        return {"data": forums}
+        forums = await adbops.get_user_forums(db, user_id)
+        return serialization.FastJSONResponse({"data": forums})
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
-@app.get("/api/v1/logs")
+
+@app.get(
+    "/api/v1/logs",
+    responses=serialization.responses(schemas.Data[list[schemas.UserLogEntry]]),
+)
 async def get_logs(
     response: Response,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        forums = dbops.get_logs(db)
-        response.status_code = status.HTTP_200_OK
-        return {"data": forums}
+        logs = await adbops.get_logs(db)
+        return serialization.FastJSONResponse({"data": logs})
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
+
+@app.get("/api/v1/logs/export")
+async def export_logs(
+    export_format: Annotated[
+        Literal["ndjson", "csv"], Query(alias="format")
+    ] = "ndjson",
+    user_uuid: UUID | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    details: Annotated[list[str] | None, Query()] = None,
+):
+    # the session lives as long as the stream, get_db would close it as soon as
+    # the handler returns
+    async def chunks():
+        fields = list(schemas.UserLogEntry.model_fields)
+        if export_format == "csv":
+            yield serialization.csv_chunk(fields, [], header=True)
+        async with AsyncSessionLocal() as db:
+            async for rows in adbops.stream_logs(
+                db,
+                consts.LOG_EXPORT_CHUNK,
+                user_uuid,
+                date_from,
+                date_to,
+                details,
+            ):
+                if export_format == "csv":
+                    yield serialization.csv_chunk(fields, rows)
+                else:
+                    yield serialization.ndjson(rows)
+
+    if export_format == "csv":
+        return StreamingResponse(
+            chunks(),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="user_logs.csv"'},
+        )
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+@app.get("/api/v1/logs/buffer")
+async def get_log_buffer(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+):
+    response.status_code = status.HTTP_200_OK
+    return {"data": logbuffer.stats(), "access_token": principal.access_token}
+
+
 @app.delete("/api/v1/forums/{forum_id}")
 async def delete_user_forum(
     response: Response,
     forum_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        forums = dbops.delete_forum(db, forum_id)
+        forums = await adbops.delete_forum(db, forum_id)
         response.status_code = status.HTTP_200_OK
         return {"data": forums}
     except Exception as e:
@@ -649,16 +974,18 @@ async def delete_user_forum(
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/{user_id}/comments")
+@app.get(
+    "/api/v1/{user_id}/comments",
+    responses=serialization.responses(schemas.Data[list[schemas.ForumComments]]),
+)
 async def get_user_comments(
     response: Response,
     user_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        forums = dbops.get_user_comments(db, user_id)
-        response.status_code = status.HTTP_200_OK
-        return {"data": forums}
+        forums = await adbops.get_user_comments(db, user_id)
+        return serialization.FastJSONResponse({"data": forums})
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
@@ -668,10 +995,10 @@ async def get_user_comments(
 async def delete_user_comment(
     response: Response,
     comment_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        forums = dbops.delete_comment(db, comment_id)
+        forums = await adbops.delete_comment(db, comment_id)
         response.status_code = status.HTTP_200_OK
         return {"data": forums}
     except Exception as e:
@@ -679,34 +1006,115 @@ async def delete_user_comment(
         return {"detail": str(e)}
 
 
-@app.get("/api/v1/forum/{forum_uuid}")
+@app.get(
+    "/api/v1/forum/{forum_uuid}",
+    responses=serialization.responses(schemas.Data[list[schemas.Forums]]),
+)
 async def get_forum(
-    access_token: Annotated[str, Depends(oauth2_scheme)],
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
     request: Request,
     response: Response,
     forum_uuid: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        refresh_token = request.cookies.get("REFRESH_TOKEN")
-        payload, access_token = security.verify_access_token(
-            refresh_token, access_token
+        tag = await current_etag(db, principal, etag.forum_key(forum_uuid))
+        if etag.matches(request, tag):
+            return etag.not_modified(tag)
+        forums = await adbops.get_forum(forum_uuid, db)
+        return serialization.FastJSONResponse(
+            {"data": forums, "access_token": principal.access_token},
+            headers=etag.headers(tag),
         )
-        payload = schemas.TokenData(**payload)
-        forums = dbops.get_forum(forum_uuid, db)
-        response.status_code = status.HTTP_200_OK
-        return {"data": forums, "access_token": access_token}
     except Exception as e:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return {"detail": str(e)}
 
 
+async def live(websocket: WebSocket, topic: str):
+    # browsers cannot set headers on a websocket, so the access token may also
+    # come as ?token=. messages from the client are read and ignored, the read
+    # is what notices the disconnect.
+    token = websocket.query_params.get("token")
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    try:
+        security.verify_access_token(websocket.cookies.get("REFRESH_TOKEN"), token)
+        subscription = livehub.subscribe(topic)
+    except livehub.HubFull:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    async def send():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    try:
+        await websocket.accept()
+        sender = asyncio.create_task(send())
+        try:
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sender.cancel()
+    finally:
+        livehub.unsubscribe(subscription)
+
+
+@app.websocket("/api/v1/forums/live")
+async def live_forums(websocket: WebSocket):
+    await live(websocket, etag.FORUMS_KEY)
+
+
+@app.websocket("/api/v1/forum/{forum_uuid}/live")
+async def live_forum(websocket: WebSocket, forum_uuid: UUID):
+    await live(websocket, etag.forum_key(forum_uuid))
+
+
+@app.get("/api/v1/live")
+async def get_live_status(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+):
+    response.status_code = status.HTTP_200_OK
+    return {"data": livehub.stats(), "access_token": principal.access_token}
+
+
+@app.get("/api/v1/reminders")
+async def get_reminders_status(
+    principal: Annotated[schemas.Principal, Depends(get_principal)],
+    response: Response,
+):
+    response.status_code = status.HTTP_200_OK
+    return {"data": reminders.stats(), "access_token": principal.access_token}
+
+
 def main():
+    import argparse
+
     import uvicorn
-    from dotenv import load_dotenv
 
-    load_dotenv()
-    uvicorn.run("main:app", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Run the studyplan api")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="prefork workers on uvloop and httptools instead of the reloader",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=consts.SERVER_WORKERS)
+    args = parser.parse_args()
+
+    if args.production:
+        import server as server
+
+        server.run(app, args.host, args.port, args.workers)
+        return
+    uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+import querybudget as querybudget
+
+# prometheus series for the api and the mailer. with several uvicorn workers
+# set PROMETHEUS_MULTIPROC_DIR to an empty directory before they start: every
+# process then writes its samples there and /metrics on any worker reports
+# the sum over all of them.
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+http_requests = Counter(
+    "http_requests_total", "Requests handled", ["method", "route", "status"]
+)
+sql_statement_duration = Histogram(
+    "sql_statement_duration_seconds",
+    "Time spent executing a statement, by the dbops function that issued it",
+    ["operation"],
+    buckets=SQL_BUCKETS,
+)
+pool_checked_out = Gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+pool_size = Gauge(
+    "db_pool_size",
+    "Configured pool size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+pool_overflow = Gauge(
+    "db_pool_overflow",
+    "Connections open beyond the pool size",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    ["engine"],
+    buckets=SQL_BUCKETS,
+)
+pool_checkout_timeouts = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up waiting for a connection",
+    ["engine"],
+)
+email_send_duration = Histogram(
+    "email_send_duration_seconds",
+    "Time spent handing one email to the SMTP server",
+    buckets=LATENCY_BUCKETS,
+)
+email_send_failures = Counter(
+    "email_send_failures_total", "Emails the SMTP server did not accept", ["error"]
+)
+gacha_pulls = Counter("gacha_pulls_total", "Sprites pulled from the gacha")
+live_subscribers = Gauge(
+    "live_subscribers",
+    "Open live forum connections",
+    multiprocess_mode="livesum",
+)
+live_events = Counter("live_events_total", "Events published to the live hub")
+live_overflows = Counter(
+    "live_overflows_total", "Times a slow live subscriber was sent a resync"
+)
+reminders_scheduled = Gauge(
+    "reminders_scheduled",
+    "Task reminders waiting in the scheduler heap",
+    multiprocess_mode="livesum",
+)
+reminders_fired = Counter("reminders_fired_total", "Task reminders queued as emails")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    sql_statement_duration.labels(querybudget.current_operation() or "-").observe(
+        time.perf_counter() - started.pop()
+    )
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    started = connection.info.get("metrics_started") if connection is not None else None
+    if started:
+        started.pop()
+
+
+def install(engine, name: str):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    pool = engine.pool
+    pool_size.labels(name).set(pool.size())
+
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_checked_out.labels(name).set(pool.checkedout())
+        pool_overflow.labels(name).set(max(pool.overflow(), 0))
+
+    def checkin(dbapi_connection, connection_record):
+        # fires before the pool takes the connection back
+        pool_checked_out.labels(name).set(max(pool.checkedout() - 1, 0))
+
+    event.listen(pool, "checkout", checkout)
+    event.listen(pool, "checkin", checkin)
+
+
+def _registry():
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def serve(port: int):
+    # standalone exporter for processes without an http app, like mailer.py
+    start_http_server(port, registry=_registry())
+
+
+def process_exit(pid: int | None = None):
+    # drops this worker's livesum gauges, counters and histograms are kept
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
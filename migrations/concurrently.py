@@ -0,0 +1,45 @@
+from alembic import op
+import sqlalchemy as sa
+
+# shared by the revisions that add indexes to live tables. CREATE INDEX
+# CONCURRENTLY cannot run inside a transaction, so these step out of the
+# revision's transaction with autocommit_block(). a concurrent build that fails
+# leaves an INVALID index behind, rerunning the upgrade drops and rebuilds it.
+# 0003 shipped before this module and keeps its own copy of the same steps.
+
+
+def _drop_if_invalid(name: str):
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or op.get_context().as_sql:
+        return
+    invalid = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_class JOIN pg_index ON pg_index.indexrelid = pg_class.oid "
+            "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+        ),
+        {"name": name},
+    ).first()
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True)
+
+
+def create_indexes(indexes):
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in indexes:
+            _drop_if_invalid(name)
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **options,
+            )
+
+
+def drop_indexes(indexes):
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(indexes):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,35 @@
+from alembic import op
+import sqlalchemy as sa
+
+# used by 0002. before Alembic, main.py built the schema with
+# Base.metadata.create_all, so a database created by a release between the
+# baseline and 0002 already has the tables and columns that release added.
+# these skip whatever is there, so `alembic stamp 0001` followed by
+# `alembic upgrade head` works for a database from any of those releases.
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def has_table(name: str) -> bool:
+    if op.get_context().as_sql:
+        return False
+    return _inspector().has_table(name)
+
+
+def create_table(name: str, *columns) -> bool:
+    # True when the table was created here
+    if has_table(name):
+        return False
+    op.create_table(name, *columns)
+    return True
+
+
+def add_columns(table: str, *columns: sa.Column):
+    existing = set()
+    if not op.get_context().as_sql:
+        existing = {column["name"] for column in _inspector().get_columns(table)}
+    for column in columns:
+        if column.name not in existing:
+            op.add_column(table, column)
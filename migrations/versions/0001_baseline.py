@@ -0,0 +1,126 @@
+"""baseline schema
+
+The tables as main.py used to create them with Base.metadata.create_all.
+Databases that were created that way already have them: mark them with
+`alembic stamp 0001` and then run `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sprites",
+        sa.Column("sprite_uuid", sa.Uuid(), nullable=False),
+        sa.Column("sprite_source", sa.String(), nullable=False),
+        sa.Column("sprite_summon_chance", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("sprite_uuid"),
+        sa.UniqueConstraint("sprite_source"),
+    )
+    op.create_table(
+        "forums",
+        sa.Column("forum_uuid", sa.Uuid(), nullable=False),
+        sa.Column("forum_title", sa.String(), nullable=False),
+        sa.Column("forum_category", sa.String(), nullable=False),
+        sa.Column("forum_details", sa.String(), nullable=False),
+        sa.Column("forum_status", sa.String(), nullable=False),
+        sa.Column("created_at", sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint("forum_uuid"),
+    )
+    op.create_table(
+        "users",
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.Column("user_fname", sa.String(), nullable=False),
+        sa.Column("user_lname", sa.String(), nullable=False),
+        sa.Column("user_email", sa.String(), nullable=False),
+        sa.Column("user_password", sa.String(), nullable=False),
+        sa.Column("is_premium", sa.Boolean(), nullable=False),
+        sa.Column("is_confirmed", sa.Boolean(), nullable=False),
+        sa.Column("user_points", sa.Integer(), nullable=False),
+        sa.Column("push_notif", sa.Boolean(), nullable=False),
+        sa.Column("user_avatar", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DATE(), nullable=False),
+        sa.Column("last_login", sa.DATE(), nullable=False),
+        sa.PrimaryKeyConstraint("user_uuid"),
+        sa.UniqueConstraint("user_email"),
+    )
+    op.create_table(
+        "tasks",
+        sa.Column("task_uuid", sa.Uuid(), nullable=False),
+        sa.Column("task_details", sa.String(), nullable=False),
+        sa.Column("task_priority", sa.String(), nullable=False),
+        sa.Column("task_category", sa.String(), nullable=False),
+        sa.Column("task_deadline", sa.Date(), nullable=False),
+        sa.Column("task_time", sa.Time(), nullable=False),
+        sa.Column("is_done", sa.Boolean(), nullable=False),
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"]),
+        sa.PrimaryKeyConstraint("task_uuid"),
+    )
+    op.create_table(
+        "sprite_instances",
+        sa.Column("sprite_instance_uuid", sa.Uuid(), nullable=False),
+        sa.Column("acquisition_date", sa.Date(), nullable=False),
+        sa.Column("sprite_uuid", sa.Uuid(), nullable=False),
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(["sprite_uuid"], ["sprites.sprite_uuid"]),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"]),
+        sa.PrimaryKeyConstraint("sprite_instance_uuid"),
+    )
+    op.create_table(
+        "forum_members",
+        sa.Column("forum_member_uuid", sa.Uuid(), nullable=False),
+        sa.Column("user_name", sa.String(), nullable=False),
+        sa.Column("is_owner", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.Date(), nullable=True),
+        sa.Column("forum_uuid", sa.Uuid(), nullable=False),
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(["forum_uuid"], ["forums.forum_uuid"]),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"]),
+        sa.PrimaryKeyConstraint("forum_member_uuid"),
+    )
+    op.create_table(
+        "forum_comments",
+        sa.Column("forum_comment_uuid", sa.Uuid(), nullable=False),
+        sa.Column("forum_comment", sa.String(), nullable=False),
+        sa.Column("created_at", sa.Date(), nullable=False),
+        sa.Column("forum_uuid", sa.Uuid(), nullable=False),
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(["forum_uuid"], ["forums.forum_uuid"]),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"]),
+        sa.PrimaryKeyConstraint("forum_comment_uuid"),
+    )
+    op.create_table(
+        "user_logs",
+        sa.Column("user_log_uuid", sa.Uuid(), nullable=False),
+        sa.Column("user_log_details", sa.String(), nullable=False),
+        sa.Column("created_at", sa.Date(), nullable=False),
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"]),
+        sa.PrimaryKeyConstraint("user_log_uuid"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_logs")
+    op.drop_table("forum_comments")
+    op.drop_table("forum_members")
+    op.drop_table("sprite_instances")
+    op.drop_table("tasks")
+    op.drop_table("users")
+    op.drop_table("forums")
+    op.drop_table("sprites")
@@ -0,0 +1,100 @@
+"""points ledger, email outbox, forum counters and weekly points
+
+Databases created with create_all by a release from before this revision
+may already have some of it, see migrations/existing.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations import existing
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing.add_columns(
+        "forums",
+        sa.Column("comment_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("member_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    existing.add_columns(
+        "users",
+        sa.Column("weekly_points", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("weekly_points_week", sa.Date(), nullable=True),
+    )
+    existing.create_table(
+        "points_ledger",
+        sa.Column("points_ledger_uuid", sa.Uuid(), nullable=False),
+        sa.Column("points_delta", sa.Integer(), nullable=False),
+        sa.Column("points_balance", sa.Integer(), nullable=False),
+        sa.Column("points_reason", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("user_uuid", sa.Uuid(), nullable=False),
+        sa.ForeignKeyConstraint(["user_uuid"], ["users.user_uuid"]),
+        sa.PrimaryKeyConstraint("points_ledger_uuid"),
+    )
+    existing.create_table(
+        "email_outbox",
+        sa.Column("email_uuid", sa.Uuid(), nullable=False),
+        sa.Column("email_recipient", sa.String(), nullable=False),
+        sa.Column("email_subject", sa.String(), nullable=False),
+        sa.Column("email_body", sa.String(), nullable=False),
+        sa.Column("email_status", sa.String(), nullable=False),
+        sa.Column("email_attempts", sa.Integer(), nullable=False),
+        sa.Column("email_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("email_uuid"),
+    )
+
+    # the counters start from the rows that already exist (what
+    # dbops.recount_forums does, spelled out so this revision does not change
+    # when dbops does), and every balance that predates the ledger gets an
+    # opening entry
+    op.execute("""
+        UPDATE forums SET
+            comment_count = (
+                SELECT count(*) FROM forum_comments
+                WHERE forum_comments.forum_uuid = forums.forum_uuid
+            ),
+            member_count = (
+                SELECT count(*) FROM forum_members
+                WHERE forum_members.forum_uuid = forums.forum_uuid
+            )
+        """)
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("""
+            INSERT INTO points_ledger (
+                points_ledger_uuid, points_delta, points_balance,
+                points_reason, created_at, user_uuid
+            )
+            SELECT gen_random_uuid(), user_points, user_points,
+                'OPENING BALANCE', now(), user_uuid
+            FROM users
+            WHERE NOT EXISTS (
+                SELECT 1 FROM points_ledger
+                WHERE points_ledger.user_uuid = users.user_uuid
+            )
+            """)
+
+
+def downgrade() -> None:
+    op.drop_table("email_outbox")
+    op.drop_table("points_ledger")
+    op.drop_column("users", "weekly_points_week")
+    op.drop_column("users", "weekly_points")
+    op.drop_column("forums", "member_count")
+    op.drop_column("forums", "comment_count")
@@ -0,0 +1,102 @@
+"""indexes for the per-user and per-forum lookups
+
+Built with CREATE INDEX CONCURRENTLY outside the revision's transaction, so
+writes keep flowing while they build. A concurrent build that fails leaves an
+INVALID index behind; rerunning the upgrade drops and rebuilds it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_tasks_user_uuid_task_deadline", "tasks", ["user_uuid", "task_deadline"], {}),
+    ("ix_sprite_instances_user_uuid", "sprite_instances", ["user_uuid"], {}),
+    (
+        "ix_forum_comments_forum_uuid_created_at",
+        "forum_comments",
+        ["forum_uuid", "created_at"],
+        {},
+    ),
+    ("ix_forum_comments_user_uuid", "forum_comments", ["user_uuid"], {}),
+    (
+        "ix_forum_members_forum_uuid_user_uuid",
+        "forum_members",
+        ["forum_uuid", "user_uuid"],
+        {},
+    ),
+    (
+        "ix_forum_members_user_uuid_is_owner",
+        "forum_members",
+        ["user_uuid", "is_owner"],
+        {},
+    ),
+    ("ix_forums_created_at_forum_uuid", "forums", ["created_at", "forum_uuid"], {}),
+    (
+        "ix_user_logs_user_uuid_created_at",
+        "user_logs",
+        ["user_uuid", "created_at"],
+        {},
+    ),
+    (
+        "ix_points_ledger_user_uuid_created_at",
+        "points_ledger",
+        ["user_uuid", "created_at"],
+        {},
+    ),
+    (
+        "ix_email_outbox_pending_next_attempt_at",
+        "email_outbox",
+        ["next_attempt_at"],
+        {"postgresql_where": sa.text("email_status = 'pending'")},
+    ),
+)
+
+
+def _drop_if_invalid(name: str):
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or op.get_context().as_sql:
+        return
+    invalid = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_class JOIN pg_index ON pg_index.indexrelid = pg_class.oid "
+            "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+        ),
+        {"name": name},
+    ).first()
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True)
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            _drop_if_invalid(name)
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **options,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
@@ -0,0 +1,35 @@
+"""indexes for the paginated user directory
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from migrations import concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_users_created_at_user_uuid", "users", ["created_at", "user_uuid"], {}),
+    (
+        "ix_users_is_confirmed_is_premium_created_at",
+        "users",
+        ["is_confirmed", "is_premium", "created_at", "user_uuid"],
+        {},
+    ),
+)
+
+
+def upgrade() -> None:
+    concurrently.create_indexes(INDEXES)
+
+
+def downgrade() -> None:
+    concurrently.drop_indexes(INDEXES)
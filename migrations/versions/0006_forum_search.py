@@ -0,0 +1,99 @@
+"""full-text search columns and GIN indexes for forums and comments
+
+The columns are added nullable, so adding them does not rewrite the tables.
+Existing rows are backfilled in batches of BATCH_SIZE, each batch committed on
+its own, before the indexes are built concurrently. New rows get their vector
+from dbops.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations import concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+# same vectors as dbops._search_vector, spelled out so this revision does not
+# change when dbops does
+BACKFILLS = (
+    (
+        "forums",
+        "forum_uuid",
+        "setweight(to_tsvector('english', forum_title), 'A')"
+        " || setweight(to_tsvector('english', forum_category), 'B')"
+        " || setweight(to_tsvector('english', forum_details), 'C')",
+    ),
+    (
+        "forum_comments",
+        "forum_comment_uuid",
+        "setweight(to_tsvector('english', forum_comment), 'C')",
+    ),
+)
+
+INDEXES = (
+    (
+        "ix_forums_search_vector",
+        "forums",
+        ["search_vector"],
+        {"postgresql_using": "gin"},
+    ),
+    (
+        "ix_forum_comments_search_vector",
+        "forum_comments",
+        ["search_vector"],
+        {"postgresql_using": "gin"},
+    ),
+)
+
+
+def _backfill(table: str, key: str, vector: str):
+    if op.get_context().as_sql:
+        op.execute(
+            f"UPDATE {table} SET search_vector = {vector} WHERE search_vector IS NULL"
+        )
+        return
+    batch = sa.text(
+        f"UPDATE {table} SET search_vector = {vector} WHERE {key} IN ("
+        f"SELECT {key} FROM {table} WHERE search_vector IS NULL LIMIT {BATCH_SIZE})"
+    )
+    bind = op.get_bind()
+    while bind.execute(batch).rowcount:
+        pass
+
+
+def upgrade() -> None:
+    op.add_column(
+        "forums",
+        sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True),
+    )
+    op.add_column(
+        "forum_comments",
+        sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True),
+    )
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        for table, key, vector in BACKFILLS:
+            _backfill(table, key, vector)
+    concurrently.create_indexes(INDEXES)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        concurrently.drop_indexes(INDEXES)
+    op.drop_column("forum_comments", "search_vector")
+    op.drop_column("forums", "search_vector")
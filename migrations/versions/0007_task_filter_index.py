@@ -0,0 +1,34 @@
+"""index for the filtered task list
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from migrations import concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    (
+        "ix_tasks_user_uuid_is_done_task_deadline",
+        "tasks",
+        ["user_uuid", "is_done", "task_deadline"],
+        {},
+    ),
+)
+
+
+def upgrade() -> None:
+    concurrently.create_indexes(INDEXES)
+
+
+def downgrade() -> None:
+    concurrently.drop_indexes(INDEXES)
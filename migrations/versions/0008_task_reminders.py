@@ -0,0 +1,42 @@
+"""task reminders: the deadline each task was last reminded for
+
+reminded_for is added nullable, so adding it does not rewrite tasks. The
+partial index lets the reminder scheduler walk pending deadlines in order.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations import concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    (
+        "ix_tasks_pending_deadline",
+        "tasks",
+        ["task_deadline", "task_time", "task_uuid"],
+        {"postgresql_where": sa.text("is_done = false")},
+    ),
+)
+
+
+def upgrade() -> None:
+    op.add_column("tasks", sa.Column("reminded_for", sa.DateTime(), nullable=True))
+    concurrently.create_indexes(INDEXES)
+
+
+def downgrade() -> None:
+    concurrently.drop_indexes(INDEXES)
+    op.drop_column("tasks", "reminded_for")
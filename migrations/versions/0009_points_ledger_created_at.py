@@ -0,0 +1,30 @@
+"""index the points ledger by time, for the leaderboard refresh
+
+Each worker's leaderboard picks up the users whose points changed since its
+last refresh from the ledger entries written since then.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from migrations import concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (("ix_points_ledger_created_at", "points_ledger", ["created_at"], {}),)
+
+
+def upgrade() -> None:
+    concurrently.create_indexes(INDEXES)
+
+
+def downgrade() -> None:
+    concurrently.drop_indexes(INDEXES)
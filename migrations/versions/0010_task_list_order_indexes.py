@@ -0,0 +1,63 @@
+"""task list indexes that deliver the list order
+
+The task list sorts on (task_deadline, task_time, task_uuid). The indexes
+from 0003 and 0007 stop at task_deadline, so every page sorted the user's
+matching tasks before the limit applied. These replace them with the full
+sort key: one for the unfiltered list, one for is_done filtered lists.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from migrations import concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    (
+        "ix_tasks_user_uuid_task_deadline_task_time_task_uuid",
+        "tasks",
+        ["user_uuid", "task_deadline", "task_time", "task_uuid"],
+        {},
+    ),
+    (
+        "ix_tasks_user_uuid_is_done_task_deadline_task_time_task_uuid",
+        "tasks",
+        ["user_uuid", "is_done", "task_deadline", "task_time", "task_uuid"],
+        {},
+    ),
+)
+
+# prefixes of the new indexes, dropped once those are built
+REPLACED = (
+    (
+        "ix_tasks_user_uuid_task_deadline",
+        "tasks",
+        ["user_uuid", "task_deadline"],
+        {},
+    ),
+    (
+        "ix_tasks_user_uuid_is_done_task_deadline",
+        "tasks",
+        ["user_uuid", "is_done", "task_deadline"],
+        {},
+    ),
+)
+
+
+def upgrade() -> None:
+    concurrently.create_indexes(INDEXES)
+    concurrently.drop_indexes(REPLACED)
+
+
+def downgrade() -> None:
+    concurrently.create_indexes(REPLACED)
+    concurrently.drop_indexes(INDEXES)
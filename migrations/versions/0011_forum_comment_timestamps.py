@@ -0,0 +1,51 @@
+"""store when a forum comment was posted, not only the day
+
+forum_comments.created_at was a DATE, so every comment posted on the same
+day sorted by its uuid and a forum page read out of posting order. The
+column becomes a timestamptz. Existing comments keep their day, at midnight
+Singapore time like security.get_locale_datetime. On postgres the type change
+rewrites forum_comments (and rebuilds its indexes) under an exclusive lock;
+sqlite does not enforce column types, so there is nothing to change there.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.alter_column(
+        "forum_comments",
+        "created_at",
+        type_=sa.DateTime(timezone=True),
+        existing_type=sa.Date(),
+        existing_nullable=False,
+        postgresql_using="created_at::timestamp AT TIME ZONE 'Asia/Singapore'",
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.alter_column(
+        "forum_comments",
+        "created_at",
+        type_=sa.Date(),
+        existing_type=sa.DateTime(timezone=True),
+        existing_nullable=False,
+        postgresql_using="(created_at AT TIME ZONE 'Asia/Singapore')::date",
+    )
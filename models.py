@@ -4,15 +4,20 @@ from typing import List
 from sqlalchemy import (
     DATE,
     UUID,
+    BigInteger,
     Boolean,
     Column,
     Date,
+    DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Time,
+    text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 import security as security
@@ -33,13 +38,21 @@ class Sprite(Base):
 
 class Forum(Base):
     __tablename__ = "forums"
+    __table_args__ = (
+        Index("ix_forums_created_at_forum_uuid", "created_at", "forum_uuid"),
+        Index("ix_forums_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     forum_uuid = mapped_column(UUID, primary_key=True, default=security.generate_uuid)
     forum_title = Column(String, nullable=False)
     forum_category = Column(String, nullable=False)
     forum_details = Column(String, nullable=False)
     forum_status = Column(String, nullable=False)
-    created_at = Column(Date, nullable=True, default=security.get_locale_datetime())
+    created_at = Column(Date, nullable=True, default=security.get_locale_datetime)
+    comment_count = Column(Integer, nullable=False, default=0)
+    member_count = Column(Integer, nullable=False, default=0)
+    # written by dbops next to the text it indexes, never loaded with the row
+    search_vector = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     forum_members: Mapped[List["ForumMember"]] = relationship(back_populates="forum")
     forum_comments: Mapped[List["ForumComment"]] = relationship(
@@ -49,6 +62,16 @@ class Forum(Base):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_created_at_user_uuid", "created_at", "user_uuid"),
+        Index(
+            "ix_users_is_confirmed_is_premium_created_at",
+            "is_confirmed",
+            "is_premium",
+            "created_at",
+            "user_uuid",
+        ),
+    )
 
     user_uuid = mapped_column(UUID, primary_key=True, default=security.generate_uuid)
     user_fname = Column(String, nullable=False)
@@ -58,10 +81,12 @@ class User(Base):
     is_premium = Column(Boolean, nullable=False, default=False)
     is_confirmed = Column(Boolean, nullable=False, default=False)
     user_points = Column(Integer, nullable=False, default=0)
+    weekly_points = Column(Integer, nullable=False, default=0)
+    weekly_points_week = Column(Date, nullable=True)
     push_notif = Column(Boolean, nullable=False, default=False)
     user_avatar = Column(String, nullable=False)
-    created_at = Column(DATE, nullable=False, default=date.today())
-    last_login = Column(DATE, nullable=False, default=date.today())
+    created_at = Column(DATE, nullable=False, default=date.today)
+    last_login = Column(DATE, nullable=False, default=date.today)
 
     sprite_instances: Mapped[List["SpriteInstance"]] = relationship(
         back_populates="user"
@@ -73,6 +98,30 @@ class User(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index(
+            "ix_tasks_user_uuid_task_deadline_task_time_task_uuid",
+            "user_uuid",
+            "task_deadline",
+            "task_time",
+            "task_uuid",
+        ),
+        Index(
+            "ix_tasks_user_uuid_is_done_task_deadline_task_time_task_uuid",
+            "user_uuid",
+            "is_done",
+            "task_deadline",
+            "task_time",
+            "task_uuid",
+        ),
+        Index(
+            "ix_tasks_pending_deadline",
+            "task_deadline",
+            "task_time",
+            "task_uuid",
+            postgresql_where=text("is_done = false"),
+        ),
+    )
 
     task_uuid = mapped_column(UUID, primary_key=True, default=security.generate_uuid)
     task_details = Column(String, nullable=False)
@@ -81,6 +130,8 @@ class Task(Base):
     task_deadline = Column(Date, nullable=False)
     task_time = Column(Time, nullable=False)
     is_done = Column(Boolean, default=False, nullable=False)
+    # the deadline the last reminder went out for, see reminders.py
+    reminded_for = Column(DateTime, nullable=True)
     user_uuid = mapped_column(UUID, ForeignKey("users.user_uuid"), nullable=False)
 
     user: Mapped["User"] = relationship(back_populates="tasks")
@@ -89,6 +140,7 @@ class Task(Base):
 
 class SpriteInstance(Base):
     __tablename__ = "sprite_instances"
+    __table_args__ = (Index("ix_sprite_instances_user_uuid", "user_uuid"),)
 
     sprite_instance_uuid = mapped_column(
         UUID, primary_key=True, default=security.generate_uuid
@@ -106,13 +158,17 @@ class SpriteInstance(Base):
 
 class ForumMember(Base):
     __tablename__ = "forum_members"
+    __table_args__ = (
+        Index("ix_forum_members_forum_uuid_user_uuid", "forum_uuid", "user_uuid"),
+        Index("ix_forum_members_user_uuid_is_owner", "user_uuid", "is_owner"),
+    )
 
     forum_member_uuid = mapped_column(
         UUID, primary_key=True, default=security.generate_uuid
     )
     user_name = Column(String, nullable=False)
     is_owner = Column(Boolean, nullable=False)
-    created_at = Column(Date, nullable=True, default=security.get_locale_datetime())
+    created_at = Column(Date, nullable=True, default=security.get_locale_datetime)
     forum_uuid = mapped_column(UUID, ForeignKey("forums.forum_uuid"), nullable=False)
     user_uuid = mapped_column(UUID, ForeignKey("users.user_uuid"), nullable=False)
 
@@ -122,14 +178,24 @@ class ForumMember(Base):
 
 class ForumComment(Base):
     __tablename__ = "forum_comments"
+    __table_args__ = (
+        Index("ix_forum_comments_forum_uuid_created_at", "forum_uuid", "created_at"),
+        Index("ix_forum_comments_user_uuid", "user_uuid"),
+        Index(
+            "ix_forum_comments_search_vector", "search_vector", postgresql_using="gin"
+        ),
+    )
 
     forum_comment_uuid = mapped_column(
         UUID, primary_key=True, default=security.generate_uuid
     )
     forum_comment = Column(String, nullable=False)
-    created_at = Column(Date, nullable=False, default=security.get_locale_datetime())
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, default=security.get_locale_datetime
+    )
     forum_uuid = mapped_column(UUID, ForeignKey("forums.forum_uuid"), nullable=False)
     user_uuid = mapped_column(UUID, ForeignKey("users.user_uuid"), nullable=False)
+    search_vector = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     forum: Mapped["Forum"] = relationship(back_populates="forum_comments")
     user: Mapped["User"] = relationship(back_populates="forum_comments")
@@ -148,15 +214,70 @@ class ForumComment(Base):
 
 class UserLog(Base):
     __tablename__ = "user_logs"
+    __table_args__ = (
+        Index("ix_user_logs_user_uuid_created_at", "user_uuid", "created_at"),
+    )
 
     user_log_uuid = mapped_column(
         UUID, primary_key=True, default=security.generate_uuid
     )
     user_log_details = Column(String, nullable=False)
-    created_at = Column(Date, nullable=False, default=date.today())
+    created_at = Column(Date, nullable=False, default=date.today)
+    user_uuid = mapped_column(UUID, ForeignKey("users.user_uuid"), nullable=False)
+
+
+class PointsLedger(Base):
+    __tablename__ = "points_ledger"
+    __table_args__ = (
+        Index("ix_points_ledger_user_uuid_created_at", "user_uuid", "created_at"),
+        Index("ix_points_ledger_created_at", "created_at"),
+    )
+
+    points_ledger_uuid = mapped_column(
+        UUID, primary_key=True, default=security.generate_uuid
+    )
+    points_delta = Column(Integer, nullable=False)
+    points_balance = Column(Integer, nullable=False)
+    points_reason = Column(String, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, default=security.get_locale_datetime
+    )
     user_uuid = mapped_column(UUID, ForeignKey("users.user_uuid"), nullable=False)
 
 
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    version_key = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index(
+            "ix_email_outbox_pending_next_attempt_at",
+            "next_attempt_at",
+            postgresql_where=text("email_status = 'pending'"),
+        ),
+    )
+
+    email_uuid = mapped_column(UUID, primary_key=True, default=security.generate_uuid)
+    email_recipient = Column(String, nullable=False)
+    email_subject = Column(String, nullable=False)
+    email_body = Column(String, nullable=False)
+    email_status = Column(String, nullable=False, default="pending")
+    email_attempts = Column(Integer, nullable=False, default=0)
+    email_error = Column(String, nullable=True)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, default=security.get_locale_datetime
+    )
+    next_attempt_at = Column(
+        DateTime(timezone=True), nullable=False, default=security.get_locale_datetime
+    )
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+
 # class SpriteInstanceLog(Base):
 #     __tablename__ = "sprite_logs"
 
@@ -0,0 +1,157 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# counts the statements the engines execute and the time spent in them.
+# track() opens a scope, scopes nest, and every statement run while a scope is
+# active (including inside AsyncSession.run_sync, which keeps the caller's
+# context) is charged to it and all of its parents. adbops names the dbops
+# operation that issued each statement.
+
+_scope: ContextVar["QueryStats | None"] = ContextVar("query_scope", default=None)
+_operation: ContextVar[str | None] = ContextVar("query_operation", default=None)
+_captured: ContextVar[list | None] = ContextVar("query_capture", default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_LISTS = re.compile(r"\(\?(?:\s*,\s*\?)*\)")
+_ROWS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    # same shape for the same query with different parameters, IN lists and
+    # multi-row VALUES of any length
+    shape = _LITERALS.sub("?", statement)
+    shape = _PLACEHOLDERS.sub("?", shape)
+    shape = _LISTS.sub("(?)", shape)
+    shape = _ROWS.sub("(?)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    def __init__(self, name: str, parent: "QueryStats | None" = None):
+        self.name = name
+        self.parent = parent
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.operations: dict[str, list] = {}
+
+    def record(self, shape: str, seconds: float, operation: str | None):
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.seconds += seconds
+            stats.shapes[shape] += 1
+            totals = stats.operations.setdefault(operation or "-", [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+            stats = stats.parent
+
+    def repeated(self, max_repeats: int) -> dict[str, int]:
+        return {
+            shape: count
+            for shape, count in self.shapes.most_common()
+            if count > max_repeats
+        }
+
+    def check(self, max_queries: int, max_repeats: int = 1):
+        problems = []
+        if self.count > max_queries:
+            problems.append(
+                f"{self.count} statements, budget is {max_queries}: "
+                + ", ".join(f"{name} x{n}" for name, (n, _) in self.operations.items())
+            )
+        for shape, count in self.repeated(max_repeats).items():
+            problems.append(f"repeated {count} times: {shape}")
+        if problems:
+            raise QueryBudgetExceeded(f"{self.name}: " + "; ".join(problems))
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+
+
+@contextmanager
+def track(name: str):
+    stats = QueryStats(name, _scope.get())
+    token = _scope.set(stats)
+    try:
+        yield stats
+    finally:
+        _scope.reset(token)
+
+
+@contextmanager
+def operation(name: str):
+    token = _operation.set(name)
+    try:
+        yield
+    finally:
+        _operation.reset(token)
+
+
+def current_operation() -> str | None:
+    return _operation.get()
+
+
+@contextmanager
+def budget(name: str, max_queries: int, max_repeats: int = 1):
+    # for checks and tests: raises QueryBudgetExceeded when the block runs
+    # more than max_queries statements or one shape more than max_repeats times
+    with track(name) as stats:
+        yield stats
+    stats.check(max_queries, max_repeats)
+
+
+@contextmanager
+def capture():
+    # for checks: collects (statement, parameters) for every statement the
+    # block runs, exactly as they were sent to the driver
+    statements = []
+    token = _captured.set(statements)
+    try:
+        yield statements
+    finally:
+        _captured.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _scope.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    captured = _captured.get()
+    if captured is not None:
+        captured.append((statement, parameters))
+    stats = _scope.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    stats.record(
+        statement_shape(statement),
+        time.perf_counter() - started.pop(),
+        _operation.get(),
+    )
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    started = connection.info.get("query_started") if connection is not None else None
+    if started:
+        started.pop()
+
+
+def install(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
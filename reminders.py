@@ -0,0 +1,362 @@
+import heapq
+import logging
+import threading
+import time as clock
+from datetime import date, datetime, time, timedelta
+from uuid import UUID
+
+from sqlalchemy import insert, select, tuple_, update
+
+import consts as consts
+import metrics as metrics
+import models as models
+import security as security
+from dbconf import SessionLocal
+
+logger = logging.getLogger("reminders")
+
+SUBJECT = "Studyplan: task due soon"
+# sorts before every task_uuid, used to move the load cursor back to a deadline
+_FIRST_UUID = UUID(int=0)
+
+
+def now() -> datetime:
+    # task deadlines are naive wall-clock times in the app's locale
+    return security.get_locale_datetime().replace(tzinfo=None)
+
+
+class Scheduler:
+    # fires a reminder REMINDER_LEAD before each pending task's deadline.
+    #
+    # only the reminders due within the next REMINDER_HORIZON are held, in a
+    # heap of at most REMINDER_CAPACITY entries. they are loaded in deadline
+    # order from ix_tasks_pending_deadline, continuing from a cursor, so the
+    # table is never scanned as a whole. dbops reports task writes through
+    # schedule and cancel; entries made stale by them stay in the heap until
+    # popped and are ignored.
+    #
+    # tasks.reminded_for is set in the same transaction that queues the
+    # email, under a row lock, so a restart, a stale entry or another worker
+    # running its own scheduler never sends the same reminder twice.
+    def __init__(
+        self,
+        lead: float = consts.REMINDER_LEAD,
+        horizon: float = consts.REMINDER_HORIZON,
+        grace: float = consts.REMINDER_GRACE,
+        capacity: int = consts.REMINDER_CAPACITY,
+        batch_size: int = consts.REMINDER_BATCH_SIZE,
+        scan_interval: float = consts.REMINDER_SCAN_INTERVAL,
+    ):
+        self.lead = timedelta(seconds=lead)
+        self.horizon = timedelta(seconds=horizon)
+        self.grace = timedelta(seconds=grace)
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.scan_interval = scan_interval
+        self.heap: list[tuple[datetime, UUID, datetime]] = []
+        # task -> the deadline its live heap entry is for
+        self.scheduled: dict[UUID, datetime] = {}
+        # (task_deadline, task_time, task_uuid) of the last task loaded
+        self.cursor: tuple | None = None
+        # deadlines up to here are loaded or being loaded
+        self.loaded_until: datetime | None = None
+        # the last load ran out of room before the end of the window
+        self.behind = False
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread: threading.Thread | None = None
+        self.loaded = 0
+        self.fired = 0
+        self.skipped = 0
+        self.failed_batches = 0
+
+    def start(self):
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 10):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "scheduled": len(self.scheduled),
+                "heap": len(self.heap),
+                "loaded_until": self.loaded_until,
+                "loaded": self.loaded,
+                "fired": self.fired,
+                "skipped": self.skipped,
+                "failed_batches": self.failed_batches,
+            }
+
+    def schedule(self, task_uuid: UUID, task_deadline: date, task_time: time):
+        # routes pass the task_uuid from the path as a str, the heap and
+        # scheduled hold the UUIDs the loader reads
+        task_uuid = UUID(str(task_uuid))
+        deadline = datetime.combine(task_deadline, task_time)
+        with self.condition:
+            if self.loaded_until is None or deadline > self.loaded_until:
+                # not loaded yet, the loader picks it up when it gets there
+                self._discard(task_uuid)
+                return
+            if self.scheduled.get(task_uuid) == deadline:
+                return
+            if len(self.heap) >= self.capacity:
+                # no room, load it again once the heap has drained
+                self._discard(task_uuid)
+                self._rewind(task_deadline, task_time)
+                return
+            self._push(task_uuid, deadline)
+
+    def cancel(self, task_uuid: UUID):
+        task_uuid = UUID(str(task_uuid))
+        with self.condition:
+            self._discard(task_uuid)
+
+    def _push(self, task_uuid: UUID, deadline: datetime):
+        fire_at = deadline - self.lead
+        earliest = self.heap[0][0] if self.heap else None
+        self.scheduled[task_uuid] = deadline
+        heapq.heappush(self.heap, (fire_at, task_uuid, deadline))
+        metrics.reminders_scheduled.set(len(self.scheduled))
+        if earliest is None or fire_at < earliest:
+            self.condition.notify()
+
+    def _discard(self, task_uuid: UUID):
+        if self.scheduled.pop(task_uuid, None) is None:
+            return
+        metrics.reminders_scheduled.set(len(self.scheduled))
+        # drop the stale entries once they are most of the heap
+        if len(self.heap) > 2 * len(self.scheduled) + self.batch_size:
+            self.heap = [
+                entry for entry in self.heap if self.scheduled.get(entry[1]) == entry[2]
+            ]
+            heapq.heapify(self.heap)
+
+    def _rewind(self, task_deadline: date, task_time: time):
+        key = (task_deadline, task_time, _FIRST_UUID)
+        if self.cursor is None or key < self.cursor:
+            self.cursor = key
+            self.loaded_until = min(
+                self.loaded_until, datetime.combine(task_deadline, task_time)
+            )
+
+    def _run(self):
+        next_load = 0.0
+        while True:
+            with self.condition:
+                if self.stopping:
+                    return
+            with self.condition:
+                drained = self.behind and len(self.heap) <= self.capacity // 2
+            if drained or clock.monotonic() >= next_load:
+                self._load()
+                next_load = clock.monotonic() + self.scan_interval
+            batch = self._pop_due()
+            if batch:
+                self._fire(batch)
+                continue
+            with self.condition:
+                if self.stopping:
+                    return
+                if self.behind and len(self.heap) <= self.capacity // 2:
+                    continue
+                timeout = next_load - clock.monotonic()
+                if self.heap:
+                    until_first = (self.heap[0][0] - now()).total_seconds()
+                    timeout = min(timeout, until_first)
+                self.condition.wait(max(timeout, 0))
+
+    def _load(self):
+        current = now()
+        limit = current + self.lead + self.horizon
+        with self.condition:
+            if self.cursor is None:
+                # after a restart, catch up on what fell due while down
+                start = current + self.lead - self.grace
+                self.cursor = (start.date(), start.time(), _FIRST_UUID)
+                self.loaded_until = start
+            self.loaded_until = max(self.loaded_until, limit)
+        try:
+            while True:
+                with self.condition:
+                    room = min(self.batch_size, self.capacity - len(self.heap))
+                    cursor = self.cursor
+                if room <= 0:
+                    break
+                rows = self._load_page(cursor, limit, room)
+                with self.condition:
+                    if self.cursor != cursor:
+                        # rewound while the page was loading, start over there
+                        continue
+                    for task_uuid, task_deadline, task_time in rows:
+                        # an entry from schedule is newer than this row
+                        if task_uuid not in self.scheduled:
+                            deadline = datetime.combine(task_deadline, task_time)
+                            self._push(task_uuid, deadline)
+                    self.loaded += len(rows)
+                    if rows:
+                        task_uuid, task_deadline, task_time = rows[-1]
+                        self.cursor = (task_deadline, task_time, task_uuid)
+                    if len(rows) < room:
+                        self.cursor = (limit.date(), limit.time(), _FIRST_UUID)
+                        self.behind = False
+                        return
+            with self.condition:
+                # out of room, the rest of the window is loaded once the heap
+                # has drained to half
+                self.behind = True
+                self.loaded_until = min(
+                    self.loaded_until, datetime.combine(*self.cursor[:2])
+                )
+        except Exception:
+            logger.exception("loading reminders failed")
+            with self.condition:
+                self.loaded_until = datetime.combine(*self.cursor[:2])
+
+    def _load_page(self, cursor: tuple, limit: datetime, size: int) -> list:
+        key = tuple_(
+            models.Task.task_deadline, models.Task.task_time, models.Task.task_uuid
+        )
+        db = SessionLocal()
+        try:
+            return [
+                tuple(row)
+                for row in db.execute(
+                    select(
+                        models.Task.task_uuid,
+                        models.Task.task_deadline,
+                        models.Task.task_time,
+                    )
+                    .join(models.User)
+                    .where(models.Task.is_done == False)
+                    .where(models.User.push_notif == True)
+                    .where(key > tuple_(*cursor))
+                    .where(
+                        tuple_(models.Task.task_deadline, models.Task.task_time)
+                        <= tuple_(limit.date(), limit.time())
+                    )
+                    .order_by(
+                        models.Task.task_deadline,
+                        models.Task.task_time,
+                        models.Task.task_uuid,
+                    )
+                    .limit(size)
+                )
+            ]
+        finally:
+            db.close()
+
+    def _pop_due(self) -> list:
+        current = now()
+        batch = []
+        with self.condition:
+            while self.heap and len(batch) < self.batch_size:
+                fire_at, task_uuid, deadline = self.heap[0]
+                if fire_at > current:
+                    break
+                heapq.heappop(self.heap)
+                if self.scheduled.get(task_uuid) != deadline:
+                    continue
+                del self.scheduled[task_uuid]
+                batch.append((task_uuid, deadline))
+            metrics.reminders_scheduled.set(len(self.scheduled))
+        return batch
+
+    def _fire(self, batch: list):
+        current = now()
+        expected = dict(batch)
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(
+                    models.Task.task_uuid,
+                    models.Task.task_details,
+                    models.Task.task_deadline,
+                    models.Task.task_time,
+                    models.Task.reminded_for,
+                    models.User.user_email,
+                    models.User.push_notif,
+                )
+                .join(models.User)
+                .where(models.Task.task_uuid.in_(expected))
+                .where(models.Task.is_done == False)
+                .with_for_update(of=models.Task)
+            ).all()
+            reminded = []
+            emails = []
+            reschedule = []
+            for row in rows:
+                deadline = datetime.combine(row.task_deadline, row.task_time)
+                fire_at = deadline - self.lead
+                if deadline != expected[row.task_uuid] and fire_at > current:
+                    # moved by a write this scheduler did not hear about
+                    reschedule.append((row.task_uuid, row.task_deadline, row.task_time))
+                    continue
+                if (
+                    row.reminded_for == deadline
+                    or not row.push_notif
+                    or current - fire_at > self.grace
+                ):
+                    continue
+                reminded.append({"task_uuid": row.task_uuid, "reminded_for": deadline})
+                emails.append(
+                    {
+                        "email_recipient": row.user_email,
+                        "email_subject": SUBJECT,
+                        "email_body": (
+                            f"Your task is due on {row.task_deadline:%d %b %Y} "
+                            f"at {row.task_time:%H:%M}:\n\n{row.task_details}"
+                        ),
+                    }
+                )
+            if reminded:
+                db.execute(update(models.Task), reminded)
+                db.execute(insert(models.EmailOutbox), emails)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("sending %s reminders failed", len(batch))
+            with self.condition:
+                self.failed_batches += 1
+                # retried on the next load, which starts from the first of them
+                for task_uuid, deadline in batch:
+                    self._rewind(deadline.date(), deadline.time())
+            return
+        finally:
+            db.close()
+        for task in reschedule:
+            self.schedule(*task)
+        with self.condition:
+            self.fired += len(reminded)
+            self.skipped += len(batch) - len(reminded)
+        metrics.reminders_fired.inc(len(reminded))
+
+
+_scheduler = Scheduler()
+
+
+def start():
+    _scheduler.start()
+
+
+def stop():
+    _scheduler.stop()
+
+
+def schedule(task_uuid: UUID, task_deadline: date, task_time: time):
+    _scheduler.schedule(task_uuid, task_deadline, task_time)
+
+
+def cancel(task_uuid: UUID):
+    _scheduler.cancel(task_uuid)
+
+
+def stats() -> dict:
+    return _scheduler.stats()
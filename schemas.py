@@ -1,7 +1,10 @@
 from datetime import date, datetime, time
+from typing import Generic, Literal, TypeVar
 
 from pydantic import UUID4, BaseModel, EmailStr
 
+T = TypeVar("T")
+
 
 class TokenData(BaseModel):
     user_uuid: str | None = None
@@ -11,11 +14,47 @@ class TokenData(BaseModel):
     token_type: str | None = None
 
 
+class Principal(TokenData):
+    access_token: str | None = None
+
+
+class Detail(BaseModel):
+    detail: str
+    access_token: str | None = None
+
+
+class Data(BaseModel, Generic[T]):
+    data: T
+    access_token: str | None = None
+
+
+class Page(Data[T], Generic[T]):
+    next_cursor: str | None = None
+
+
+class CurrentUser(Data[TokenData]):
+    user_avatar: str
+
+
 class UserLogs(BaseModel):
     user_log_details: str
     user_uuid: UUID4
 
 
+class UserLogEntry(UserLogs):
+    user_log_uuid: UUID4
+    created_at: date
+
+    class Config:
+        from_attributes = True
+
+
+class EmailAddToDB(BaseModel):
+    email_recipient: EmailStr
+    email_subject: str
+    email_body: str
+
+
 class ForumCommentAddToDB(BaseModel):
     forum_comment: str
     forum_uuid: UUID4
@@ -78,6 +117,26 @@ class Tasks(TaskUpdateToDB):
         from_attributes = True
 
 
+class TaskBatch(BaseModel):
+    create: list[TaskAddToDB] = []
+    update: list[TaskUpdateToDB] = []
+    complete: list[UUID4] = []
+    delete: list[UUID4] = []
+
+
+class TaskResult(BaseModel):
+    action: Literal["create", "update", "complete", "delete"]
+    task_uuid: UUID4
+    status: Literal[
+        "created", "updated", "completed", "deleted", "already_done", "not_found"
+    ]
+
+
+class TaskBatchResult(BaseModel):
+    results: list[TaskResult]
+    points: int
+
+
 class UserLogin(BaseModel):
     user_email: EmailStr
     user_password: str
@@ -88,6 +147,23 @@ class UserRegister(UserLogin):
     user_lname: str
 
 
+class UserProfile(BaseModel):
+    user_uuid: UUID4
+    user_email: EmailStr
+    user_fname: str
+    user_lname: str
+    user_avatar: str
+    is_premium: bool
+    is_confirmed: bool
+    user_points: int
+    push_notif: bool
+    created_at: date
+    last_login: date
+
+    class Config:
+        from_attributes = True
+
+
 class Users(UserRegister):
     user_uuid: UUID4
     is_premium: bool
@@ -108,16 +184,43 @@ class ForumAddToDB(BaseModel):
     forum_status: str
 
 
-class Forums(ForumAddToDB):
+class ForumHeaders(ForumAddToDB):
     forum_uuid: UUID4
-    created_at: datetime
-    forum_members: list[ForumMembers]
-    forum_comments: list[ForumComments]
+    created_at: date
+    comment_count: int
+    member_count: int
 
     class Config:
         from_attributes = True
 
 
+class UserAvatar(BaseModel):
+    user_uuid: UUID4
+    user_avatar: str
+
+
+class ForumPageMember(ForumMembers):
+    user: UserAvatar
+
+
+class ForumPageComment(ForumComments):
+    user: UserAvatar
+
+
+class Forums(ForumHeaders):
+    forum_members: list[ForumPageMember]
+    forum_comments: list[ForumPageComment]
+
+
+class SearchHit(BaseModel):
+    kind: Literal["forum", "comment"]
+    forum_uuid: UUID4
+    forum_comment_uuid: UUID4 | None
+    forum_title: str
+    snippet: str
+    rank: float
+
+
 class Sprites(BaseModel):
     sprite_uuid: UUID4
     sprite_source: str
@@ -125,3 +228,26 @@ class Sprites(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class SpriteCollection(SpriteInstances):
+    sprite: Sprites
+
+
+class SpritePull(BaseModel):
+    sprite_instance_uuid: UUID4
+    sprite_uuid: UUID4
+    sprite_source: str
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_uuid: UUID4
+    user_points: int
+
+
+class Standing(BaseModel):
+    rank: int | None
+    user_points: int
+    neighbours: list[LeaderboardEntry]
+    total: int
@@ -1,7 +1,8 @@
+from collections import OrderedDict
 from datetime import timedelta, datetime, timezone
 from zoneinfo import ZoneInfo
 from typing import Any
-import jwt, consts as consts, hashlib, uuid, os, smtplib, ssl
+import jwt, consts as consts, base64, hashlib, hmac, uuid, os, threading, time
 
 def generate_refresh_token(expiry_date: timedelta | None = None) -> str:
     to_encode = {
@@ -23,9 +24,48 @@ def generate_access_token(payload: dict, expiry_date: timedelta | None = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, consts.SECRET_KEY, algorithm=consts.ALGORITHM)
 
+class VerifiedTokenCache:
+    # bounded LRU of access tokens that already passed signature and expiry
+    # checks, keyed by digest so raw tokens are not kept in memory
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, payload = entry
+            if expires <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return dict(payload)
+
+    def put(self, token: str, payload: dict):
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        expires = min(time.time() + self.ttl, payload.get("exp", 0))
+        with self.lock:
+            self.entries[key] = (expires, dict(payload))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+verified_tokens = VerifiedTokenCache(consts.TOKEN_CACHE_SIZE, consts.TOKEN_CACHE_TTL)
+
 def verify_access_token(refresh_token: str, access_token: str) -> dict:
+    access_data = verified_tokens.get(access_token)
+    if access_data is not None:
+        return access_data, None
     try:
         access_data = jwt.decode(access_token, consts.SECRET_KEY, algorithms=[consts.ALGORITHM])
+        verified_tokens.put(access_token, access_data)
         return access_data, None
     except jwt.ExpiredSignatureError or jwt.InvalidSignatureError:
         try:
@@ -40,7 +80,45 @@ def verify_refresh_token(token: str) -> dict:
     return jwt.decode(token, consts.SECRET_KEY, algorithms=[consts.ALGORITHM], audience="refresh")
 
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(
+        password.encode('utf-8'),
+        salt=salt,
+        n=consts.SCRYPT_N,
+        r=consts.SCRYPT_R,
+        p=consts.SCRYPT_P,
+        maxmem=256 * consts.SCRYPT_N * consts.SCRYPT_R,
+        dklen=32,
+    )
+    return "scrypt${}${}${}${}${}".format(
+        consts.SCRYPT_N,
+        consts.SCRYPT_R,
+        consts.SCRYPT_P,
+        base64.b64encode(salt).decode('ascii'),
+        base64.b64encode(digest).decode('ascii'),
+    )
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    if not hashed_password.startswith("scrypt$"):
+        # unsalted sha256 from before the scrypt migration
+        legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(legacy, hashed_password)
+    _, n, r, p, salt, expected = hashed_password.split("$")
+    n, r, p = int(n), int(r), int(p)
+    digest = hashlib.scrypt(
+        password.encode('utf-8'),
+        salt=base64.b64decode(salt),
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r,
+        dklen=32,
+    )
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+def needs_rehash(hashed_password: str) -> bool:
+    current = "scrypt${}${}${}$".format(consts.SCRYPT_N, consts.SCRYPT_R, consts.SCRYPT_P)
+    return not hashed_password.startswith(current)
 
 def generate_uuid():
     return uuid.uuid4()
@@ -48,16 +126,3 @@ def generate_uuid():
 def get_locale_datetime():
     asia_utc = ZoneInfo("Asia/Singapore")
     return datetime.now(tz=asia_utc)
-
-def send_email(email: str, subject: str, body: str):
-    port = os.getenv('SMTP_PORT')
-    smtp_server = os.getenv('SMTP_SERVER')
-    sender_email = os.getenv('SENDER_EMAIL')
-    receiver_email = email
-    password = os.getenv('SENDER_PASSWORD')
-    message = 'Subject: {}\n\n{}'.format(subject, body)
-    context = ssl.create_default_context()
-    with smtplib.SMTP(smtp_server, port) as server:
-        server.starttls(context=context)
-        server.login(sender_email, password)
-        server.sendmail(sender_email, receiver_email, message)
@@ -0,0 +1,46 @@
+import csv
+import io
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+import schemas as schemas
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# rows from dbops are plain dicts projected onto a schemas class, so they are
+# already the shape the response model documents. they go straight to a
+# native encoder instead of through jsonable_encoder and model validation.
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def ndjson(rows: list[dict]) -> bytes:
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def csv_chunk(fields: list[str], rows: list[dict], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def responses(model) -> dict:
+    # documents the success body and the {"detail": ...} error body the routes
+    # return with a 400
+    return {200: {"model": model}, 400: {"model": schemas.Detail}}
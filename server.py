@@ -0,0 +1,146 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+import consts as consts
+import metrics as metrics
+
+logger = logging.getLogger("server")
+
+# a worker that dies sooner than this after starting is not restarted at once,
+# so a crash on startup does not turn into a fork loop
+MIN_WORKER_LIFETIME = 1.0
+
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+
+def bind(host: str, port: int, backlog: int = consts.SERVER_BACKLOG) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    # prefork server. the app is imported once, here, before the workers are
+    # forked, so they share its pages and start without importing anything.
+    # nothing in the import opens a database connection or starts a thread,
+    # those all happen in the lifespan, which runs in each worker. every
+    # worker accepts on the one listening socket with its own uvloop and
+    # httptools server, and SIGTERM lets them finish in-flight requests.
+    def __init__(
+        self,
+        app,
+        sock: socket.socket,
+        workers: int = consts.SERVER_WORKERS,
+        keep_alive: int = consts.SERVER_KEEP_ALIVE,
+        graceful_timeout: int = consts.SERVER_GRACEFUL_TIMEOUT,
+    ):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.config = uvicorn.Config(
+            app,
+            loop="uvloop",
+            http="httptools",
+            lifespan="on",
+            timeout_keep_alive=keep_alive,
+            timeout_graceful_shutdown=graceful_timeout,
+            server_header=False,
+        )
+        self.children: dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self):
+        # the stop signals stay blocked across the fork until the worker has
+        # uvicorn's handler in place. one that arrives in between waits for
+        # that handler, instead of reaching the supervisor's handler the
+        # worker inherited, or killing it outright with the default action.
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        try:
+            pid = os.fork()
+        except OSError:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            raise
+        if pid:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            self.children[pid] = time.monotonic()
+            return
+        status = 1
+        try:
+            server = uvicorn.Server(self.config)
+            for signum in STOP_SIGNALS:
+                signal.signal(signum, server.handle_exit)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            server.run(sockets=[self.sock])
+            status = 0
+        except BaseException:
+            logger.exception("worker %s failed", os.getpid())
+        finally:
+            os._exit(status)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def reap(self) -> list[tuple[int, float]]:
+        dead = []
+        while self.children:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            # a worker that crashed never ran its lifespan shutdown
+            metrics.process_exit(pid)
+            dead.append((pid, time.monotonic() - started))
+        return dead
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        host, port = self.sock.getsockname()[:2]
+        logger.info("serving on %s:%s with %s workers", host, port, self.workers)
+        for _ in range(self.workers):
+            self.spawn()
+        while not self.stopping:
+            for pid, lifetime in self.reap():
+                logger.warning("worker %s exited, starting another", pid)
+                if lifetime < MIN_WORKER_LIFETIME:
+                    time.sleep(MIN_WORKER_LIFETIME)
+                if not self.stopping:
+                    self.spawn()
+            time.sleep(0.2)
+        self.drain()
+
+    def drain(self):
+        # workers stop accepting, finish their requests and run the lifespan
+        # shutdown. whatever is still running after graceful_timeout plus
+        # time for the shutdown itself is killed.
+        logger.info("draining %s workers", len(self.children))
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + 15
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.children:
+            logger.error("worker %s did not stop, killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+        while self.children:
+            self.reap()
+            time.sleep(0.1)
+        self.sock.close()
+
+
+def run(app, host: str, port: int, workers: int = consts.SERVER_WORKERS):
+    logging.basicConfig(level=logging.INFO)
+    Supervisor(app, bind(host, port), workers).run()